@@ -0,0 +1,139 @@
+import importlib.util
+import os
+
+import pandas as pd
+
+# Copia local en Parquet de los archivos de XM ya leídos, particionada por
+# tipo y fecha de operación:
+#   {DIRECTORIO_PARQUET}/tipo=preofe/fechaoperacion=2024-10-01/txf.parquet
+# Las consultas leen solo las particiones y columnas pedidas, con memory map.
+
+# Directorio raíz del almacén
+DIRECTORIO_PARQUET = os.getenv('XM_PARQUET_DIR', os.path.join('.cache', 'xm_parquet'))
+
+
+def _pyarrow():
+    """
+    Importa pyarrow bajo demanda, ya que solo lo necesita el almacén Parquet.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("El almacén Parquet requiere pyarrow (pip install pyarrow).") from e
+    return pyarrow
+
+
+def parquet_disponible():
+    """
+    Indica si pyarrow está instalado y se puede usar el almacén.
+    """
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _ruta_particion(tipo, fecha, directorio):
+    return os.path.join(directorio, f"tipo={tipo}", f"fechaoperacion={pd.Timestamp(fecha).date().isoformat()}")
+
+
+def _version_archivo(archivo):
+    """
+    Extrae la versión del nombre de un archivo Parquet (`txf.parquet` o `txf-00003.parquet`).
+    """
+    return archivo[:-len(".parquet")].split("-")[0]
+
+
+def _borrar_version(ruta, version):
+    for archivo in os.listdir(ruta):
+        if archivo.endswith(".parquet") and _version_archivo(archivo) == version:
+            os.remove(os.path.join(ruta, archivo))
+
+
+def escribir_parquet(df, tipo, directorio=None, parte=None):
+    """
+    Guarda un DataFrame leído de XM en el almacén, una partición por fecha de operación.
+
+    Cada versión (extensión del archivo) se guarda en su propio archivo dentro
+    de la partición y reemplaza al anterior, así volver a leer un archivo no
+    duplica datos. Los archivos leídos por bloques se guardan en varias partes
+    (`parte` 1, 2, ...); la parte 1 reemplaza lo que hubiera de esa versión.
+
+    :param df: DataFrame con las columnas `fechaoperacion` y `version`.
+    :param tipo: Tipo de archivo (prefijo).
+    :param directorio: Directorio raíz; por defecto `DIRECTORIO_PARQUET`.
+    :param parte: Número de bloque cuando el archivo se escribe por partes.
+    :return: Número de archivos Parquet escritos.
+    """
+    pa = _pyarrow()
+    directorio = directorio or DIRECTORIO_PARQUET
+    escritos = 0
+    for (fecha, version), grupo in df.groupby(["fechaoperacion", "version"], sort=False):
+        ruta = _ruta_particion(tipo, fecha, directorio)
+        os.makedirs(ruta, exist_ok=True)
+        if parte is None or parte == 1:
+            _borrar_version(ruta, version)
+        nombre = version if parte is None else f"{version}-{parte:05d}"
+        archivo = os.path.join(ruta, f"{nombre}.parquet")
+        temporal = f"{archivo}.tmp"
+        pa.parquet.write_table(pa.Table.from_pandas(grupo, preserve_index=False), temporal)
+        os.replace(temporal, archivo)
+        escritos += 1
+    return escritos
+
+
+def tipos_disponibles(directorio=None):
+    """
+    Lista los tipos de archivo guardados en el almacén.
+    """
+    directorio = directorio or DIRECTORIO_PARQUET
+    if not os.path.isdir(directorio):
+        return []
+    return sorted(nombre.split("=", 1)[1] for nombre in os.listdir(directorio) if nombre.startswith("tipo="))
+
+
+def fechas_disponibles(tipo, directorio=None):
+    """
+    Lista las fechas de operación guardadas para un tipo.
+    """
+    ruta = os.path.join(directorio or DIRECTORIO_PARQUET, f"tipo={tipo}")
+    if not os.path.isdir(ruta):
+        return []
+    return sorted(
+        pd.Timestamp(nombre.split("=", 1)[1]).date()
+        for nombre in os.listdir(ruta) if nombre.startswith("fechaoperacion=")
+    )
+
+
+def leer_parquet(tipo, desde=None, hasta=None, columnas=None, versiones=None, directorio=None):
+    """
+    Consulta el almacén leyendo solo las particiones y columnas necesarias.
+
+    :param tipo: Tipo de archivo (prefijo), p. ej. 'tdia_sis' o 'preofe'.
+    :param desde: Primera fecha de operación, incluida (date o string); None sin límite.
+    :param hasta: Última fecha de operación, incluida (date o string); None sin límite.
+    :param columnas: Columnas a leer; None lee todas.
+    :param versiones: Versiones a leer (p. ej. ['tx2']); None lee todas.
+    :param directorio: Directorio raíz; por defecto `DIRECTORIO_PARQUET`.
+    :return: DataFrame con los datos pedidos.
+    """
+    pa = _pyarrow()
+    directorio = directorio or DIRECTORIO_PARQUET
+    desde = pd.Timestamp(desde).date() if desde is not None else None
+    hasta = pd.Timestamp(hasta).date() if hasta is not None else None
+
+    tablas = []
+    for fecha in fechas_disponibles(tipo, directorio):
+        if (desde and fecha < desde) or (hasta and fecha > hasta):
+            continue
+        ruta = _ruta_particion(tipo, fecha, directorio)
+        for archivo in sorted(os.listdir(ruta)):
+            if not archivo.endswith(".parquet"):
+                continue
+            if versiones is not None and _version_archivo(archivo) not in versiones:
+                continue
+            tablas.append(pa.parquet.read_table(os.path.join(ruta, archivo), columns=columnas, memory_map=True))
+
+    if not tablas:
+        return pd.DataFrame(columns=columnas)
+    # Unifica esquemas cuando una columna viene toda nula en alguna partición o
+    # cuando los decimales de cada archivo tienen distinta precisión y escala
+    return pa.concat_tables(tablas, promote_options="permissive").to_pandas()
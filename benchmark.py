@@ -0,0 +1,614 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+
+from conexiones import obtener_engine
+from estado_local import DIRECTORIO_ESTADO
+import instrumentacion
+from instrumentacion import bytes_dataframe as _bytes_dataframe, medir
+
+# Benchmark reproducible de los pipelines contra una PostgreSQL local.
+# Se generan datos sintéticos con una semilla (filas de prime/optimum_readmass,
+# archivos de XM .tx2/.txf como los de datos_termonorte/ y reportes VEP) y se
+# miden por separado las etapas de extracción, transformación y carga de cada
+# pipeline: duración, filas, bytes y pico de memoria. Cada etapa queda como una
+# línea JSON en el archivo de resultados, para comparar ejecuciones y
+# estrategias de carga entre sí.
+#
+# ATENCIÓN: el benchmark recrea los esquemas cgm y cgm_test y las tablas
+# destino de tmng y volumen_entregado_productor en la base 'bench' (variables
+# BENCH_PG_*). Solo acepta servidores locales salvo con --permitir-remoto.
+
+# Tamaños a escala 1; --escala los multiplica
+TAMANOS = {
+    "filas_prime": 20000,
+    "filas_optimum": 20000,
+    "medidores": 500,
+    "filas_tx2": 20,
+    "filas_txf": 15000,
+    "dias_vep": 30,
+}
+
+# Parámetros de los datos generados que no dependen de la escala
+DIAS_XM = 5
+ARCHIVOS_VEP = 3
+FUENTES_VEP = ["Arianna", "Arrecife", "Ballena", "Bremen Jobo", "Bullerengue", "Hocol", "Jobo",
+               "La Creciente", "Merecumbé", "Nelson", "Palmer", "Sucre", "Toqui Toqui"]
+
+# Fracción de los medidores generados que quedan configurados en rfc_config
+FRACCION_CONFIGURADOS = 0.8
+
+# Día de las lecturas generadas
+FECHA = date(2024, 11, 14)
+
+# Estrategias medidas por pipeline
+ESTRATEGIAS = {
+    "prime": ["copy", "multi", "idempotente", "en_bd"],
+    "optimum": ["copy", "multi", "en_bd"],
+    "termonorte": ["memoria", "bloques"],
+    "vep": ["reemplazo"],
+}
+
+# Archivo donde se acumulan los resultados de todas las ejecuciones
+RESULTADOS = os.path.join(DIRECTORIO_ESTADO, "benchmark.jsonl")
+
+# Columnas de cgm.prime_readmass: (columna, tipo, expresión de generación).
+# `g` es el número de fila y `d` trae el medidor, el canal y la hora de la fila.
+COLUMNAS_PRIME = [
+    ("noins", "bigint", "d.medidor"),
+    ("uom", "text", "'kWh'"),
+    ("usage_data", "numeric", "round((random() * 100)::numeric, 4)"),
+    ("utcyearx", "integer", "extract(year FROM :fecha)::int"),
+    ("utcmonx", "integer", "extract(month FROM :fecha)::int"),
+    ("utcdayx", "integer", "extract(day FROM :fecha)::int"),
+    ("utchourx", "integer", "d.hora"),
+    ("utctime_short", "text", "to_char(make_time(d.hora, 0, 0), 'HH24:MI')"),
+    ("idclient", "integer", "1000 + d.medidor"),
+    ("nointervals", "integer", "96"),
+    ("channel", "integer", "d.canal"),
+    ("idvar", "integer", "g % 10"),
+    ("datetime", "date", ":fecha"),
+    ("readval", "numeric", "round((random() * 1000)::numeric, 4)"),
+    ("raw_data", "numeric", "round((random() * 1000)::numeric, 4)"),
+    ("demand", "numeric", "round((random() * 50)::numeric, 4)"),
+    ("dst_flag", "integer", "0"),
+    ("id_date", "integer", "to_char(:fecha, 'YYYYMMDD')::int"),
+    ("id_reading_detail", "bigint", "g"),
+    ("id_time", "integer", "d.hora * 100"),
+    ("flag", "integer", "(random() < 0.01)::int"),
+    ("accountno", "text", "'CTA' || d.medidor"),
+    ("ke", "numeric", "1"),
+    ("datex", "date", ":fecha"),
+    ("yearx", "integer", "extract(year FROM :fecha)::int"),
+    ("monx", "integer", "extract(month FROM :fecha)::int"),
+    ("dayx", "integer", "extract(day FROM :fecha)::int"),
+    ("hourx", "integer", "d.hora"),
+    ("time_short", "text", "to_char(make_time(d.hora, 0, 0), 'HH24:MI')"),
+    ("dow", "integer", "extract(dow FROM :fecha)::int"),
+    ("utcdow", "integer", "extract(dow FROM :fecha)::int"),
+    ("utcdatetime", "timestamp", ":fecha + make_interval(hours => d.hora)"),
+    ("id_soc", "integer", "1"),
+    ("num_log", "integer", "0"),
+    ("noins_log", "bigint", "d.medidor"),
+    ("is_backup", "integer", "0"),
+    ("idsocket", "text", "'bench'"),
+    ("id_ori", "integer", "1"),
+    ("fecha_update", "timestamp", ":fecha + make_interval(hours => d.hora)"),
+]
+
+# Columnas de cgm.optimum_readmass
+COLUMNAS_OPTIMUM = [
+    ("m_profile_id", "bigint", "g"),
+    ("meter_id", "bigint", "d.medidor"),
+    ("meter_t0", "timestamp", ":fecha"),
+    ("meter_tf", "timestamp", ":fecha + interval '1 day'"),
+    ("channel", "integer", "d.canal % 4 + 1"),
+    ("channel_unit", "text", "'kWh'"),
+    ("val", "numeric", "round((random() * 1000)::numeric, 4)"),
+    ("raw_unit", "text", "'Wh'"),
+    ("val_demand", "numeric", "round((random() * 50)::numeric, 4)"),
+    ("val_edit", "numeric", "NULL"),
+    ("ke", "numeric", "1"),
+    ("datetime_pc", "timestamp", ":fecha + make_interval(secs => g % 86400)"),
+]
+
+
+def es_local(engine):
+    """
+    Indica si el motor apunta a un servidor local (socket o localhost).
+    """
+    host = engine.url.host or os.getenv("PGHOST")
+    return host is None or host.startswith("/") or host in ("localhost", "127.0.0.1", "::1")
+
+
+@contextmanager
+def medir_etapa(registros, **etiquetas):
+    """
+    Mide una etapa con `instrumentacion.medir` y agrega el registro a `registros`.
+
+    :param registros: Lista donde se acumulan los registros.
+    :param etiquetas: Campos que identifican la etapa (pipeline, estrategia, etapa, ...).
+    """
+    with medir(**etiquetas) as registro:
+        yield registro
+    registros.append(registro)
+
+
+def bytes_dataframe(df):
+    """
+    Memoria ocupada por un DataFrame, incluido el contenido de las columnas de texto.
+    """
+    return _bytes_dataframe(df, profundo=True)
+
+
+def tamanos(escala):
+    """
+    Tamaños de los datos generados para una escala.
+    """
+    return {clave: max(1, int(valor * escala)) for clave, valor in TAMANOS.items()}
+
+
+def _insertar_generadas(connection, tabla, columnas, filas, medidores):
+    lista = ", ".join(columna for columna, _, _ in columnas)
+    expresiones = ", ".join(expresion for _, _, expresion in columnas)
+    connection.execute(text(f"""
+        INSERT INTO {tabla} ({lista})
+        SELECT {expresiones}
+        FROM generate_series(0, :filas - 1) g,
+             LATERAL (SELECT 1 + g % :medidores AS medidor,
+                             g / :medidores AS canal,
+                             (g / :medidores) % 24 AS hora) d
+    """), {"filas": filas, "medidores": medidores, "fecha": FECHA})
+
+
+def generar_readmass(engine, filas_prime, filas_optimum, medidores, semilla):
+    """
+    Recrea los esquemas cgm y cgm_test con lecturas sintéticas de un día.
+
+    Los valores aleatorios salen de `random()` del servidor con `setseed`, así
+    la misma semilla produce los mismos datos. Solo una fracción de los
+    medidores queda en `cgm_test.rfc_config`, para que el filtro descarte filas.
+
+    :param engine: Motor de SQLAlchemy de la base de benchmark.
+    :param filas_prime: Filas de `cgm.prime_readmass`.
+    :param filas_optimum: Filas de `cgm.optimum_readmass`.
+    :param medidores: Número de medidores distintos.
+    :param semilla: Semilla de los valores aleatorios.
+    """
+    definicion_prime = ", ".join(f"{columna} {tipo}" for columna, tipo, _ in COLUMNAS_PRIME)
+    definicion_optimum = ", ".join(f"{columna} {tipo}" for columna, tipo, _ in COLUMNAS_OPTIMUM)
+    with engine.begin() as connection:
+        connection.execute(text("DROP SCHEMA IF EXISTS cgm CASCADE"))
+        connection.execute(text("DROP SCHEMA IF EXISTS cgm_test CASCADE"))
+        connection.execute(text("CREATE SCHEMA cgm"))
+        connection.execute(text("CREATE SCHEMA cgm_test"))
+        connection.execute(text("CREATE TABLE cgm_test.rfc_config (medidor bigint)"))
+        connection.execute(text("INSERT INTO cgm_test.rfc_config SELECT generate_series(1, :configurados)"),
+                           {"configurados": max(1, int(medidores * FRACCION_CONFIGURADOS))})
+        connection.execute(text(f"CREATE TABLE cgm.prime_readmass ({definicion_prime})"))
+        connection.execute(text("CREATE TABLE cgm_test.prime_readmass (LIKE cgm.prime_readmass)"))
+        connection.execute(text(f"CREATE TABLE cgm.optimum_readmass ({definicion_optimum})"))
+        connection.execute(text(
+            "CREATE TABLE cgm_test.optimum_readmass (LIKE cgm.optimum_readmass, idsocket text, is_backup integer)"
+        ))
+        connection.execute(text("SELECT setseed(:semilla)"), {"semilla": (semilla % 1000) / 1000})
+        _insertar_generadas(connection, "cgm.prime_readmass", COLUMNAS_PRIME, filas_prime, medidores)
+        _insertar_generadas(connection, "cgm.optimum_readmass", COLUMNAS_OPTIMUM, filas_optimum, medidores)
+        connection.execute(text("CREATE INDEX ON cgm.prime_readmass (datetime)"))
+        connection.execute(text("CREATE INDEX ON cgm.optimum_readmass (datetime_pc)"))
+        connection.execute(text("ANALYZE cgm.prime_readmass"))
+        connection.execute(text("ANALYZE cgm.optimum_readmass"))
+    print(f"Generadas {filas_prime:,} filas de prime_readmass y {filas_optimum:,} de optimum_readmass "
+          f"para {medidores} medidores")
+
+
+def _escribir_xm(ruta, encabezado, filas):
+    # Los archivos de XM llegan en latin-1 con fin de línea CRLF
+    with open(ruta, "w", encoding="latin-1", newline="\r\n") as archivo:
+        archivo.write(";".join(encabezado) + "\n")
+        for fila in filas:
+            archivo.write(";".join(str(valor) for valor in fila) + "\n")
+
+
+def _valor(aleatorio, maximo, decimales=5):
+    # Los archivos de XM mezclan ceros, enteros y decimales largos
+    eleccion = aleatorio.random()
+    if eleccion < 0.3:
+        return 0
+    if eleccion < 0.5:
+        return aleatorio.randint(-maximo, maximo)
+    return round(aleatorio.uniform(-maximo, maximo), decimales)
+
+
+def generar_archivos_xm(directorio, filas_tx2, filas_txf, semilla):
+    """
+    Escribe archivos de XM sintéticos con la forma de los de `datos_termonorte/`.
+
+    Se generan `DIAS_XM` días de tdia_sis, totaldia, oefagnd y oefagnh (.tx2)
+    y un preofe mensual (.txf) con fechas en los dos formatos que usa XM.
+
+    :param directorio: Directorio donde se escriben los archivos.
+    :param filas_tx2: Códigos (filas) por archivo diario.
+    :param filas_txf: Filas del archivo preofe.
+    :param semilla: Semilla de los valores aleatorios.
+    :return: Lista de rutas escritas.
+    """
+    from esquemas_xm import HORAS
+
+    aleatorio = random.Random(semilla)
+    os.makedirs(directorio, exist_ok=True)
+    codigos = [f"C{numero:03d}" for numero in range(filas_tx2)]
+    rutas = []
+    for desplazamiento in range(DIAS_XM):
+        dia = FECHA + timedelta(days=desplazamiento)
+        sufijo = dia.strftime("%m%d")
+        archivos = {
+            f"tdia_sis{sufijo}.tx2": (
+                ["CODIGO", "DESCRIPCION", "VALOR"],
+                [(codigo, f"Precio del código {codigo}, en $/kWh", _valor(aleatorio, 1000)) for codigo in codigos],
+            ),
+            f"totaldia{sufijo}.tx2": (
+                ["CODIGO", "DESCRIPCION", "PLANTA", "VALOR"],
+                [(codigo, f"Costo de suministro {codigo} en $/MBTU.", "TRN1", _valor(aleatorio, 100000))
+                 for codigo in codigos],
+            ),
+            f"oefagnd{sufijo}.tx2": (
+                ["CONCEPTO", "DESCRIPCION", "VALOR"],
+                [(codigo, f"Desviación diaria {codigo} en kWh/día.", _valor(aleatorio, 10 ** 7, 12))
+                 for codigo in codigos],
+            ),
+            f"oefagnh{sufijo}.tx2": (
+                ["CONCEPTO", "DESCRIPCION", *HORAS],
+                [(codigo, f"Compras en bolsa {codigo} en kWh.", *(_valor(aleatorio, 10 ** 6) for _ in HORAS))
+                 for codigo in codigos],
+            ),
+        }
+        for nombre, (encabezado, filas) in archivos.items():
+            ruta = os.path.join(directorio, nombre)
+            _escribir_xm(ruta, encabezado, filas)
+            rutas.append(ruta)
+
+    # preofe mensual: submercado x fecha x configuración x concepto
+    meses = ["ENE", "FEB", "MAR", "ABR", "MAY", "JUN", "JUL", "AGO", "SEP", "OCT", "NOV", "DIC"]
+    filas = []
+    for numero in range(filas_txf):
+        dia = date(2024, 10, 1 + numero % 31)
+        # Una de cada cuatro fechas viene como 01-OCT-24
+        fecha = dia.isoformat() if numero % 4 else f"{dia.day:02d}-{meses[dia.month - 1]}-24"
+        submercado = f"{numero // 31 % 500:03d}W"
+        configuracion = ("LIQUIDACION", "DESPACHO", "REDESPACHO")[numero // (31 * 500) % 3]
+        concepto = ("PRECOG", "PRECIO", "DISPO")[numero // (31 * 500 * 3) % 3]
+        filas.append((submercado, fecha, configuracion, concepto, *(_valor(aleatorio, 500, 2) for _ in HORAS)))
+    ruta = os.path.join(directorio, "preofe10.txf")
+    _escribir_xm(ruta, ["SUBMERCADO", "FECHA", "CONFIGURACION", "CONCEPTO", *HORAS], filas)
+    rutas.append(ruta)
+    return rutas
+
+
+def generar_vep(directorio, dias, semilla):
+    """
+    Escribe `ARCHIVOS_VEP` reportes VEP sintéticos en UTF-8 con BOM.
+
+    Cada archivo cubre `dias` días y se solapa la mitad con el anterior, como
+    los reportes reales que se reenvían con días corregidos.
+
+    :param directorio: Directorio donde se escriben los archivos.
+    :param dias: Días por archivo.
+    :param semilla: Semilla de los valores aleatorios.
+    :return: Lista de rutas escritas.
+    """
+    aleatorio = random.Random(semilla)
+    os.makedirs(directorio, exist_ok=True)
+    rutas = []
+    for numero in range(ARCHIVOS_VEP):
+        inicio = FECHA + timedelta(days=numero * max(1, dias // 2))
+        ruta = os.path.join(directorio, f"vep_{numero + 1:02d}.csv")
+        with open(ruta, "w", encoding="utf-8-sig", newline="\r\n") as archivo:
+            archivo.write("FECHA;FUENTE;VALOR (KPCD)\n")
+            for desplazamiento in range(dias):
+                dia = (inicio + timedelta(days=desplazamiento)).strftime("%d/%m/%Y")
+                for fuente in FUENTES_VEP:
+                    valor = 0 if aleatorio.random() < 0.2 else f"{aleatorio.uniform(0, 60000):,.2f}"
+                    archivo.write(f"{dia};{fuente};{valor}\n")
+        rutas.append(ruta)
+    return rutas
+
+
+def _vaciar(engine, *tablas):
+    with engine.begin() as connection:
+        for tabla in tablas:
+            connection.execute(text(f"DROP TABLE IF EXISTS {tabla} CASCADE"))
+
+
+def medir_readmass(engine, pipeline, estrategia, registros, **etiquetas):
+    """
+    Mide una copia del día generado de prime u optimum_readmass con una estrategia.
+
+    El destino se vacía antes, de modo que todas las estrategias cargan lo mismo.
+
+    :param engine: Motor de SQLAlchemy de la base de benchmark.
+    :param pipeline: 'prime' u 'optimum'.
+    :param estrategia: 'copy', 'multi', 'idempotente' o 'en_bd'.
+    :param registros: Lista donde se acumulan los registros.
+    """
+    import pandas as pd
+    from carga_postgres import asegurar_indice_unico, cargar_dataframe
+
+    if pipeline == "prime":
+        import cgm_prime_readmass as modulo
+        consulta, params = modulo.consulta_dia(FECHA)
+    else:
+        import cgm_optimum_readmass as modulo
+        condicion, params = modulo.filtro_dia(FECHA)
+        consulta = text(f"SELECT * FROM cgm.optimum_readmass WHERE {condicion}")
+    tabla = f"{pipeline}_readmass"
+    with engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE cgm_test.{tabla}"))
+    etiquetas = dict(etiquetas, pipeline=pipeline, estrategia=estrategia)
+
+    if estrategia == "en_bd":
+        with medir_etapa(registros, etapa="en_bd", **etiquetas) as registro:
+            if pipeline == "prime":
+                registro["filas"] = modulo.copiar_en_bd(engine, FECHA)
+            else:
+                registro["filas"] = modulo.copiar_filas(engine, condicion, params, en_bd=True)
+        return
+
+    with medir_etapa(registros, etapa="extraccion", **etiquetas) as registro:
+        with engine.connect() as connection:
+            df = pd.read_sql_query(consulta, connection, params=params)
+        registro.update(filas=len(df), bytes=bytes_dataframe(df))
+    with medir_etapa(registros, etapa="transformacion", **etiquetas) as registro:
+        transformado = modulo.transformar(df)
+        registro.update(filas=len(transformado), bytes=bytes_dataframe(transformado))
+    del df
+    claves = None
+    if estrategia == "idempotente":
+        claves = modulo.CLAVES
+        asegurar_indice_unico(engine, tabla, "cgm_test", claves)
+    with medir_etapa(registros, etapa="carga", **etiquetas) as registro:
+        registro["filas"] = cargar_dataframe(transformado, engine, tabla, schema="cgm_test",
+                                             metodo=estrategia, claves=claves)
+        registro["bytes"] = bytes_dataframe(transformado)
+
+
+def medir_termonorte(engine, directorio, estrategia, registros, workers=1, **etiquetas):
+    """
+    Mide la carga de los archivos de XM generados.
+
+    'memoria' lee todos los archivos, los transforma y los carga en tres etapas;
+    'bloques' procesa solo el .txf por bloques (las tres etapas intercaladas),
+    para comparar su memoria con la del .txf leído completo.
+
+    :param engine: Motor de SQLAlchemy de la base de benchmark.
+    :param directorio: Directorio con los archivos generados.
+    :param estrategia: 'memoria' o 'bloques'.
+    :param registros: Lista donde se acumulan los registros.
+    :param workers: Procesos para leer los archivos (el pico de memoria solo cuenta el proceso principal).
+    """
+    import datos_termonorte
+
+    destino = datos_termonorte.TABLAS_DESTINO
+    _vaciar(engine, *(f"tmng.{tabla}" for tabla, _, _, _ in destino.values()))
+    etiquetas = dict(etiquetas, pipeline="termonorte", estrategia=estrategia)
+
+    if estrategia == "bloques":
+        ruta = os.path.join(directorio, "preofe10.txf")
+        with medir_etapa(registros, etapa="bloques", **etiquetas) as registro:
+            registro["filas"] = datos_termonorte.procesar_por_bloques(engine, ruta, parquet=False)
+            registro["bytes"] = os.path.getsize(ruta)
+        return
+
+    archivos = os.listdir(directorio)
+    with medir_etapa(registros, etapa="extraccion", **etiquetas) as registro:
+        file_types = datos_termonorte.clasificar_archivos(archivos)
+        dataframes, _ = datos_termonorte.leer_archivos(directorio, file_types, workers=workers)
+        registro["filas"] = sum(len(df) for df in dataframes.values())
+        registro["bytes"] = sum(os.path.getsize(os.path.join(directorio, archivo)) for archivo in archivos)
+    with medir_etapa(registros, etapa="transformacion", **etiquetas) as registro:
+        transformados = {
+            file_type: transformar(dataframes[file_type])
+            for file_type, (_, transformar, _, _) in destino.items() if file_type in dataframes
+        }
+        registro["filas"] = sum(len(df) for df in transformados.values())
+        registro["bytes"] = sum(bytes_dataframe(df) for df in transformados.values())
+    del dataframes
+    with medir_etapa(registros, etapa="carga", **etiquetas) as registro:
+        for file_type, df in transformados.items():
+            datos_termonorte.reemplazar_en_destino([df], engine, file_type)
+        registro["filas"] = sum(len(df) for df in transformados.values())
+        registro["bytes"] = sum(bytes_dataframe(df) for df in transformados.values())
+
+
+def medir_vep(engine, directorio, registros, **etiquetas):
+    """
+    Mide la lectura (con parseo de tipos y descarte de repetidos) y la carga de los VEP generados.
+
+    :param engine: Motor de SQLAlchemy de la base de benchmark.
+    :param directorio: Directorio con los archivos generados.
+    :param registros: Lista donde se acumulan los registros.
+    """
+    import volumen_entregado_productor as vep
+    from carga_postgres import reemplazar_filas
+
+    _vaciar(engine, f"public.{vep.TABLA}")
+    etiquetas = dict(etiquetas, pipeline="vep", estrategia="reemplazo")
+    rutas = vep.listar_archivos([directorio])
+    with medir_etapa(registros, etapa="extraccion", **etiquetas) as registro:
+        df = vep.leer_archivos(rutas)
+        registro["filas"] = len(df)
+        registro["bytes"] = sum(os.path.getsize(ruta) for ruta in rutas)
+    with medir_etapa(registros, etapa="carga", **etiquetas) as registro:
+        _, registro["filas"] = reemplazar_filas(df, engine, vep.TABLA, "public", vep.CLAVES)
+        registro["bytes"] = bytes_dataframe(df)
+
+
+def version_codigo():
+    """
+    Commit actual del repositorio (con '+' si hay cambios sin confirmar), o None fuera de git.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        cambios = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                                 text=True, check=True).stdout.strip()
+        return commit + ("+" if cambios else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def resumir(registros):
+    """
+    Agrupa los registros por (pipeline, estrategia, etapa) con la mediana de las repeticiones.
+
+    :param registros: Registros de una ejecución.
+    :return: Diccionario {(pipeline, estrategia, etapa): resumen}.
+    """
+    grupos = {}
+    for registro in registros:
+        grupos.setdefault((registro["pipeline"], registro["estrategia"], registro["etapa"]), []).append(registro)
+    return {
+        clave: {
+            "filas": grupo[-1]["filas"],
+            "segundos": statistics.median(r["segundos"] for r in grupo),
+            "segundos_max": max(r["segundos"] for r in grupo),
+            "filas_por_s": statistics.median(r["filas_por_s"] or 0 for r in grupo),
+            "mb_por_s": statistics.median(r["mb_por_s"] or 0 for r in grupo),
+            "pico_rss_mb": max(r["pico_rss_mb"] for r in grupo),
+            "incremento_rss_mb": max(r["incremento_rss_mb"] for r in grupo),
+        }
+        for clave, grupo in grupos.items()
+    }
+
+
+def ejecucion_anterior(ruta, ejecucion, escala, semilla):
+    """
+    Registros de la última ejecución anterior con la misma escala y semilla.
+
+    :return: Lista de registros (vacía si no hay una comparable).
+    """
+    if not os.path.isfile(ruta):
+        return []
+    por_ejecucion = {}
+    with open(ruta, encoding="utf-8") as archivo:
+        for linea in archivo:
+            if not linea.strip():
+                continue
+            registro = json.loads(linea)
+            if (registro["ejecucion"] != ejecucion and registro["escala"] == escala
+                    and registro["semilla"] == semilla):
+                por_ejecucion.setdefault(registro["ejecucion"], []).append(registro)
+    return por_ejecucion[max(por_ejecucion)] if por_ejecucion else []
+
+
+def imprimir_resumen(resumen, anterior=None):
+    """
+    Imprime la tabla de resultados y, si hay, la variación frente a la ejecución anterior.
+    """
+    anterior = anterior or {}
+    print(f"\n{'pipeline':<11}{'estrategia':<12}{'etapa':<15}{'filas':>10}{'p50 s':>9}{'max s':>9}"
+          f"{'filas/s':>12}{'MB/s':>8}{'pico MB':>9}{'+MB':>8}{'vs ant.':>9}")
+    for (pipeline, estrategia, etapa), datos in resumen.items():
+        previo = anterior.get((pipeline, estrategia, etapa))
+        variacion = ""
+        if previo and previo["segundos"] > 0:
+            variacion = f"{(datos['segundos'] / previo['segundos'] - 1) * 100:+.0f}%"
+        print(f"{pipeline:<11}{estrategia:<12}{etapa:<15}{datos['filas']:>10,}{datos['segundos']:>9.3f}"
+              f"{datos['segundos_max']:>9.3f}{datos['filas_por_s']:>12,.0f}{datos['mb_por_s']:>8.1f}"
+              f"{datos['pico_rss_mb']:>9.1f}{datos['incremento_rss_mb']:>8.1f}{variacion:>9}")
+
+
+def main(argv=None):
+    """
+    Genera los datos sintéticos, mide los pipelines y guarda los resultados.
+
+    :param argv: Argumentos de línea de comandos (por defecto los de sys.argv).
+    :return: Código de salida (0 si todas las etapas terminaron sin errores).
+    """
+    parser = argparse.ArgumentParser(description="Benchmark reproducible de los pipelines con datos sintéticos.")
+    parser.add_argument("--escala", type=float, default=1.0,
+                        help=f"Multiplica los tamaños base de los datos generados {TAMANOS}.")
+    parser.add_argument("--semilla", type=int, default=42, help="Semilla de los datos generados.")
+    parser.add_argument("--pipeline", action="append", choices=list(ESTRATEGIAS),
+                        help="Pipeline a medir; se puede repetir (por defecto todos).")
+    parser.add_argument("--estrategia", action="append",
+                        help=f"Estrategia a medir; se puede repetir (por defecto todas): {ESTRATEGIAS}.")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Veces que se mide cada estrategia.")
+    parser.add_argument("--workers", type=int, default=1, help="Procesos de lectura de los archivos de XM.")
+    parser.add_argument("--directorio", default=None,
+                        help="Directorio para los archivos generados (por defecto uno temporal).")
+    parser.add_argument("--salida", default=RESULTADOS, help="Archivo JSON lines donde se agregan los resultados.")
+    parser.add_argument("--permitir-remoto", action="store_true",
+                        help="Permite usar una base que no es local (el benchmark borra y recrea tablas).")
+    args = parser.parse_args(argv)
+
+    # Las métricas propias de los pipelines no se registran: las etapas las mide el benchmark
+    instrumentacion.METRICAS_ACTIVAS = False
+    engine = obtener_engine("bench")
+    if not es_local(engine) and not args.permitir_remoto:
+        parser.error(f"La base de benchmark ({engine.url.host}) no es local; use --permitir-remoto si es intencional.")
+
+    pipelines = args.pipeline or list(ESTRATEGIAS)
+    tam = tamanos(args.escala)
+    ejecucion = datetime.now().isoformat(timespec="seconds")
+    comunes = {"ejecucion": ejecucion, "version": version_codigo(), "escala": args.escala,
+               "semilla": args.semilla}
+
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as temporal:
+        directorio = args.directorio or temporal
+        if {"prime", "optimum"} & set(pipelines):
+            generar_readmass(engine, tam["filas_prime"], tam["filas_optimum"], tam["medidores"], args.semilla)
+        if "termonorte" in pipelines:
+            with engine.begin() as connection:
+                connection.execute(text("CREATE SCHEMA IF NOT EXISTS tmng"))
+            rutas = generar_archivos_xm(os.path.join(directorio, "xm"), tam["filas_tx2"], tam["filas_txf"],
+                                        args.semilla)
+            print(f"Generados {len(rutas)} archivos de XM en {os.path.join(directorio, 'xm')}")
+        if "vep" in pipelines:
+            rutas = generar_vep(os.path.join(directorio, "vep"), tam["dias_vep"], args.semilla)
+            print(f"Generados {len(rutas)} archivos VEP en {os.path.join(directorio, 'vep')}")
+
+        registros = []
+        con_error = False
+        for pipeline in pipelines:
+            for estrategia in ESTRATEGIAS[pipeline]:
+                if args.estrategia and estrategia not in args.estrategia:
+                    continue
+                for repeticion in range(1, args.repeticiones + 1):
+                    etiquetas = dict(comunes, repeticion=repeticion)
+                    try:
+                        if pipeline in ("prime", "optimum"):
+                            medir_readmass(engine, pipeline, estrategia, registros, **etiquetas)
+                        elif pipeline == "termonorte":
+                            medir_termonorte(engine, os.path.join(directorio, "xm"), estrategia, registros,
+                                             workers=args.workers, **etiquetas)
+                        else:
+                            medir_vep(engine, os.path.join(directorio, "vep"), registros, **etiquetas)
+                    except Exception as e:
+                        print(f"Error al medir {pipeline} con '{estrategia}': {e}")
+                        con_error = True
+                        break
+
+    anterior = ejecucion_anterior(args.salida, ejecucion, args.escala, args.semilla)
+    os.makedirs(os.path.dirname(args.salida) or ".", exist_ok=True)
+    with open(args.salida, "a", encoding="utf-8") as archivo:
+        for registro in registros:
+            archivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+    imprimir_resumen(resumir(registros), resumir(anterior))
+    if anterior:
+        print(f"\nComparado con la ejecución {anterior[0]['ejecucion']} (versión {anterior[0]['version']}).")
+    print(f"{len(registros)} mediciones agregadas a {args.salida}")
+    return 1 if con_error else 0
+
+
+if __name__ == "__main__":
+    exit(main())
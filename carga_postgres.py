@@ -0,0 +1,441 @@
+import time
+from decimal import Decimal
+
+from sqlalchemy import Numeric, inspect
+
+# Marcador de nulos usado en el formato CSV de COPY
+NULO_COPY = r"\N"
+
+# Filas que se serializan a CSV en cada bloque enviado por COPY
+FILAS_POR_BLOQUE = 50_000
+
+
+def identificador(nombre):
+    """
+    Cita un identificador de PostgreSQL (tabla, esquema o columna).
+
+    :param nombre: Nombre del identificador (string).
+    :return: Identificador entre comillas dobles.
+    """
+    return '"' + str(nombre).replace('"', '""') + '"'
+
+
+def nombre_tabla(tabla, schema=None):
+    """
+    Construye el nombre calificado `esquema.tabla` listo para usar en SQL.
+
+    :param tabla: Nombre de la tabla (string).
+    :param schema: Esquema de la tabla (string o None).
+    :return: Nombre calificado y citado.
+    """
+    if schema:
+        return f"{identificador(schema)}.{identificador(tabla)}"
+    return identificador(tabla)
+
+
+def tipos_sql(df):
+    """
+    Tipos de SQLAlchemy de las columnas que pandas no sabe mapear al crear una tabla.
+
+    Las columnas con valores decimal.Decimal se crean como numeric; pandas
+    las crearía como text.
+
+    :param df: DataFrame con los datos (no solo el encabezado).
+    :return: Diccionario {columna: tipo} para el parámetro `dtype` de `to_sql`.
+    """
+    tipos = {}
+    for columna in df.columns:
+        if df[columna].dtype != object:
+            continue
+        valores = df[columna].dropna()
+        if not valores.empty and isinstance(valores.iloc[0], Decimal):
+            tipos[columna] = Numeric()
+    return tipos
+
+
+def _normalizar_bloque(bloque):
+    """
+    Ajusta los tipos de un bloque para que COPY los acepte.
+
+    Las columnas enteras con nulos llegan de pandas como float (1.0); COPY no
+    las acepta en columnas integer, así que se pasan a `Int64` cuando todos
+    sus valores son enteros.
+    """
+    for columna in bloque.columns:
+        serie = bloque[columna]
+        if serie.dtype.kind != "f":
+            continue
+        valores = serie.dropna()
+        if valores.empty or not ((valores % 1 == 0) & (valores.abs() < 2**53)).all():
+            continue
+        bloque[columna] = serie.astype("Int64")
+    return bloque
+
+
+class _LectorCopy:
+    """
+    Objeto tipo archivo que serializa un DataFrame a CSV bajo demanda.
+
+    psycopg2 llama a `read(size)` mientras transmite el COPY, así que nunca
+    se tiene en memoria el CSV completo, solo un bloque de filas. El bloque
+    pendiente se recorre con una posición para no copiar el resto del texto
+    en cada lectura.
+    """
+
+    def __init__(self, df, columnas, filas_por_bloque=FILAS_POR_BLOQUE):
+        self._df = df
+        self._columnas = columnas
+        self._filas_por_bloque = filas_por_bloque
+        self._inicio = 0
+        self._pendiente = ""
+        self._posicion = 0
+        self.caracteres = 0
+
+    def _siguiente_bloque(self):
+        if self._inicio >= len(self._df):
+            return None
+        fin = self._inicio + self._filas_por_bloque
+        bloque = _normalizar_bloque(self._df.iloc[self._inicio:fin][self._columnas].copy())
+        self._inicio = fin
+        return bloque.to_csv(index=False, header=False, na_rep=NULO_COPY)
+
+    def read(self, size=-1):
+        while size < 0 or len(self._pendiente) - self._posicion < size:
+            texto = self._siguiente_bloque()
+            if texto is None:
+                break
+            # Solo se copia el resto sin leer del bloque anterior, una vez por bloque
+            self._pendiente = self._pendiente[self._posicion:] + texto
+            self._posicion = 0
+        fin = len(self._pendiente) if size < 0 else self._posicion + size
+        datos = self._pendiente[self._posicion:fin]
+        self._posicion += len(datos)
+        self.caracteres += len(datos)
+        return datos
+
+
+def copiar_dataframe(cursor, df, tabla, schema=None, columnas=None):
+    """
+    Escribe un DataFrame en una tabla con `COPY ... FROM STDIN`.
+
+    No hace commit: se ejecuta dentro de la transacción del cursor recibido,
+    lo que permite combinarlo con otras sentencias.
+
+    :param cursor: Cursor de psycopg2.
+    :param df: DataFrame con los datos a cargar.
+    :param tabla: Nombre de la tabla destino (string).
+    :param schema: Esquema de la tabla destino (string o None).
+    :param columnas: Orden de columnas a cargar; por defecto el del DataFrame.
+    :return: Número de filas copiadas.
+    """
+    columnas = list(columnas) if columnas is not None else list(df.columns)
+    if df.empty:
+        return 0
+    lista_columnas = ", ".join(identificador(c) for c in columnas)
+    sql = (
+        f"COPY {nombre_tabla(tabla, schema)} ({lista_columnas}) "
+        f"FROM STDIN WITH (FORMAT csv, NULL '{NULO_COPY}')"
+    )
+    cursor.copy_expert(sql, _LectorCopy(df, columnas))
+    return len(df)
+
+
+def escribir_idempotente(cursor, df, tabla, schema, claves, columnas=None):
+    """
+    Inserta o actualiza solo las filas nuevas o modificadas de un DataFrame.
+
+    El lote se copia con COPY a una tabla temporal; después se compara un hash
+    md5 de cada fila (sobre las columnas cargadas) con la fila del destino que
+    tiene las mismas claves y solo las filas nuevas o distintas pasan al
+    `INSERT ... ON CONFLICT (claves) DO UPDATE`. El destino necesita un índice
+    único sobre las claves, creado antes de la carga con `asegurar_indice_unico`;
+    si no existe se lanza un error en vez de crearlo aquí, porque crearlo
+    dentro de transacciones de carga concurrentes causa deadlocks.
+
+    :param cursor: Cursor de psycopg2 (no se hace commit).
+    :param df: DataFrame con los datos a cargar.
+    :param tabla: Nombre de la tabla destino (string).
+    :param schema: Esquema de la tabla destino (string o None).
+    :param claves: Columnas que identifican una fila.
+    :param columnas: Orden de columnas a cargar; por defecto el del DataFrame.
+    :return: Tupla (filas insertadas, filas actualizadas).
+    """
+    columnas = list(columnas) if columnas is not None else list(df.columns)
+    if df.empty:
+        return 0, 0
+    destino = nombre_tabla(tabla, schema)
+    temporal = identificador(f"_stage_{tabla}")
+    lista_columnas = ", ".join(identificador(c) for c in columnas)
+    lista_claves = ", ".join(identificador(c) for c in claves)
+    union = " AND ".join(f"t.{identificador(c)} = s.{identificador(c)}" for c in claves)
+    hash_destino = f"md5(ROW({', '.join(f't.{identificador(c)}' for c in columnas)})::text)"
+    hash_lote = f"md5(ROW({', '.join(f's.{identificador(c)}' for c in columnas)})::text)"
+    asignaciones = ", ".join(
+        f"{identificador(c)} = EXCLUDED.{identificador(c)}" for c in columnas if c not in claves
+    )
+
+    if not tiene_indice_unico(cursor, tabla, schema, claves):
+        raise RuntimeError(f"{destino} no tiene un índice único sobre ({lista_claves}); "
+                           f"créelo antes de la carga con asegurar_indice_unico.")
+    cursor.execute(
+        f"CREATE TEMP TABLE {temporal} ON COMMIT DROP AS SELECT {lista_columnas} FROM {destino} WITH NO DATA"
+    )
+    copiar_dataframe(cursor, df, f"_stage_{tabla}", columnas=columnas)
+    cursor.execute(f"""
+        WITH escritas AS (
+            INSERT INTO {destino} ({lista_columnas})
+            SELECT DISTINCT ON ({', '.join(f's.{identificador(c)}' for c in claves)})
+                   {', '.join(f's.{identificador(c)}' for c in columnas)}
+            FROM {temporal} s
+            LEFT JOIN {destino} t ON {union}
+            WHERE t.{identificador(claves[0])} IS NULL OR {hash_destino} <> {hash_lote}
+            ON CONFLICT ({lista_claves}) DO {f"UPDATE SET {asignaciones}" if asignaciones else "NOTHING"}
+            RETURNING (xmax = 0) AS insertada
+        )
+        SELECT count(*) FILTER (WHERE insertada), count(*) FILTER (WHERE NOT insertada)
+        FROM escritas
+    """)
+    return cursor.fetchone()
+
+
+def cargar_dataframe(df, engine, tabla, schema=None, columnas=None, metodo="copy", claves=None):
+    """
+    Carga un DataFrame en PostgreSQL e informa el rendimiento en filas/s.
+
+    :param df: DataFrame con los datos a cargar.
+    :param engine: Motor de SQLAlchemy de la base destino.
+    :param tabla: Nombre de la tabla destino (string).
+    :param schema: Esquema de la tabla destino (string o None).
+    :param columnas: Orden de columnas a cargar; por defecto el del DataFrame.
+    :param metodo: 'copy' (COPY FROM STDIN), 'multi' (to_sql con INSERT multi-fila)
+        o 'idempotente' (solo filas nuevas o modificadas, ver `escribir_idempotente`).
+    :param claves: Columnas que identifican una fila; obligatorio con 'idempotente'.
+    :return: Número de filas cargadas.
+    """
+    inicio = time.perf_counter()
+    detalle = ""
+    if metodo in ("copy", "idempotente"):
+        conexion = engine.raw_connection()
+        try:
+            with conexion.cursor() as cursor:
+                if metodo == "copy":
+                    filas = copiar_dataframe(cursor, df, tabla, schema, columnas)
+                else:
+                    insertadas, actualizadas = escribir_idempotente(cursor, df, tabla, schema, claves, columnas)
+                    filas = insertadas + actualizadas
+                    detalle = (f" [{insertadas} nuevas, {actualizadas} actualizadas, "
+                               f"{len(df) - filas} sin cambios]")
+            conexion.commit()
+        except Exception:
+            conexion.rollback()
+            raise
+        finally:
+            conexion.close()
+    elif metodo == "multi":
+        datos = df if columnas is None else df[list(columnas)]
+        datos.to_sql(tabla, con=engine, schema=schema, if_exists="append", index=False, method="multi")
+        filas = len(datos)
+    else:
+        raise ValueError(f"Método de carga no soportado: {metodo}")
+
+    duracion = time.perf_counter() - inicio
+    destino = f"{schema}.{tabla}" if schema else tabla
+    velocidad = filas / duracion if duracion > 0 else float("inf")
+    print(f"{filas} filas cargadas en {destino} con '{metodo}' en {duracion:.2f} s ({velocidad:,.0f} filas/s){detalle}")
+    return filas
+
+
+def reemplazar_filas(df, engine, tabla, schema, claves, columnas=None):
+    """
+    Reemplaza en el destino las filas cuyas claves aparecen en el DataFrame.
+
+    En una sola transacción se borran las filas del destino que comparten
+    valores de `claves` con el DataFrame y se carga el DataFrame con COPY; el
+    resto de la tabla no se toca. Si la tabla no existe se crea a partir del
+    DataFrame.
+
+    :param df: DataFrame con los datos a cargar.
+    :param engine: Motor de SQLAlchemy de la base destino.
+    :param tabla: Nombre de la tabla destino (string).
+    :param schema: Esquema de la tabla destino (string o None).
+    :param claves: Columnas cuyos valores delimitan las filas a reemplazar (p. ej. la fecha).
+    :param columnas: Orden de columnas a cargar; por defecto el del DataFrame.
+    :return: Tupla (filas borradas, filas cargadas).
+    """
+    return reemplazar_filas_por_bloques([df], engine, tabla, schema, claves, columnas)
+
+
+def reemplazar_filas_por_bloques(bloques, engine, tabla, schema, claves, columnas=None):
+    """
+    Igual que `reemplazar_filas`, pero recibe los datos como una secuencia de bloques.
+
+    Todos los bloques se cargan en la misma transacción; de cada bloque solo
+    se borran del destino las claves que no aparecieron en bloques anteriores,
+    así un bloque no borra lo que cargó el anterior. La memoria usada depende
+    del tamaño de un bloque y no del total.
+
+    :param bloques: Iterable de DataFrames con las mismas columnas.
+    :param engine: Motor de SQLAlchemy de la base destino.
+    :param tabla: Nombre de la tabla destino (string).
+    :param schema: Esquema de la tabla destino (string o None).
+    :param claves: Columnas cuyos valores delimitan las filas a reemplazar.
+    :param columnas: Orden de columnas a cargar; por defecto el de cada bloque.
+    :return: Tupla (filas borradas, filas cargadas).
+    """
+    destino = nombre_tabla(tabla, schema)
+    temporal = f"_claves_{tabla}"
+    lista_claves = ", ".join(identificador(c) for c in claves)
+    union = " AND ".join(f"d.{identificador(c)} = k.{identificador(c)}" for c in claves)
+
+    inicio = time.perf_counter()
+    borradas = filas = 0
+    vistas = set()
+    conexion = None
+    try:
+        for df in bloques:
+            if conexion is None:
+                if not inspect(engine).has_table(tabla, schema=schema):
+                    df.head(0).to_sql(tabla, engine, schema=schema, index=False, dtype=tipos_sql(df))
+                conexion = engine.raw_connection()
+                with conexion.cursor() as cursor:
+                    cursor.execute(
+                        f"CREATE TEMP TABLE {identificador(temporal)} ON COMMIT DROP "
+                        f"AS SELECT {lista_claves} FROM {destino} WITH NO DATA"
+                    )
+            nuevas = df[list(claves)].drop_duplicates()
+            nuevas = nuevas[[tuple(fila) not in vistas for fila in nuevas.itertuples(index=False)]]
+            vistas.update(tuple(fila) for fila in nuevas.itertuples(index=False))
+            with conexion.cursor() as cursor:
+                if not nuevas.empty:
+                    cursor.execute(f"TRUNCATE {identificador(temporal)}")
+                    copiar_dataframe(cursor, nuevas, temporal)
+                    cursor.execute(f"DELETE FROM {destino} d USING {identificador(temporal)} k WHERE {union}")
+                    borradas += cursor.rowcount
+                filas += copiar_dataframe(cursor, df, tabla, schema, columnas)
+        if conexion is not None:
+            conexion.commit()
+    except Exception:
+        if conexion is not None:
+            conexion.rollback()
+        raise
+    finally:
+        if conexion is not None:
+            conexion.close()
+
+    duracion = time.perf_counter() - inicio
+    destino = f"{schema}.{tabla}" if schema else tabla
+    print(f"{filas} filas cargadas en {destino} reemplazando {borradas} existentes en {duracion:.2f} s")
+    return borradas, filas
+
+
+def asegurar_indice(engine, tabla, schema, columnas):
+    """
+    Crea un índice sobre las columnas indicadas si todavía no existe.
+
+    :param engine: Motor de SQLAlchemy.
+    :param tabla: Nombre de la tabla (string).
+    :param schema: Esquema de la tabla (string o None).
+    :param columnas: Columnas del índice.
+    """
+    indice = identificador(f"{tabla}_{'_'.join(columnas)}_idx")
+    lista_columnas = ", ".join(identificador(c) for c in columnas)
+    with engine.begin() as connection:
+        connection.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {indice} ON {nombre_tabla(tabla, schema)} ({lista_columnas})")
+
+
+def tiene_indice_unico(cursor, tabla, schema, claves):
+    """
+    Indica si la tabla tiene un índice único y válido exactamente sobre las claves.
+
+    :param cursor: Cursor de psycopg2.
+    :param tabla: Nombre de la tabla (string).
+    :param schema: Esquema de la tabla (string o None).
+    :param claves: Columnas que identifican una fila.
+    :return: True si el índice existe.
+    """
+    cursor.execute(
+        """
+        SELECT EXISTS (
+            SELECT 1
+            FROM pg_index i
+            WHERE i.indrelid = %s::regclass
+              AND i.indisunique AND i.indisvalid
+              AND i.indpred IS NULL AND i.indexprs IS NULL
+              AND (SELECT array_agg(a.attname::text ORDER BY a.attname::text)
+                   FROM pg_attribute a
+                   WHERE a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)) = %s::text[]
+        )
+        """,
+        (nombre_tabla(tabla, schema), sorted(claves)),
+    )
+    return cursor.fetchone()[0]
+
+
+def asegurar_indice_unico(engine, tabla, schema, claves, depurar_por=None, muestra=10):
+    """
+    Crea el índice único sobre las claves que usa `escribir_idempotente`, si no existe.
+
+    Es el único lugar donde se crea el índice y debe llamarse antes de la
+    carga, fuera de las transacciones que escriben. Un bloqueo consultivo
+    serializa a varios procesos que lo intenten a la vez.
+
+    Si el destino ya tiene filas repetidas para las claves, por defecto no se
+    toca nada y se lanza un error con las claves repetidas. Solo con
+    `depurar_por` se borran: por cada clave se conserva la fila con el valor
+    más reciente de esa columna (los nulos cuentan como los más antiguos; si
+    empatan se conserva una cualquiera de las empatadas).
+
+    :param engine: Motor de SQLAlchemy.
+    :param tabla: Nombre de la tabla (string).
+    :param schema: Esquema de la tabla (string o None).
+    :param claves: Columnas que identifican una fila.
+    :param depurar_por: Columna de fecha de actualización con la que se elige
+        la fila que se conserva; None para no borrar nada.
+    :param muestra: Claves repetidas que se incluyen en el error.
+    :return: Número de filas repetidas borradas.
+    """
+    destino = nombre_tabla(tabla, schema)
+    indice = f"{tabla}_{'_'.join(claves)}_uidx"
+    lista_claves = ", ".join(identificador(c) for c in claves)
+    # El índice único admite claves con nulos repetidas: esas filas no cuentan
+    sin_nulos = " AND ".join(f"{identificador(c)} IS NOT NULL" for c in claves)
+    borradas = 0
+    conexion = engine.raw_connection()
+    try:
+        with conexion.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"{destino}.{indice}",))
+            if tiene_indice_unico(cursor, tabla, schema, claves):
+                conexion.commit()
+                return 0
+            cursor.execute(f"LOCK TABLE {destino} IN SHARE ROW EXCLUSIVE MODE")
+            cursor.execute(
+                f"SELECT {lista_claves}, count(*), count(*) OVER () FROM {destino} WHERE {sin_nulos} "
+                f"GROUP BY {lista_claves} HAVING count(*) > 1 ORDER BY count(*) DESC LIMIT {int(muestra)}"
+            )
+            repetidas = cursor.fetchall()
+            if repetidas and depurar_por is None:
+                ejemplos = "\n".join(f"  {dict(zip(claves, fila[:-2]))}: {fila[-2]} filas" for fila in repetidas)
+                raise RuntimeError(
+                    f"{destino} tiene {repetidas[0][-1]} claves ({lista_claves}) repetidas y no se puede crear "
+                    f"el índice único. Corrija los datos o depure los repetidos conservando la fila más reciente "
+                    f"(depurar_por). Claves con más filas:\n{ejemplos}"
+                )
+            if repetidas:
+                cursor.execute(
+                    f"DELETE FROM {destino} WHERE ctid IN ("
+                    f"SELECT ctid FROM (SELECT ctid, row_number() OVER (PARTITION BY {lista_claves} "
+                    f"ORDER BY {identificador(depurar_por)} DESC NULLS LAST) AS orden "
+                    f"FROM {destino} WHERE {sin_nulos}) r WHERE orden > 1)"
+                )
+                borradas = cursor.rowcount
+            cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {identificador(indice)} ON {destino} ({lista_claves})")
+        conexion.commit()
+    except Exception:
+        conexion.rollback()
+        raise
+    finally:
+        conexion.close()
+    if borradas:
+        print(f"{borradas} filas repetidas borradas de {destino} antes de crear el índice único ({lista_claves}), "
+              f"conservando la más reciente por {depurar_por}")
+    return borradas
@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+import cgm_optimum_readmass
+import cgm_prime_readmass
+from conexiones import obtener_engine
+from estado_local import DIRECTORIO_ESTADO
+from medidores_cgm import contar_medidores
+
+# Carga histórica de las tablas readmass de CGM por particiones diarias.
+# Cada día terminado se registra en un diario local (JSON lines), de modo que
+# una carga interrumpida se reanuda desde los días pendientes.
+
+
+def ruta_diario(tabla):
+    """
+    Devuelve la ruta del diario de la carga histórica de una tabla.
+
+    :param tabla: 'prime' u 'optimum'.
+    :return: Ruta del archivo de diario.
+    """
+    return os.path.join(DIRECTORIO_ESTADO, f"backfill_{tabla}_readmass.jsonl")
+
+
+def leer_diario(ruta):
+    """
+    Lee los días ya completados de un diario.
+
+    :param ruta: Ruta del archivo de diario.
+    :return: Conjunto de fechas (string YYYY-MM-DD) completadas.
+    """
+    if not os.path.isfile(ruta):
+        return set()
+    completados = set()
+    with open(ruta, encoding="utf-8") as archivo:
+        for linea in archivo:
+            linea = linea.strip()
+            if linea:
+                completados.add(json.loads(linea)["fecha"])
+    return completados
+
+
+class Diario:
+    """
+    Registro de solo-anexar de los días completados, seguro entre hilos.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+
+    def registrar(self, fecha, filas):
+        registro = {"fecha": fecha.isoformat(), "filas": filas, "terminado": datetime.now().isoformat()}
+        with self._lock, open(self.ruta, "a", encoding="utf-8") as archivo:
+            archivo.write(json.dumps(registro) + "\n")
+            archivo.flush()
+            os.fsync(archivo.fileno())
+
+
+def dias(desde, hasta):
+    """
+    Genera los días del rango [desde, hasta], ambos incluidos.
+    """
+    dia = desde
+    while dia <= hasta:
+        yield dia
+        dia += timedelta(days=1)
+
+
+def copiar_particion(modulo, engine, fecha, modo, chunksize):
+    """
+    Copia un día completo de la tabla indicada.
+
+    Antes de copiar se borran del destino las filas del día, para que un día
+    interrumpido en una ejecución anterior no quede duplicado al reanudar.
+
+    :return: Número de filas cargadas.
+    """
+    borradas = modulo.borrar_dia(engine, fecha)
+    if borradas:
+        print(f"{fecha}: {borradas} filas previas borradas del destino")
+    if modulo is cgm_prime_readmass:
+        return modulo.copiar_dia(engine, fecha, modo=modo, chunksize=chunksize)
+    return modulo.copiar_dia(engine, fecha, en_bd=modo == "en_bd")
+
+
+def ejecutar_backfill(tabla, desde, hasta, concurrencia=1, modo="streaming", chunksize=None, ruta=None):
+    """
+    Copia un rango de días con concurrencia acotada, reanudando desde el diario.
+
+    :param tabla: 'prime' u 'optimum'.
+    :param desde: Primer día del rango (date).
+    :param hasta: Último día del rango, incluido (date).
+    :param concurrencia: Número de días que se copian a la vez.
+    :param modo: Modo de copia ('completo', 'streaming' o 'en_bd').
+    :param chunksize: Filas por bloque en modo streaming (solo prime).
+    :param ruta: Ruta del diario; por defecto la de la tabla.
+    :return: Diccionario {fecha: filas cargadas o excepción} de los días ejecutados.
+    """
+    modulo = cgm_prime_readmass if tabla == "prime" else cgm_optimum_readmass
+    chunksize = chunksize or cgm_prime_readmass.CHUNKSIZE
+    diario = Diario(ruta or ruta_diario(tabla))
+    completados = leer_diario(diario.ruta)
+    pendientes = [dia for dia in dias(desde, hasta) if dia.isoformat() not in completados]
+    print(f"{len(pendientes)} días pendientes de {tabla}_readmass "
+          f"({len(completados)} ya registrados en {diario.ruta})")
+    if not pendientes:
+        return {}
+
+    # Pool con dos conexiones por día en curso: una para leer y otra para cargar
+    engine = obtener_engine("pg", pool_size=2 * concurrencia)
+    print(f"{contar_medidores(engine)} medidores configurados en cgm_test.rfc_config")
+
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+        futuros = {
+            executor.submit(copiar_particion, modulo, engine, dia, modo, chunksize): dia
+            for dia in pendientes
+        }
+        for futuro in as_completed(futuros):
+            dia = futuros[futuro]
+            try:
+                resultados[dia] = futuro.result()
+                diario.registrar(dia, resultados[dia])
+                print(f"{dia}: {resultados[dia]} filas cargadas")
+            except Exception as e:
+                resultados[dia] = e
+                print(f"Error al copiar el día {dia}: {e}")
+    return resultados
+
+
+def main(argv=None):
+    """
+    Ejecuta la carga histórica de un rango de días.
+
+    :param argv: Argumentos de línea de comandos (por defecto los de sys.argv).
+    :return: Código de salida (0 si todo terminó sin errores).
+    """
+    parser = argparse.ArgumentParser(description="Carga histórica por días de las tablas readmass de CGM.")
+    parser.add_argument("tabla", choices=["prime", "optimum"], help="Tabla readmass a copiar.")
+    parser.add_argument("--desde", required=True, type=date.fromisoformat, help="Primer día (YYYY-MM-DD).")
+    parser.add_argument("--hasta", required=True, type=date.fromisoformat, help="Último día, incluido (YYYY-MM-DD).")
+    parser.add_argument("--concurrencia", type=int, default=4, help="Días que se copian a la vez.")
+    parser.add_argument("--modo", choices=["completo", "streaming", "en_bd"], default="streaming",
+                        help="Modo de copia de cada día ('completo' y 'streaming' son equivalentes en optimum).")
+    parser.add_argument("--chunksize", type=int, default=None, help="Filas por bloque en modo streaming.")
+    parser.add_argument("--diario", default=None, help="Ruta del diario de días completados.")
+    args = parser.parse_args(argv)
+
+    resultados = ejecutar_backfill(args.tabla, args.desde, args.hasta, concurrencia=args.concurrencia,
+                                   modo=args.modo, chunksize=args.chunksize, ruta=args.diario)
+    fallidos = sorted(dia for dia, resultado in resultados.items() if isinstance(resultado, Exception))
+    if fallidos:
+        print(f"Días con error (se reintentarán en la próxima ejecución): {[d.isoformat() for d in fallidos]}")
+        return 1
+    print("Carga histórica finalizada.")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -1,56 +1,56 @@
+import argparse
 import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import timedelta
+from carga_postgres import cargar_dataframe
+from conexiones import obtener_engine
+from instrumentacion import bytes_dataframe, depurar, etapa
+from estado_local import leer_estado, guardar_estado
+from medidores_cgm import contar_medidores, filtro_medidores
+from transferencia_bd import transferir_en_bd
 
-# Extraer datos de prime_readmass usando los noins de rfc_config_test
+# Extraer datos de optimum_readmass usando los medidores de rfc_config, de forma
+# incremental a partir de la última marca (datetime_pc, m_profile_id) cargada
 
-# Cargar las variables de entorno desde el archivo .env
-load_dotenv()
+# Método de carga: 'copy' (COPY FROM STDIN, por defecto) o 'multi' (to_sql)
+METODO_CARGA = os.getenv('CGM_METODO_CARGA', 'copy')
 
-# Recuperar las credenciales de la base de datos desde el archivo .env
-PGPASSWORD = os.getenv('PGPASSWORD')
-PG_HOST = os.getenv('PG_HOST')
-PG_PORT = os.getenv('PG_PORT')
-PG_USER = os.getenv('PG_USER')
-PG_DB = os.getenv('PG_DB')
+# Nombre del estado local donde se guarda la marca de agua
+ESTADO_MARCA = 'cgm_optimum_readmass_marca'
 
-# Crear la cadena de conexión a PostgreSQL usando SQLAlchemy
-DATABASE_URL = f"postgresql://{PG_USER}:{PGPASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DB}"
+# Nombre del pipeline en las métricas de instrumentacion
+PIPELINE = 'optimum_readmass'
 
-# Crear un motor de conexión
-engine = create_engine(DATABASE_URL)
-
-# Calcular la fecha del día de ayer
-yesterday = (datetime.now() - timedelta(days=1)).date()
-
-# Consulta SQL para obtener los valores de la columna medidor
-medidor_query = text("""
-    SELECT medidor
-    FROM cgm_test.rfc_config
+# Última marca cargada en el destino, usada si no hay marca local
+marca_destino_query = text("""
+    SELECT datetime_pc, m_profile_id
+    FROM cgm_test.optimum_readmass
+    ORDER BY datetime_pc DESC, m_profile_id DESC
+    LIMIT 1
 """)
 
-# Ejecutar la consulta para obtener el listado de specific_noins
-with engine.connect() as connection:
-    medidor_df = pd.read_sql_query(medidor_query, connection)
-    specific_noins = medidor_df['medidor'].tolist()  # Convertir la columna a una lista
+# Filtro de los medidores configurados, resuelto en el servidor contra rfc_config
+filtro_configurados, _ = filtro_medidores("meter_id")
 
-# Consulta SQL para extraer la información
-query = text("""
-    SELECT *
+# Última marca disponible en el origen para los medidores configurados
+marca_origen_query = text(f"""
+    SELECT datetime_pc, m_profile_id
     FROM cgm.optimum_readmass
+    WHERE {filtro_configurados}
+    ORDER BY datetime_pc DESC, m_profile_id DESC
+    LIMIT 1
 """)
 
-# Ejecutar la consulta y cargar los resultados en un DataFrame
-with engine.connect() as connection:
-    df = pd.read_sql_query(query, connection, params={"noins": specific_noins})
-
-# Mostrar el DataFrame
-print(df)
+# Filtro de filas nuevas: (desde, hasta] sobre la marca (datetime_pc, m_profile_id)
+filtro_incremental = f"""
+    {filtro_configurados}
+    AND (datetime_pc, m_profile_id) <= (:hasta_dt, :hasta_id)
+"""
+filtro_desde = """
+    AND (datetime_pc, m_profile_id) > (:desde_dt, :desde_id)
+"""
 
-
-# Transformación del DataFrame
 # Seleccionar y renombrar columnas según el DDL de la nueva tabla
 columns_mapping = {"m_profile_id":"m_profile_id",
 "meter_id":"meter_id",
@@ -70,27 +70,209 @@ columns_mapping = {"m_profile_id":"m_profile_id",
 }
 
 
-# Filtrar y renombrar columnas según el mapeo
-transformed_df = df[list(columns_mapping.keys())].rename(columns=columns_mapping)
-transformed_df['idsocket'] = 'prueba'
-transformed_df['is_backup'] = 0
+def _marca(fila):
+    """
+    Convierte una fila (datetime_pc, m_profile_id) en una marca serializable.
+    """
+    if fila is None:
+        return None
+    datetime_pc, m_profile_id = fila
+    return {"datetime_pc": pd.Timestamp(datetime_pc).isoformat(), "m_profile_id": m_profile_id}
+
+
+def leer_marca(engine):
+    """
+    Recupera la marca de agua de la última carga.
+
+    Se usa la marca guardada localmente; si no existe, se toma la última fila
+    del destino, de modo que la primera ejecución no vuelve a copiar el histórico.
+
+    :param engine: Motor de SQLAlchemy.
+    :return: Diccionario con `datetime_pc` y `m_profile_id`, o None.
+    """
+    marca = leer_estado(ESTADO_MARCA)
+    if marca is not None:
+        return marca
+    with engine.connect() as connection:
+        return _marca(connection.execute(marca_destino_query).first())
+
+
+def filtro_pendientes(desde, hasta):
+    """
+    Construye la condición WHERE y los parámetros de las filas pendientes.
+
+    :param desde: Marca de la última carga (o None para copiar desde el inicio).
+    :param hasta: Marca máxima a copiar en esta ejecución.
+    :return: Tupla (condición SQL, parámetros).
+    """
+    condicion = filtro_incremental
+    params = {"hasta_dt": hasta["datetime_pc"], "hasta_id": hasta["m_profile_id"]}
+    if desde is not None:
+        condicion += filtro_desde
+        params.update({"desde_dt": desde["datetime_pc"], "desde_id": desde["m_profile_id"]})
+    return condicion, params
+
+
+# Columnas constantes que se agregan en el destino
+constantes = {'idsocket': 'prueba', 'is_backup': 0}
+
+
+def transformar(df):
+    """
+    Selecciona y renombra las columnas según el DDL de la tabla destino.
+
+    :param df: DataFrame extraído de `cgm.optimum_readmass`.
+    :return: DataFrame transformado.
+    """
+    transformed_df = df[list(columns_mapping.keys())].rename(columns=columns_mapping)
+    for columna, valor in constantes.items():
+        transformed_df[columna] = valor
+    return transformed_df
+
+
+def copiar_filas(engine, condicion, params, metodo=METODO_CARGA, en_bd=False):
+    """
+    Copia a `cgm_test.optimum_readmass` las filas del origen que cumplen la condición.
+
+    :param engine: Motor de SQLAlchemy.
+    :param condicion: Condición WHERE sobre `cgm.optimum_readmass`.
+    :param params: Parámetros de la condición.
+    :param metodo: Método de carga ('copy' o 'multi').
+    :param en_bd: Si es True, copia con INSERT ... SELECT en el servidor sin
+        pasar las filas por Python (origen y destino en la misma base).
+    :return: Número de filas cargadas.
+    """
+    if en_bd:
+        with etapa(PIPELINE, "en_bd") as registro:
+            registro["filas"] = transferir_en_bd(
+                engine,
+                'cgm.optimum_readmass',
+                'cgm_test.optimum_readmass',
+                columns_mapping,
+                constantes=constantes,
+                condicion=condicion,
+                params=params,
+            )
+        return registro["filas"]
+
+    query = text(f"SELECT * FROM cgm.optimum_readmass WHERE {condicion}")
+
+    # Ejecutar la consulta y cargar los resultados en un DataFrame
+    with etapa(PIPELINE, "extraccion") as registro:
+        with engine.connect() as connection:
+            df = pd.read_sql_query(query, connection, params=params)
+        registro.update(filas=len(df), bytes=bytes_dataframe(df))
+    depurar("DataFrame extraído:", df)
+
+    with etapa(PIPELINE, "transformacion") as registro:
+        transformed_df = transformar(df)
+        registro.update(filas=len(transformed_df), bytes=bytes_dataframe(transformed_df))
+    depurar("DataFrame transformado:", transformed_df)
+
+    # Cargar los datos transformados a la base de datos
+    with etapa(PIPELINE, "carga", metodo=metodo) as registro:
+        registro["filas"] = cargar_dataframe(
+            transformed_df,
+            engine,
+            'optimum_readmass',   # Nombre de la tabla destino
+            schema='cgm_test',    # Esquema de la base de datos
+            metodo=metodo,        # COPY por defecto; 'multi' para comparar con to_sql
+        )
+        registro["bytes"] = bytes_dataframe(transformed_df)
+    return registro["filas"]
+
+
+def copiar_incremental(engine, metodo=METODO_CARGA, en_bd=False):
+    """
+    Copia a `cgm_test.optimum_readmass` solo las filas posteriores a la marca.
+
+    La marca máxima se fija antes de extraer, así que las filas que lleguen
+    durante la copia quedan para la siguiente ejecución. La marca se guarda
+    solo después de cargar.
+
+    :param engine: Motor de SQLAlchemy.
+    :param metodo: Método de carga ('copy' o 'multi').
+    :param en_bd: Si es True, copia en el servidor con INSERT ... SELECT.
+    :return: Número de filas cargadas.
+    """
+    desde = leer_marca(engine)
+    with engine.connect() as connection:
+        hasta = _marca(connection.execute(marca_origen_query).first())
+    if hasta is None or hasta == desde:
+        print("No hay filas nuevas en cgm.optimum_readmass.")
+        return 0
+    print(f"Copiando filas posteriores a {desde} hasta {hasta}")
+
+    condicion, params = filtro_pendientes(desde, hasta)
+    filas = copiar_filas(engine, condicion, params, metodo=metodo, en_bd=en_bd)
+    guardar_estado(ESTADO_MARCA, hasta)
+    return filas
+
+
+def filtro_dia(fecha, fragmento=None):
+    """
+    Construye el filtro de las filas de un día completo, usado en las cargas históricas.
+
+    :param fecha: Día a copiar (date).
+    :param fragmento: Fragmento (parte, partes) de los medidores, o None para todos.
+    :return: Tupla (condición SQL, parámetros).
+    """
+    medidores, params = filtro_medidores("meter_id", fragmento)
+    condicion = f"{medidores} AND datetime_pc >= :inicio AND datetime_pc < :fin"
+    return condicion, {"inicio": fecha, "fin": fecha + timedelta(days=1), **params}
+
+
+def borrar_dia(engine, fecha, fragmento=None):
+    """
+    Borra del destino las filas de un día para los medidores configurados.
+
+    :param engine: Motor de SQLAlchemy.
+    :param fecha: Día a borrar (date).
+    :param fragmento: Fragmento (parte, partes) de los medidores, o None para todos.
+    :return: Número de filas borradas.
+    """
+    condicion, params = filtro_dia(fecha, fragmento)
+    with engine.begin() as connection:
+        return connection.execute(
+            text(f"DELETE FROM cgm_test.optimum_readmass WHERE {condicion}"),
+            params,
+        ).rowcount
+
+
+def copiar_dia(engine, fecha, fragmento=None, metodo=METODO_CARGA, en_bd=False):
+    """
+    Copia las filas de un día (por `datetime_pc`) sin tocar la marca de agua.
+
+    :param engine: Motor de SQLAlchemy.
+    :param fecha: Día a copiar (date).
+    :param fragmento: Fragmento (parte, partes) de los medidores, o None para todos.
+    :param metodo: Método de carga ('copy' o 'multi').
+    :param en_bd: Si es True, copia en el servidor con INSERT ... SELECT.
+    :return: Número de filas cargadas.
+    """
+    condicion, params = filtro_dia(fecha, fragmento)
+    return copiar_filas(engine, condicion, params, metodo=metodo, en_bd=en_bd)
+
+
+def main(argv=None):
+    """
+    Copia de forma incremental las filas nuevas de optimum_readmass.
 
-# Verificar la transformación
-print("DataFrame transformado:")
-print(transformed_df.head())
+    :param argv: Argumentos de línea de comandos (por defecto los de sys.argv).
+    :return: Código de salida (0 si todo terminó sin errores).
+    """
+    parser = argparse.ArgumentParser(description="Copia de forma incremental cgm.optimum_readmass a cgm_test.optimum_readmass.")
+    parser.add_argument("--modo", choices=["python", "en_bd"], default="python",
+                        help="'python' extrae y carga desde el cliente; 'en_bd' copia con INSERT ... SELECT en el servidor.")
+    args = parser.parse_args(argv)
+    engine = obtener_engine("pg")
 
-# Cargar los datos transformados a la base de datos
-with engine.connect() as connection:
-    # Insertar los datos en la tabla destino
-    transformed_df.to_sql(  
-        'optimum_readmass',  # Nombre de la tabla destino
-        con=engine,          # Conexión a la base de datos
-        schema='cgm_test',   # Esquema de la base de datos
-        if_exists='append',  # Añadir registros a la tabla
-        index=False,         # No incluir el índice del DataFrame
-        method='multi'       # Método de inserción para mayor eficiencia
-    )
+    # Los medidores se filtran en el servidor contra rfc_config; aquí solo se informa cuántos hay
+    print(f"{contar_medidores(engine)} medidores configurados en cgm_test.rfc_config")
+    copiar_incremental(engine, en_bd=args.modo == "en_bd")
+    print("Datos cargados correctamente en cgm_test.optimum_readmass.")
+    return 0
 
-print("Datos cargados correctamente en cgm_test.optimum_readmass.")
 
-# Verificar si la vista y las tablas cumplen con los requerimientos
\ No newline at end of file
+if __name__ == "__main__":
+    exit(main())
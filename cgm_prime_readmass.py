@@ -1,57 +1,37 @@
+import argparse
 import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sqlalchemy import text
 import pandas as pd
 from datetime import datetime, timedelta
+from carga_postgres import asegurar_indice_unico, cargar_dataframe
+from conexiones import obtener_engine
+from instrumentacion import bytes_dataframe, depurar, etapa, medir_bloques
+from medidores_cgm import contar_medidores, filtro_medidores, fragmentos
+from transferencia_bd import transferir_en_bd
 
-# Extraer datos de prime_readmass usando los noins de rfc_config_test
+# Extraer datos de prime_readmass de los medidores configurados en rfc_config
 
-# Cargar las variables de entorno desde el archivo .env
-load_dotenv()
+# Método de carga: 'copy' (COPY FROM STDIN, por defecto) o 'multi' (to_sql)
+METODO_CARGA = os.getenv('CGM_METODO_CARGA', 'copy')
 
-# Recuperar las credenciales de la base de datos desde el archivo .env
-PGPASSWORD = os.getenv('PGPASSWORD')
-PG_HOST = os.getenv('PG_HOST')
-PG_PORT = os.getenv('PG_PORT')
-PG_USER = os.getenv('PG_USER')
-PG_DB = os.getenv('PG_DB')
+# Filas por bloque en el modo streaming
+CHUNKSIZE = int(os.getenv('CGM_CHUNKSIZE', '50000'))
 
-# Crear la cadena de conexión a PostgreSQL usando SQLAlchemy
-DATABASE_URL = f"postgresql://{PG_USER}:{PGPASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DB}"
+# Número de fragmentos de medidores que se copian en paralelo
+PARALELO = int(os.getenv('CGM_PARALELO', '1'))
 
-# Crear un motor de conexión
-engine = create_engine(DATABASE_URL)
+# Nombre del pipeline en las métricas de instrumentacion
+PIPELINE = 'prime_readmass'
 
-# Calcular la fecha del día de ayer
-yesterday = (datetime.now() - timedelta(days=1)).date()
+# Claves de una lectura en el destino, usadas por la carga idempotente
+CLAVES = ["noins", "channel", "datetime"]
 
-# Consulta SQL para obtener los valores de la columna medidor
-medidor_query = text("""
-    SELECT medidor
-    FROM cgm_test.rfc_config
-""")
+# Fecha de actualización de una lectura: decide cuál conservar al depurar repetidos
+COLUMNA_ACTUALIZACION = "fecha_update"
 
-# Ejecutar la consulta para obtener el listado de specific_noins
-with engine.connect() as connection:
-    medidor_df = pd.read_sql_query(medidor_query, connection)
-    specific_noins = medidor_df['medidor'].tolist()  # Convertir la columna a una lista
 
-# Consulta SQL para extraer la información
-query = text("""
-    SELECT *
-    FROM cgm.prime_readmass
-    WHERE datetime = :date AND noins = ANY(:noins)
-""")
-
-# Ejecutar la consulta y cargar los resultados en un DataFrame
-with engine.connect() as connection:
-    df = pd.read_sql_query(query, connection, params={"date": yesterday, "noins": specific_noins})
-
-# Mostrar el DataFrame
-print(df)
-
-
-# Transformación del DataFrame
 # Seleccionar y renombrar columnas según el DDL de la nueva tabla
 columns_mapping = {
     "noins": "noins",
@@ -95,25 +75,270 @@ columns_mapping = {
     "fecha_update": "fecha_update",
 }
 
-# Filtrar y renombrar columnas según el mapeo
-transformed_df = df[list(columns_mapping.keys())].rename(columns=columns_mapping)
 
-# Verificar la transformación
-print("DataFrame transformado:")
-print(transformed_df.head())
+def filtro_dia(fecha, fragmento=None):
+    """
+    Construye el filtro de las filas de un día de los medidores configurados.
+
+    :param fecha: Día a copiar (date).
+    :param fragmento: Fragmento (parte, partes) de los medidores, o None para todos.
+    :return: Tupla (condición SQL, parámetros).
+    """
+    medidores, params = filtro_medidores("noins", fragmento)
+    return f"datetime = :date AND {medidores}", {"date": fecha, **params}
+
+
+def consulta_dia(fecha, fragmento=None):
+    """
+    Consulta SQL para extraer la información de un día.
+
+    :return: Tupla (consulta SQLAlchemy, parámetros).
+    """
+    condicion, params = filtro_dia(fecha, fragmento)
+    return text(f"""
+        SELECT *
+        FROM cgm.prime_readmass
+        WHERE {condicion}
+    """), params
+
+
+def transformar(df):
+    """
+    Selecciona y renombra las columnas según el DDL de la tabla destino.
+
+    :param df: DataFrame extraído de `cgm.prime_readmass`.
+    :return: DataFrame transformado.
+    """
+    return df[list(columns_mapping.keys())].rename(columns=columns_mapping)
+
+
+def copiar_completo(engine, fecha, fragmento=None, metodo=METODO_CARGA):
+    """
+    Extrae el día completo en un solo DataFrame, lo transforma y lo carga.
+
+    :param engine: Motor de SQLAlchemy.
+    :param fecha: Día a copiar (date).
+    :param fragmento: Fragmento (parte, partes) de los medidores, o None para todos.
+    :param metodo: Método de carga ('copy' o 'multi').
+    :return: Número de filas cargadas.
+    """
+    query, params = consulta_dia(fecha, fragmento)
+    etiquetas = {"fecha": fecha, "fragmento": fragmento and fragmento[0]}
+    # Ejecutar la consulta y cargar los resultados en un DataFrame
+    with etapa(PIPELINE, "extraccion", **etiquetas) as registro:
+        with engine.connect() as connection:
+            df = pd.read_sql_query(query, connection, params=params)
+        registro.update(filas=len(df), bytes=bytes_dataframe(df))
+    depurar("DataFrame extraído:", df)
+
+    with etapa(PIPELINE, "transformacion", **etiquetas) as registro:
+        transformed_df = transformar(df)
+        registro.update(filas=len(transformed_df), bytes=bytes_dataframe(transformed_df))
+    depurar("DataFrame transformado:", transformed_df)
+
+    # Cargar los datos transformados a la base de datos
+    with etapa(PIPELINE, "carga", metodo=metodo, **etiquetas) as registro:
+        registro["filas"] = cargar_dataframe(
+            transformed_df,
+            engine,
+            'prime_readmass',     # Nombre de la tabla destino
+            schema='cgm_test',    # Esquema de la base de datos
+            metodo=metodo,        # COPY por defecto; 'multi' para comparar con to_sql
+            claves=CLAVES,        # Solo se usan con metodo='idempotente'
+        )
+        registro["bytes"] = bytes_dataframe(transformed_df)
+    return registro["filas"]
+
+
+def copiar_streaming(engine, fecha, fragmento=None, chunksize=CHUNKSIZE, metodo=METODO_CARGA):
+    """
+    Copia el día por bloques de tamaño fijo usando un cursor del lado del servidor.
+
+    Cada bloque se transforma y se carga antes de pedir el siguiente, de modo
+    que la memoria usada depende de `chunksize` y no del volumen del día.
+
+    :param engine: Motor de SQLAlchemy.
+    :param fecha: Día a copiar (date).
+    :param fragmento: Fragmento (parte, partes) de los medidores, o None para todos.
+    :param chunksize: Filas por bloque.
+    :param metodo: Método de carga ('copy' o 'multi').
+    :return: Número total de filas cargadas.
+    """
+    query, params = consulta_dia(fecha, fragmento)
+    etiquetas = {"fecha": fecha, "fragmento": fragmento and fragmento[0]}
+    inicio = time.perf_counter()
+    total = 0
+    # stream_results hace que psycopg2 use un cursor con nombre (server-side)
+    with engine.connect().execution_options(stream_results=True, max_row_buffer=chunksize) as connection:
+        bloques = pd.read_sql_query(
+            query, connection, params=params, chunksize=chunksize
+        )
+        for numero, df in enumerate(medir_bloques(bloques, PIPELINE, "extraccion", **etiquetas), start=1):
+            with etapa(PIPELINE, "transformacion", bloque=numero, **etiquetas) as registro:
+                transformado = transformar(df)
+                registro.update(filas=len(transformado), bytes=bytes_dataframe(transformado))
+            with etapa(PIPELINE, "carga", bloque=numero, metodo=metodo, **etiquetas) as registro:
+                registro["filas"] = cargar_dataframe(transformado, engine, 'prime_readmass', schema='cgm_test',
+                                                     metodo=metodo, claves=CLAVES)
+                registro["bytes"] = bytes_dataframe(transformado)
+            total += registro["filas"]
+            transcurrido = time.perf_counter() - inicio
+            print(f"Bloque {numero}: {len(df)} filas, {total} acumuladas en {transcurrido:.2f} s")
+    return total
+
+
+def copiar_en_bd(engine, fecha, fragmento=None):
+    """
+    Copia el día con un INSERT ... SELECT ejecutado en el servidor.
+
+    Solo sirve cuando origen y destino están en la misma base; para destinos
+    en otra base se usan los modos que pasan por Python.
+
+    :param engine: Motor de SQLAlchemy.
+    :param fecha: Día a copiar (date).
+    :param fragmento: Fragmento (parte, partes) de los medidores, o None para todos.
+    :return: Número de filas insertadas.
+    """
+    condicion, params = filtro_dia(fecha, fragmento)
+    with etapa(PIPELINE, "en_bd", fecha=fecha, fragmento=fragmento and fragmento[0]) as registro:
+        registro["filas"] = transferir_en_bd(
+            engine,
+            'cgm.prime_readmass',
+            'cgm_test.prime_readmass',
+            columns_mapping,
+            condicion=condicion,
+            params=params,
+        )
+    return registro["filas"]
+
+
+def borrar_dia(engine, fecha, fragmento=None):
+    """
+    Borra del destino las filas de un día para los medidores indicados.
+
+    :param engine: Motor de SQLAlchemy.
+    :param fecha: Día a borrar (date).
+    :param fragmento: Fragmento (parte, partes) de los medidores, o None para todos.
+    :return: Número de filas borradas.
+    """
+    condicion, params = filtro_dia(fecha, fragmento)
+    with engine.begin() as connection:
+        return connection.execute(
+            text(f"DELETE FROM cgm_test.prime_readmass WHERE {condicion}"),
+            params,
+        ).rowcount
+
+
+def copiar_dia(engine, fecha, fragmento=None, modo="completo", chunksize=CHUNKSIZE, metodo=METODO_CARGA):
+    """
+    Copia un día de `cgm.prime_readmass` con el modo indicado.
+
+    :param engine: Motor de SQLAlchemy.
+    :param fecha: Día a copiar (date).
+    :param fragmento: Fragmento (parte, partes) de los medidores, o None para todos.
+    :param modo: 'completo', 'streaming' o 'en_bd'.
+    :param chunksize: Filas por bloque en modo streaming.
+    :param metodo: Método de carga de los modos por Python ('copy', 'multi' o 'idempotente').
+    :return: Número de filas cargadas.
+    """
+    if modo == "en_bd":
+        return copiar_en_bd(engine, fecha, fragmento)
+    if modo == "streaming":
+        return copiar_streaming(engine, fecha, fragmento, chunksize=chunksize, metodo=metodo)
+    return copiar_completo(engine, fecha, fragmento, metodo=metodo)
+
+
+def copiar_en_paralelo(engine, fecha, paralelo, modo="streaming", chunksize=CHUNKSIZE, metodo=METODO_CARGA):
+    """
+    Copia un día repartiendo los medidores en fragmentos que se procesan en paralelo.
+
+    Cada fragmento se extrae y se carga en su propio hilo con conexiones
+    independientes del pool del motor, que debe admitir al menos dos
+    conexiones por hilo (lectura y carga).
+
+    :param engine: Motor de SQLAlchemy con pool suficiente.
+    :param fecha: Día a copiar (date).
+    :param paralelo: Número de fragmentos e hilos.
+    :param modo: Modo de copia de cada fragmento ('completo', 'streaming' o 'en_bd').
+    :param chunksize: Filas por bloque en modo streaming.
+    :param metodo: Método de carga de los modos por Python.
+    :return: Diccionario {fragmento: filas cargadas o excepción}.
+    """
+    partes = fragmentos(paralelo)
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=len(partes)) as executor:
+        futuros = {
+            executor.submit(copiar_dia, engine, fecha, fragmento, modo, chunksize, metodo): indice
+            for indice, fragmento in enumerate(partes, start=1)
+        }
+        for futuro in as_completed(futuros):
+            indice = futuros[futuro]
+            try:
+                resultados[indice] = futuro.result()
+                print(f"Fragmento {indice}/{len(partes)}: {resultados[indice]} filas cargadas")
+            except Exception as e:
+                resultados[indice] = e
+                print(f"Error en el fragmento {indice}/{len(partes)}: {e}")
+    return resultados
+
+
+def main(argv=None):
+    """
+    Copia el día indicado (por defecto ayer) de prime_readmass.
+
+    :param argv: Argumentos de línea de comandos (por defecto los de sys.argv).
+    :return: Código de salida (0 si todo terminó sin errores).
+    """
+    parser = argparse.ArgumentParser(description="Copia cgm.prime_readmass del día anterior a cgm_test.prime_readmass.")
+    parser.add_argument("--modo", choices=["completo", "streaming", "en_bd"], default="completo",
+                        help="'completo' carga el día en memoria; 'streaming' lo procesa por bloques; "
+                             "'en_bd' lo copia con INSERT ... SELECT en el servidor.")
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE, help="Filas por bloque en modo streaming.")
+    parser.add_argument("--paralelo", type=int, default=PARALELO,
+                        help="Número de fragmentos de medidores que se copian en paralelo.")
+    parser.add_argument("--fecha", type=lambda valor: datetime.strptime(valor, "%Y-%m-%d").date(), default=None,
+                        help="Día a copiar (YYYY-MM-DD); por defecto el día de ayer. Para rangos usar cgm_backfill.py.")
+    parser.add_argument("--idempotente", action="store_true",
+                        help="Escribe solo las filas nuevas o modificadas (clave noins, channel, datetime), "
+                             "de modo que repetir un día no duplica lecturas.")
+    parser.add_argument("--depurar-duplicados", action="store_true",
+                        help="Con --idempotente, si el destino ya tiene lecturas repetidas para la clave borra las "
+                             f"más antiguas según {COLUMNA_ACTUALIZACION} antes de crear el índice único; sin esta "
+                             "opción los repetidos se informan y la carga se detiene.")
+    args = parser.parse_args(argv)
+    if args.idempotente and args.modo == "en_bd":
+        parser.error("--idempotente solo aplica a los modos 'completo' y 'streaming'.")
+    if args.depurar_duplicados and not args.idempotente:
+        parser.error("--depurar-duplicados solo aplica con --idempotente.")
+    metodo = "idempotente" if args.idempotente else METODO_CARGA
+    engine = obtener_engine("pg")
+
+    # Calcular la fecha del día de ayer
+    yesterday = args.fecha or (datetime.now() - timedelta(days=1)).date()
+
+    # Los medidores se filtran en el servidor contra rfc_config; aquí solo se informa cuántos hay
+    print(f"{contar_medidores(engine)} medidores configurados en cgm_test.rfc_config")
+
+    if metodo == "idempotente":
+        # El índice único se crea (o valida) una vez, antes de cualquier transacción de carga
+        asegurar_indice_unico(engine, 'prime_readmass', 'cgm_test', CLAVES,
+                              depurar_por=COLUMNA_ACTUALIZACION if args.depurar_duplicados else None)
+
+    if args.paralelo > 1:
+        # Pool con dos conexiones por hilo: una para leer y otra para cargar
+        engine = obtener_engine("pg", pool_size=2 * args.paralelo)
+        resultados = copiar_en_paralelo(engine, yesterday, args.paralelo,
+                                        modo=args.modo, chunksize=args.chunksize, metodo=metodo)
+        fallidos = [indice for indice, resultado in resultados.items() if isinstance(resultado, Exception)]
+        if fallidos:
+            print(f"Fragmentos con error: {sorted(fallidos)}")
+            return 1
+    else:
+        copiar_dia(engine, yesterday, modo=args.modo, chunksize=args.chunksize, metodo=metodo)
 
-# Cargar los datos transformados a la base de datos
-with engine.connect() as connection:
-    # Insertar los datos en la tabla destino
-    transformed_df.to_sql(
-        'prime_readmass',  # Nombre de la tabla destino
-        con=engine,          # Conexión a la base de datos
-        schema='cgm_test',   # Esquema de la base de datos
-        if_exists='append',  # Añadir registros a la tabla
-        index=False,         # No incluir el índice del DataFrame
-        method='multi'       # Método de inserción para mayor eficiencia
-    )
+    print("Datos cargados correctamente en cgm_test.prime_readmass.")
+    return 0
 
-print("Datos cargados correctamente en cgm_test.prime_readmass.")
 
-# Verificar si la vista y las tablas cumplen con los requerimientos
\ No newline at end of file
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,602 @@
+import argparse
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from carga_postgres import identificador, nombre_tabla
+from conexiones import obtener_engine
+from estado_local import leer_estado, guardar_estado, ruta_estado
+from instrumentacion import etapa
+
+# Clonación de tablas entre esquemas de la misma base sin Docker ni archivos:
+# la estructura se copia con CREATE TABLE ... (LIKE ...) y los datos pasan de
+# COPY ... TO STDOUT a COPY ... FROM STDIN en formato binario por un pipe entre
+# dos conexiones de psycopg2. Los índices y restricciones únicas se crean
+# después de cargar los datos, que es más rápido que mantenerlos fila a fila.
+
+# Tablas (o rangos de una tabla) que se clonan a la vez
+WORKERS = int(os.getenv('CLON_WORKERS', '4'))
+
+# Nombre del pipeline en las métricas de instrumentacion
+PIPELINE = 'clonar_tablas'
+
+# Tipos de clave primaria que se pueden dividir en rangos de valores
+TIPOS_ENTEROS = ("smallint", "integer", "bigint")
+
+# Tablas del esquema que coinciden con un patrón LIKE
+tablas_query = """
+    SELECT c.relname
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = %s AND c.relkind IN ('r', 'p') AND NOT c.relispartition AND c.relname LIKE %s
+    ORDER BY c.relname
+"""
+
+# Columnas que admite COPY (sin columnas generadas ni eliminadas), en orden
+columnas_query = """
+    SELECT a.attname
+    FROM pg_attribute a
+    WHERE a.attrelid = to_regclass(%s) AND a.attnum > 0 AND NOT a.attisdropped AND a.attgenerated = ''
+    ORDER BY a.attnum
+"""
+
+# Columnas con un default que usa una secuencia (serial o nextval explícito),
+# con la secuencia tal como aparece en el default y sus parámetros
+defaults_secuencia_query = """
+    SELECT a.attname, pg_get_expr(d.adbin, d.adrelid), s.oid::regclass::text,
+           format_type(q.seqtypid, NULL), q.seqincrement, q.seqmin, q.seqmax, q.seqstart, q.seqcache, q.seqcycle
+    FROM pg_attrdef d
+    JOIN pg_attribute a ON a.attrelid = d.adrelid AND a.attnum = d.adnum
+    JOIN pg_depend p ON p.classid = 'pg_attrdef'::regclass AND p.objid = d.oid
+                    AND p.refclassid = 'pg_class'::regclass
+    JOIN pg_class s ON s.oid = p.refobjid AND s.relkind = 'S'
+    JOIN pg_sequence q ON q.seqrelid = s.oid
+    WHERE d.adrelid = to_regclass(%s)
+    ORDER BY a.attnum
+"""
+
+# Secuencias propias de columnas enteras (identity o serial), que hay que avanzar después de copiar
+secuencias_query = """
+    SELECT a.attname, d.objid::regclass::text
+    FROM pg_depend d
+    JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+    WHERE d.classid = 'pg_class'::regclass AND d.refclassid = 'pg_class'::regclass
+      AND d.refobjid = to_regclass(%s) AND d.deptype IN ('a', 'i')
+      AND a.atttypid IN ('smallint'::regtype, 'integer'::regtype, 'bigint'::regtype)
+"""
+
+# Clave primaria de una sola columna y su tipo
+clave_primaria_query = """
+    SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+    FROM pg_constraint c
+    JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = ANY(c.conkey)
+    WHERE c.conrelid = to_regclass(%s) AND c.contype = 'p' AND array_length(c.conkey, 1) = 1
+"""
+
+# Restricciones de clave primaria, únicas y de exclusión de la tabla
+restricciones_query = """
+    SELECT conname, pg_get_constraintdef(oid)
+    FROM pg_constraint
+    WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u', 'x')
+    ORDER BY contype, conname
+"""
+
+# Índices que no respaldan una restricción
+indices_query = """
+    SELECT pg_get_indexdef(i.indexrelid)
+    FROM pg_index i
+    WHERE i.indrelid = to_regclass(%s)
+      AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+    ORDER BY i.indexrelid
+"""
+
+
+def listar_tablas(engine, schema, patron="%"):
+    """
+    Lista las tablas de un esquema cuyo nombre coincide con un patrón LIKE.
+
+    :param engine: Motor de SQLAlchemy.
+    :param schema: Esquema a revisar.
+    :param patron: Patrón LIKE (p. ej. 'prime_%'); por defecto todas las tablas.
+    :return: Lista de nombres de tabla.
+    """
+    conexion = engine.raw_connection()
+    try:
+        with conexion.cursor() as cursor:
+            cursor.execute(tablas_query, (schema, patron))
+            return [fila[0] for fila in cursor.fetchall()]
+    finally:
+        conexion.close()
+
+
+def _consultar(cursor, consulta, tabla, schema):
+    cursor.execute(consulta, (nombre_tabla(tabla, schema),))
+    return cursor.fetchall()
+
+
+def _secuencias_propias(cursor, tabla, destino):
+    """
+    Da a la tabla clonada sus propias secuencias en lugar de las del origen.
+
+    `LIKE ... INCLUDING DEFAULTS` copia `nextval('origen.x_seq')` tal cual, y
+    el clon seguiría consumiendo la secuencia del origen. Por cada default
+    con secuencia se crea una nueva en el esquema destino con los mismos
+    parámetros y el mismo valor actual, propiedad de la columna (se borra con
+    la tabla), y el default pasa a usarla. En columnas enteras
+    `completar_estructura` la avanza después de copiar si hace falta.
+    """
+    for columna, default, secuencia, tipo, incremento, minimo, maximo, inicio, cache, ciclo in _consultar(
+            cursor, defaults_secuencia_query, tabla, destino):
+        nueva = nombre_tabla(f"{tabla}_{columna}_seq", destino)
+        cursor.execute(
+            f"CREATE SEQUENCE {nueva} AS {tipo} INCREMENT BY {incremento} MINVALUE {minimo} MAXVALUE {maximo} "
+            f"START WITH {inicio} CACHE {cache} {'CYCLE' if ciclo else 'NO CYCLE'} "
+            f"OWNED BY {nombre_tabla(tabla, destino)}.{identificador(columna)}"
+        )
+        cursor.execute(f"SELECT setval(%s::regclass, last_value, is_called) FROM {secuencia}", (nueva,))
+        cursor.execute("SELECT %s::regclass::text", (nueva,))
+        # La secuencia se nombra en el default igual que `regclass::text` en esta misma sesión
+        default = default.replace(f"'{secuencia}'::regclass", f"'{cursor.fetchone()[0]}'::regclass")
+        cursor.execute(
+            f"ALTER TABLE {nombre_tabla(tabla, destino)} ALTER COLUMN {identificador(columna)} SET DEFAULT {default}"
+        )
+
+
+def crear_estructura(cursor, tabla, origen, destino):
+    """
+    Crea la tabla en el esquema destino con las columnas, defaults y checks del origen.
+
+    Las columnas serial (o con un default `nextval`) quedan con secuencias
+    propias en el destino, no con las del origen.
+
+    :return: Lista de sentencias para crear después las restricciones e índices.
+    """
+    cursor.execute(
+        f"CREATE TABLE {nombre_tabla(tabla, destino)} (LIKE {nombre_tabla(tabla, origen)} "
+        f"INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED INCLUDING IDENTITY "
+        f"INCLUDING STORAGE INCLUDING COMMENTS)"
+    )
+    _secuencias_propias(cursor, tabla, destino)
+    posteriores = [
+        f"ALTER TABLE {nombre_tabla(tabla, destino)} ADD CONSTRAINT {identificador(nombre)} {definicion}"
+        for nombre, definicion in _consultar(cursor, restricciones_query, tabla, origen)
+    ]
+    # pg_get_indexdef califica la tabla con su esquema: se cambia por el destino
+    patron = re.compile(r" ON (ONLY )?\S+ USING ")
+    for (definicion,) in _consultar(cursor, indices_query, tabla, origen):
+        posteriores.append(patron.sub(lambda m: f" ON {m.group(1) or ''}{nombre_tabla(tabla, destino)} USING ",
+                                      definicion, count=1))
+    return posteriores
+
+
+class _Contador:
+    """
+    Envoltura de un archivo de escritura que cuenta los bytes escritos.
+    """
+
+    def __init__(self, archivo):
+        self._archivo = archivo
+        self.bytes = 0
+
+    def write(self, datos):
+        self.bytes += len(datos)
+        return self._archivo.write(datos)
+
+    def close(self):
+        self._archivo.close()
+
+
+def copiar_datos(conexion_origen, conexion_destino, tabla, origen, destino, columnas, consulta=None):
+    """
+    Transmite filas de una conexión a otra con COPY binario, sin pasar por disco.
+
+    Un hilo escribe la salida de `COPY ... TO STDOUT` en un pipe del que lee
+    `COPY ... FROM STDIN` en la conexión destino. No hace commit.
+
+    :param conexion_origen: Conexión de psycopg2 de lectura.
+    :param conexion_destino: Conexión de psycopg2 de escritura.
+    :param tabla: Nombre de la tabla.
+    :param origen: Esquema de origen.
+    :param destino: Esquema de destino.
+    :param columnas: Columnas a copiar.
+    :param consulta: SELECT de origen opcional (p. ej. un rango); por defecto la tabla completa.
+    :return: Tupla (filas copiadas, bytes transmitidos).
+    """
+    lista_columnas = ", ".join(identificador(c) for c in columnas)
+    consulta = consulta or f"SELECT {lista_columnas} FROM {nombre_tabla(tabla, origen)}"
+    lectura, escritura = os.pipe()
+    lector = os.fdopen(lectura, "rb")
+    escritor = _Contador(os.fdopen(escritura, "wb"))
+    errores = []
+
+    def exportar():
+        try:
+            with conexion_origen.cursor() as cursor:
+                cursor.copy_expert(f"COPY ({consulta}) TO STDOUT WITH (FORMAT binary)", escritor)
+        except Exception as e:
+            errores.append(e)
+        finally:
+            # Cerrar el pipe marca el fin de los datos (o corta la carga si hubo error)
+            escritor.close()
+
+    hilo = threading.Thread(target=exportar, daemon=True)
+    hilo.start()
+    try:
+        with conexion_destino.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {nombre_tabla(tabla, destino)} ({lista_columnas}) FROM STDIN WITH (FORMAT binary)", lector
+            )
+            filas = cursor.rowcount
+    except Exception as e:
+        errores.append(e)
+    finally:
+        # Si la carga falló, cerrar la lectura desbloquea al hilo exportador
+        lector.close()
+        hilo.join()
+    if errores:
+        # El primer error es la causa (un error de lectura corta la carga, no al revés)
+        raise errores[0]
+    return filas, escritor.bytes
+
+
+def completar_estructura(cursor, tabla, destino, posteriores):
+    """
+    Crea las restricciones e índices pendientes y avanza las secuencias identity y serial.
+
+    Una secuencia solo se mueve hacia adelante, hasta el máximo copiado. No hace commit.
+    """
+    for sentencia in posteriores:
+        cursor.execute(sentencia)
+    for columna, secuencia in _consultar(cursor, secuencias_query, tabla, destino):
+        cursor.execute(
+            f"SELECT setval(%s::regclass, max({identificador(columna)})) "
+            f"FROM {nombre_tabla(tabla, destino)} HAVING max({identificador(columna)}) >= "
+            f"(SELECT last_value FROM {secuencia})",
+            (secuencia,),
+        )
+    cursor.execute(f"ANALYZE {nombre_tabla(tabla, destino)}")
+
+
+def clonar_tabla(engine, tabla, origen, destino, reemplazar=False):
+    """
+    Clona una tabla (estructura, datos e índices) a otro esquema en una transacción.
+
+    :param engine: Motor de SQLAlchemy con al menos dos conexiones libres.
+    :param tabla: Nombre de la tabla.
+    :param origen: Esquema de origen.
+    :param destino: Esquema de destino.
+    :param reemplazar: Si es True, borra la tabla destino si ya existe.
+    :return: Diccionario con `filas`, `bytes` y `segundos`.
+    """
+    inicio = time.perf_counter()
+    conexion_origen = engine.raw_connection()
+    conexion_destino = engine.raw_connection()
+    try:
+        # Lectura consistente del origen durante toda la copia
+        with conexion_origen.cursor() as cursor:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        with conexion_destino.cursor() as cursor:
+            if reemplazar:
+                cursor.execute(f"DROP TABLE IF EXISTS {nombre_tabla(tabla, destino)}")
+            posteriores = crear_estructura(cursor, tabla, origen, destino)
+            columnas = [fila[0] for fila in _consultar(cursor, columnas_query, tabla, origen)]
+        with etapa(PIPELINE, "copia", tabla=f"{origen}.{tabla}", destino=destino) as registro:
+            filas, transmitidos = copiar_datos(conexion_origen, conexion_destino, tabla, origen, destino, columnas)
+            registro.update(filas=filas, bytes=transmitidos)
+        with conexion_destino.cursor() as cursor:
+            completar_estructura(cursor, tabla, destino, posteriores)
+        conexion_destino.commit()
+    except Exception:
+        conexion_destino.rollback()
+        raise
+    finally:
+        conexion_origen.rollback()
+        conexion_origen.close()
+        conexion_destino.close()
+    return {"filas": filas, "bytes": transmitidos, "segundos": round(time.perf_counter() - inicio, 3)}
+
+
+def nombre_checkpoint(tabla, origen, destino):
+    """
+    Nombre del estado local con el avance del clon por rangos de una tabla.
+    """
+    return f"clon_{origen}.{tabla}_{destino}"
+
+
+def calcular_rangos(cursor, tabla, origen, partes):
+    """
+    Divide la tabla de origen en `partes` rangos por clave primaria o por ctid.
+
+    Si la tabla tiene una clave primaria entera de una columna se divide su
+    intervalo [mínimo, máximo]; si no, se dividen las páginas de la tabla y
+    cada rango filtra por ctid (PostgreSQL 14+ lo resuelve con un TID Range Scan).
+
+    :return: Tupla (columna de los rangos, lista de rangos [desde, hasta)).
+    """
+    clave = _consultar(cursor, clave_primaria_query, tabla, origen)
+    if clave and clave[0][1] in TIPOS_ENTEROS:
+        columna = clave[0][0]
+        cursor.execute(f"SELECT min({identificador(columna)}), max({identificador(columna)}) "
+                       f"FROM {nombre_tabla(tabla, origen)}")
+        minimo, maximo = cursor.fetchone()
+        if minimo is None:
+            return columna, []
+        limite = maximo + 1
+    else:
+        columna = "ctid"
+        cursor.execute("SELECT pg_relation_size(to_regclass(%s)) / current_setting('block_size')::int",
+                       (nombre_tabla(tabla, origen),))
+        minimo, limite = 0, cursor.fetchone()[0] + 1
+    paso = max(1, -(-(limite - minimo) // partes))
+    return columna, [[inicio, min(inicio + paso, limite)] for inicio in range(minimo, limite, paso)]
+
+
+def _condicion_rango(columna, rango):
+    if columna == "ctid":
+        return f"ctid >= '({rango[0]},0)'::tid AND ctid < '({rango[1]},0)'::tid"
+    return f"{identificador(columna)} >= {int(rango[0])} AND {identificador(columna)} < {int(rango[1])}"
+
+
+def _copiar_rango(engine, tabla, origen, destino, columnas, columna, rango, antes_de_confirmar=None):
+    """
+    Copia un rango de filas en su propia transacción.
+
+    Con clave primaria, el rango se borra antes en el destino. `antes_de_confirmar`
+    recibe el id de la transacción del destino justo antes del commit, para
+    poder saber después si el rango llegó a confirmarse.
+    """
+    lista_columnas = ", ".join(identificador(c) for c in columnas)
+    condicion = _condicion_rango(columna, rango)
+    conexion_origen = engine.raw_connection()
+    conexion_destino = engine.raw_connection()
+    try:
+        if columna != "ctid":
+            with conexion_destino.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {nombre_tabla(tabla, destino)} WHERE {condicion}")
+        consulta = f"SELECT {lista_columnas} FROM {nombre_tabla(tabla, origen)} WHERE {condicion}"
+        with etapa(PIPELINE, "copia", tabla=f"{origen}.{tabla}", destino=destino, rango=rango) as registro:
+            filas, transmitidos = copiar_datos(conexion_origen, conexion_destino, tabla, origen, destino, columnas,
+                                               consulta=consulta)
+            registro.update(filas=filas, bytes=transmitidos)
+        if antes_de_confirmar is not None:
+            with conexion_destino.cursor() as cursor:
+                cursor.execute("SELECT txid_current()")
+                antes_de_confirmar(cursor.fetchone()[0])
+        conexion_destino.commit()
+        return filas, transmitidos
+    except Exception:
+        conexion_destino.rollback()
+        raise
+    finally:
+        conexion_origen.rollback()
+        conexion_origen.close()
+        conexion_destino.close()
+
+
+def _revisar_transacciones(engine, checkpoint, tabla):
+    """
+    Da por completados los rangos cuya transacción anotada se confirmó en el destino.
+
+    Las transacciones abortadas se descartan y su rango se vuelve a copiar.
+    Si una sigue en curso (otro proceso copiando) o su estado ya no se
+    conoce, se lanza un error: recopiar el rango podría duplicarlo.
+    """
+    transacciones = checkpoint.setdefault("transacciones", {})
+    if not transacciones:
+        return
+    conexion = engine.raw_connection()
+    try:
+        with conexion.cursor() as cursor:
+            for rango, transaccion in sorted(transacciones.items()):
+                cursor.execute("SELECT txid_status(%s)", (transaccion,))
+                estado = cursor.fetchone()[0]
+                if estado == "committed":
+                    if int(rango) not in checkpoint["completados"]:
+                        checkpoint["completados"].append(int(rango))
+                elif estado != "aborted":
+                    raise RuntimeError(
+                        f"No se puede saber si el rango {int(rango) + 1} de {tabla} se confirmó "
+                        f"(transacción {transaccion}: {estado or 'desconocida'}); use --reemplazar para clonar de nuevo"
+                    )
+        conexion.rollback()
+    finally:
+        conexion.close()
+    transacciones.clear()
+
+
+def clonar_por_rangos(engine, tabla, origen, destino, partes, workers=WORKERS, reemplazar=False):
+    """
+    Clona una tabla grande por rangos de clave primaria (o ctid) copiados en paralelo, con reanudación.
+
+    Cada rango se copia y confirma por separado y se anota en un checkpoint
+    local (`.estado/clon_{origen}.{tabla}_{destino}.json`). Si el clon se
+    interrumpe, la siguiente ejecución copia solo los rangos pendientes; los
+    índices y restricciones se crean al terminar todos los rangos y entonces
+    se borra el checkpoint. Los rangos por ctid suponen que la tabla de origen
+    no cambia entre una ejecución y la siguiente.
+
+    Antes de confirmar un rango se anota en el checkpoint el id de su
+    transacción en el destino. Si el proceso se cae entre el commit y la
+    anotación del rango como completado, al reanudar `txid_status` dice si
+    esa transacción se confirmó, y el rango no se vuelve a copiar. Así un
+    rango por ctid, que no tiene clave para borrarlo antes, no se duplica.
+
+    :param engine: Motor de SQLAlchemy con pool de al menos 2 * workers conexiones.
+    :param tabla: Nombre de la tabla.
+    :param origen: Esquema de origen.
+    :param destino: Esquema de destino.
+    :param partes: Número de rangos en que se divide la tabla.
+    :param workers: Rangos que se copian a la vez.
+    :param reemplazar: Si es True, descarta un checkpoint previo y borra la tabla destino.
+    :return: Diccionario con `filas`, `bytes`, `rangos` copiados en esta ejecución y `segundos`.
+    """
+    inicio = time.perf_counter()
+    nombre = nombre_checkpoint(tabla, origen, destino)
+    checkpoint = None if reemplazar else leer_estado(nombre)
+
+    if checkpoint is None:
+        conexion = engine.raw_connection()
+        try:
+            with conexion.cursor() as cursor:
+                if reemplazar:
+                    cursor.execute(f"DROP TABLE IF EXISTS {nombre_tabla(tabla, destino)}")
+                posteriores = crear_estructura(cursor, tabla, origen, destino)
+                columna, rangos = calcular_rangos(cursor, tabla, origen, partes)
+                columnas = [fila[0] for fila in _consultar(cursor, columnas_query, tabla, origen)]
+            conexion.commit()
+        except Exception:
+            conexion.rollback()
+            raise
+        finally:
+            conexion.close()
+        checkpoint = {"columna": columna, "columnas": columnas, "rangos": rangos, "completados": [],
+                      "transacciones": {}, "posteriores": posteriores}
+        guardar_estado(nombre, checkpoint)
+    else:
+        _revisar_transacciones(engine, checkpoint, f"{origen}.{tabla}")
+        guardar_estado(nombre, checkpoint)
+        print(f"Reanudando el clon de {origen}.{tabla}: {len(checkpoint['completados'])} de "
+              f"{len(checkpoint['rangos'])} rangos ya copiados")
+
+    pendientes = [i for i in range(len(checkpoint["rangos"])) if i not in checkpoint["completados"]]
+    lock = threading.Lock()
+    filas = transmitidos = 0
+    errores = []
+
+    def anotar_transaccion(i, transaccion):
+        with lock:
+            checkpoint["transacciones"][str(i)] = transaccion
+            guardar_estado(nombre, checkpoint)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pendientes)))) as executor:
+        futuros = {
+            executor.submit(_copiar_rango, engine, tabla, origen, destino, checkpoint["columnas"],
+                            checkpoint["columna"], checkpoint["rangos"][i],
+                            lambda transaccion, i=i: anotar_transaccion(i, transaccion)): i
+            for i in pendientes
+        }
+        for futuro in as_completed(futuros):
+            i = futuros[futuro]
+            try:
+                filas_rango, bytes_rango = futuro.result()
+            except Exception as e:
+                errores.append(e)
+                print(f"Error en el rango {i + 1}/{len(checkpoint['rangos'])} de {origen}.{tabla}: {e}")
+                continue
+            with lock:
+                filas += filas_rango
+                transmitidos += bytes_rango
+                checkpoint["completados"].append(i)
+                checkpoint["transacciones"].pop(str(i), None)
+                guardar_estado(nombre, checkpoint)
+            print(f"Rango {i + 1}/{len(checkpoint['rangos'])} de {origen}.{tabla}: {filas_rango:,} filas "
+                  f"({len(checkpoint['completados'])}/{len(checkpoint['rangos'])} completados)")
+    if errores:
+        # El checkpoint queda con los rangos completados para reanudar
+        raise errores[0]
+
+    conexion = engine.raw_connection()
+    try:
+        with conexion.cursor() as cursor:
+            completar_estructura(cursor, tabla, destino, checkpoint["posteriores"])
+        conexion.commit()
+    except Exception:
+        conexion.rollback()
+        raise
+    finally:
+        conexion.close()
+    os.remove(ruta_estado(nombre))
+    return {"filas": filas, "bytes": transmitidos, "rangos": len(pendientes),
+            "segundos": round(time.perf_counter() - inicio, 3)}
+
+
+def clonar_tablas(engine, tablas, origen, destino, workers=WORKERS, reemplazar=False):
+    """
+    Clona varias tablas en paralelo, una por hilo.
+
+    :param engine: Motor de SQLAlchemy con pool de al menos 2 * workers conexiones.
+    :param tablas: Nombres de las tablas.
+    :param origen: Esquema de origen.
+    :param destino: Esquema de destino.
+    :param workers: Tablas que se clonan a la vez.
+    :param reemplazar: Si es True, borra las tablas destino que ya existan.
+    :return: Diccionario {tabla: resumen de `clonar_tabla` o excepción}.
+    """
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tablas)))) as executor:
+        futuros = {
+            executor.submit(clonar_tabla, engine, tabla, origen, destino, reemplazar): tabla
+            for tabla in tablas
+        }
+        for futuro in as_completed(futuros):
+            tabla = futuros[futuro]
+            try:
+                resultados[tabla] = futuro.result()
+                resumen = resultados[tabla]
+                print(f"{origen}.{tabla} -> {destino}.{tabla}: {resumen['filas']:,} filas, "
+                      f"{resumen['bytes'] / 1024 ** 2:,.1f} MB en {resumen['segundos']:.2f} s")
+            except Exception as e:
+                resultados[tabla] = e
+                print(f"Error al clonar {origen}.{tabla}: {e}")
+    return resultados
+
+
+def main(argv=None):
+    """
+    Clona las tablas indicadas de un esquema a otro.
+
+    :param argv: Argumentos de línea de comandos (por defecto los de sys.argv).
+    :return: Código de salida (0 si todo terminó sin errores).
+    """
+    parser = argparse.ArgumentParser(description="Clona tablas de un esquema a otro con COPY binario, sin Docker.")
+    parser.add_argument("origen", help="Esquema de origen.")
+    parser.add_argument("destino", help="Esquema de destino.")
+    parser.add_argument("--tabla", action="append", help="Tabla a clonar; se puede repetir.")
+    parser.add_argument("--patron", default=None,
+                        help="Patrón LIKE de las tablas del esquema de origen a clonar (p. ej. 'prime_%%').")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Tablas que se clonan a la vez; con --rangos, rangos de la tabla en curso que se "
+                             "copian a la vez (las tablas van de una en una).")
+    parser.add_argument("--reemplazar", action="store_true",
+                        help="Borra las tablas destino que ya existan (y descarta los checkpoints de --rangos).")
+    parser.add_argument("--rangos", type=int, default=1,
+                        help="Divide cada tabla en este número de rangos de clave primaria (o ctid) que se copian "
+                             "en paralelo y se pueden reanudar; las tablas se procesan una a la vez.")
+    args = parser.parse_args(argv)
+    if not args.tabla and not args.patron:
+        parser.error("Indique al menos una --tabla o un --patron.")
+
+    # Pool con dos conexiones por tabla en curso: una para leer y otra para escribir
+    engine = obtener_engine("pg", pool_size=2 * args.workers)
+    tablas = list(args.tabla or [])
+    if args.patron:
+        tablas += [tabla for tabla in listar_tablas(engine, args.origen, args.patron) if tabla not in tablas]
+    print(f"{len(tablas)} tablas por clonar de {args.origen} a {args.destino}: {tablas}")
+
+    inicio = time.perf_counter()
+    if args.rangos > 1:
+        resultados = {}
+        for tabla in tablas:
+            try:
+                resultados[tabla] = clonar_por_rangos(engine, tabla, args.origen, args.destino, args.rangos,
+                                                      workers=args.workers, reemplazar=args.reemplazar)
+                print(f"{args.origen}.{tabla} -> {args.destino}.{tabla}: {resultados[tabla]['filas']:,} filas "
+                      f"en {resultados[tabla]['rangos']} rangos en {resultados[tabla]['segundos']:.2f} s")
+            except Exception as e:
+                resultados[tabla] = e
+                print(f"Error al clonar {args.origen}.{tabla} (se puede reanudar): {e}")
+    else:
+        resultados = clonar_tablas(engine, tablas, args.origen, args.destino, workers=args.workers,
+                                   reemplazar=args.reemplazar)
+    fallidas = sorted(tabla for tabla, resultado in resultados.items() if isinstance(resultado, Exception))
+    print(f"Clonación finalizada en {time.perf_counter() - inicio:.1f} s")
+    if fallidas:
+        print(f"Tablas con error: {fallidas}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
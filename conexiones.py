@@ -0,0 +1,96 @@
+import os
+import threading
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from sqlalchemy.engine import URL
+
+# Conexiones compartidas a las bases de datos. Cada base se identifica por el
+# prefijo de sus variables de entorno:
+#   'pg'   -> PGPASSWORD, PG_HOST, PG_PORT, PG_USER, PG_DB
+#   'etrm' -> ETRM_PGPASSWORD, ETRM_PG_HOST, ETRM_PG_PORT, ETRM_PG_USER, ETRM_PG_DB
+#   'bench' -> BENCH_PGPASSWORD, BENCH_PG_HOST, ... (base local de benchmark.py)
+# Los motores se crean una sola vez por proceso, así varios trabajos
+# ejecutados seguidos reutilizan el mismo pool de conexiones. Los trabajos
+# en paralelo piden un pool de tamaño fijo, que también se comparte entre los
+# que piden el mismo tamaño.
+
+# Cargar las variables de entorno desde el archivo .env
+load_dotenv()
+
+BASES = {"pg": "", "etrm": "ETRM_", "bench": "BENCH_"}
+
+# Tamaño del pool de conexiones de cada motor compartido
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+
+# Motores ya creados en el proceso, por (base, tamaño de pool pedido)
+_engines = {}
+_lock = threading.Lock()
+
+
+def credenciales(base="pg"):
+    """
+    Lee las credenciales de una base desde las variables de entorno.
+
+    :param base: 'pg', 'etrm' o 'bench'.
+    :return: Diccionario con `password`, `host`, `port`, `user` y `database`.
+    """
+    prefijo = BASES[base]
+    return {
+        "password": os.getenv(f"{prefijo}PGPASSWORD"),
+        "host": os.getenv(f"{prefijo}PG_HOST"),
+        "port": os.getenv(f"{prefijo}PG_PORT"),
+        "user": os.getenv(f"{prefijo}PG_USER"),
+        "database": os.getenv(f"{prefijo}PG_DB"),
+    }
+
+
+def url_base(base="pg"):
+    """
+    Construye la URL de conexión de SQLAlchemy de una base.
+
+    Los valores vacíos se omiten, de modo que libpq use sus valores por
+    defecto (p. ej. el socket local si no hay host).
+
+    :param base: 'pg', 'etrm' o 'bench'.
+    :return: `sqlalchemy.engine.URL`.
+    """
+    datos = credenciales(base)
+    return URL.create(
+        "postgresql",
+        username=datos["user"] or None,
+        password=datos["password"] or None,
+        host=datos["host"] or None,
+        port=int(datos["port"]) if datos["port"] else None,
+        database=datos["database"] or None,
+    )
+
+
+def obtener_engine(base="pg", pool_size=None):
+    """
+    Devuelve el motor compartido de una base, creándolo la primera vez.
+
+    :param base: 'pg', 'etrm' o 'bench'.
+    :param pool_size: Conexiones del pool para trabajos en paralelo (p. ej. dos
+        por hilo); con este valor el pool no abre conexiones extra y quien
+        pida una más espera a que se libere otra. Por defecto `POOL_SIZE`.
+    :return: Motor de SQLAlchemy.
+    """
+    with _lock:
+        if (base, pool_size) not in _engines:
+            if pool_size is None:
+                engine = create_engine(url_base(base), pool_size=POOL_SIZE, pool_pre_ping=True)
+            else:
+                engine = create_engine(url_base(base), pool_size=pool_size, max_overflow=0, pool_pre_ping=True)
+            _engines[(base, pool_size)] = engine
+        return _engines[(base, pool_size)]
+
+
+def cerrar_engines():
+    """
+    Cierra las conexiones de todos los motores compartidos.
+    """
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
@@ -1,40 +1,68 @@
-from sqlalchemy import create_engine
+import argparse
 import os
-from dotenv import load_dotenv
+import time
+from concurrent.futures import ProcessPoolExecutor
+from decimal import DecimalException
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from almacen_parquet import DIRECTORIO_PARQUET, escribir_parquet, parquet_disponible
+from carga_postgres import asegurar_indice, reemplazar_filas_por_bloques
+from conexiones import obtener_engine
+from esquemas_xm import HORAS, leer_csv, tipo_archivo
+from instrumentacion import bytes_dataframe, depurar, etapa
+from manifiesto import Manifiesto
+from particiones_pg import reemplazar_particiones
 
-# Cargar variables de entorno desde el archivo .env
-load_dotenv()
+# Directorio de los archivos
+data_dir = "datos_termonorte"
 
-# Configuración de credenciales de la base de datos
-PGPASSWORD = os.getenv('PGPASSWORD')
-PG_HOST = os.getenv('PG_HOST')
-PG_PORT = os.getenv('PG_PORT')
-PG_USER = os.getenv('PG_USER')
-PG_DB = os.getenv('PG_DB')
+# Extensiones de los archivos de XM
+EXTENSIONES = ('.txa', '.tx2', '.txf')
 
-# Crear la cadena de conexión
-DATABASE_URL = f"postgresql://{PG_USER}:{PGPASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DB}"
+# Nombre del manifiesto de archivos ya cargados
+MANIFIESTO = 'datos_termonorte_manifiesto'
 
-# Crear el motor de conexión (puedes descomentar si lo usas después)
-engine = create_engine(DATABASE_URL)
+# Nombre del pipeline en las métricas de instrumentacion
+PIPELINE = 'termonorte'
 
-# Directorio de los archivos
-data_dir = "datos_termonorte"
+# Abreviaturas de meses en español que no coinciden con las de inglés (%b)
+MESES_ES = {"ENE": "JAN", "ABR": "APR", "AGO": "AUG", "DIC": "DEC"}
+
+# Los .txf de al menos este tamaño se procesan por bloques de CHUNKSIZE_TXF filas
+TXF_BYTES_BLOQUES = int(os.getenv('TERMONORTE_TXF_BYTES_BLOQUES', str(50 * 1024 * 1024)))
+CHUNKSIZE_TXF = int(os.getenv('TERMONORTE_CHUNKSIZE_TXF', '100000'))
+
+# Número de procesos para leer los archivos (1 = lectura secuencial)
+WORKERS = int(os.getenv('TERMONORTE_WORKERS', os.cpu_count() or 1))
+
+# Modo vigilancia: segundos entre revisiones del directorio y segundos sin
+# cambios antes de procesar los archivos llegados como un lote
+INTERVALO_VIGILANCIA = float(os.getenv('TERMONORTE_INTERVALO', '1'))
+ESPERA_LOTE = float(os.getenv('TERMONORTE_ESPERA_LOTE', '2'))
 
-# Listar todos los archivos en el directorio
-all_files = os.listdir(data_dir)
+# Modo vigilancia: espera antes de reintentar un archivo que falló por un error
+# pasajero (p. ej. la base caída); se duplica en cada intento hasta el máximo
+REINTENTO_INICIAL = float(os.getenv('TERMONORTE_REINTENTO', '10'))
+REINTENTO_MAXIMO = float(os.getenv('TERMONORTE_REINTENTO_MAXIMO', '600'))
+
+
+def clasificar_archivos(archivos):
+    """
+    Clasifica los archivos por tipo según el prefijo del nombre (COMB, oefagnd, etc.).
+
+    :param archivos: Nombres de archivo.
+    :return: Diccionario {tipo: [archivos]}.
+    """
+    file_types = {}
+    for file in sorted(archivos):
+        if file.endswith(EXTENSIONES):  # Filtrar extensiones válidas
+            base_name = tipo_archivo(file)  # Extraer prefijo antes de los números
+            if base_name not in file_types:
+                file_types[base_name] = []
+            file_types[base_name].append(file)
+    return file_types
 
-# Clasificar los archivos por tipo basado en los nombres (como COMB140, oefagnd, etc.)
-file_types = {}
-for file in all_files:
-    if file.endswith(('.txa', '.tx2', '.txf')):  # Filtrar extensiones válidas
-        name_part = ''.join([c for c in file if not c.isdigit()])  # Extraer prefijo antes de los números
-        base_name = name_part.split('.')[0]
-        if base_name not in file_types:
-            file_types[base_name] = []
-        file_types[base_name].append(file)
 
 # Función para extraer fecha del nombre del archivo
 def extract_date_from_filename(file_name):
@@ -43,42 +71,104 @@ def extract_date_from_filename(file_name):
     # Extraer los últimos cuatro caracteres (mes y día)
     date_part = ''.join(filter(str.isdigit, base_name))[-4:]
     month = date_part[:2]
-    day = date_part[2:]
+    # Los archivos mensuales (p. ej. preofe10.txf) solo traen el mes: se usa el día 1
+    day = date_part[2:] or "01"
     # Asumir año 2024
     return datetime.strptime(f"2024-{month}-{day}", "%Y-%m-%d")
 
-# Leer cada tipo de archivo en un DataFrame
-dataframes = {}
-for file_type, files in file_types.items():
-    df_list = []
-    for file in files:
-        file_path = os.path.join(data_dir, file)
-        try:
-            # Leer archivo con la primera fila como encabezado
-            df = pd.read_csv(file_path, sep=";", header=0, encoding="latin-1")  # Cambia encoding si es necesario
-            # Extraer fecha del nombre del archivo
-            fecha_operacion = extract_date_from_filename(file)
-            # Extraer versión (extensión del archivo)
-            version = file.split('.')[-1]
-            # Agregar columna fechaoperacion y versión
-            df['fechaoperacion'] = fecha_operacion
-            df['version'] = version
-            df_list.append(df)
-        except Exception as e:
-            print(f"Error al leer el archivo {file_path}: {e}")
-    # Combinar todos los DataFrames de este tipo en uno solo
-    if df_list:
-        dataframes[file_type] = pd.concat(df_list, ignore_index=True)
-
-# Transformar el DataFrame para `tdia_sis` si existe
-if "tdia_sis" in dataframes:
-    df_tdia_sis = dataframes["tdia_sis"]
-    
+
+def leer_archivo(file_path):
+    """
+    Lee un archivo de XM y le agrega la fecha de operación y la versión.
+
+    :param file_path: Ruta del archivo.
+    :return: DataFrame con las columnas `fechaoperacion` y `version`.
+    """
+    # Leer archivo con la primera fila como encabezado y los tipos declarados en esquemas_xm
+    df = leer_csv(file_path)
+    return etiquetar(df, os.path.basename(file_path))
+
+
+def leer_por_bloques(file_path, chunksize):
+    """
+    Lee un archivo de XM por bloques de `chunksize` filas, ya etiquetados.
+
+    :param file_path: Ruta del archivo.
+    :param chunksize: Filas por bloque.
+    :return: Generador de DataFrames.
+    """
+    file = os.path.basename(file_path)
+    for bloque in leer_csv(file_path, chunksize=chunksize):
+        yield etiquetar(bloque, file)
+
+
+def etiquetar(df, file):
+    """
+    Agrega al DataFrame la fecha de operación y la versión tomadas del nombre del archivo.
+    """
+    # Extraer fecha del nombre del archivo
+    fecha_operacion = extract_date_from_filename(file)
+    # Extraer versión (extensión del archivo)
+    version = file.split('.')[-1]
+    # Agregar columna fechaoperacion y versión
+    df['fechaoperacion'] = fecha_operacion
+    df['version'] = version
+    return df
+
+
+def _leer_archivo_seguro(file_path):
+    """
+    Envuelve `leer_archivo` para que los errores viajen como resultado desde el proceso hijo.
+    """
+    try:
+        return file_path, leer_archivo(file_path), None
+    except Exception as e:
+        return file_path, None, e
+
+
+def leer_archivos(directorio, file_types, workers=WORKERS, executor=None):
+    """
+    Lee todos los archivos clasificados, en paralelo sobre un pool de procesos.
+
+    :param directorio: Directorio de los archivos.
+    :param file_types: Diccionario {tipo: [archivos]} de `clasificar_archivos`.
+    :param workers: Número de procesos; con 1 la lectura es secuencial.
+    :param executor: Pool de procesos ya creado (se reutiliza entre lotes en modo vigilancia).
+    :return: Tupla (diccionario {tipo: DataFrame}, diccionario {ruta: error}).
+    """
+    rutas = [(file_type, os.path.join(directorio, file)) for file_type, files in file_types.items() for file in files]
+    if executor is not None and len(rutas) > 1:
+        resultados = list(executor.map(_leer_archivo_seguro, [ruta for _, ruta in rutas]))
+    elif workers > 1 and len(rutas) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(rutas))) as executor:
+            resultados = list(executor.map(_leer_archivo_seguro, [ruta for _, ruta in rutas]))
+    else:
+        resultados = [_leer_archivo_seguro(ruta) for _, ruta in rutas]
+
+    # Agrupar por tipo conservando el orden de los archivos
+    por_tipo = {}
+    errores = {}
+    for (file_type, _), (file_path, df, error) in zip(rutas, resultados):
+        if error is not None:
+            print(f"Error al leer el archivo {file_path}: {error}")
+            errores[file_path] = error
+            continue
+        por_tipo.setdefault(file_type, []).append(df)
+
+    # Combinar todos los DataFrames de cada tipo en uno solo
+    dataframes = {file_type: pd.concat(df_list, ignore_index=True) for file_type, df_list in por_tipo.items()}
+    return dataframes, errores
+
+
+def transformar_tdia_sis(df_tdia_sis):
+    """
+    Transforma el DataFrame `tdia_sis` a la estructura de la tabla `tmng.tdia_sis`.
+    """
     # Separar año, mes y día desde la columna `fechaoperacion`
     df_tdia_sis["tdsisano"] = df_tdia_sis["fechaoperacion"].dt.year
     df_tdia_sis["tdsismes"] = df_tdia_sis["fechaoperacion"].dt.month
     df_tdia_sis["tdsisdia"] = df_tdia_sis["fechaoperacion"].dt.day
-    
+
     # Renombrar columnas según la tabla en la imagen
     df_tdia_sis = df_tdia_sis.rename(columns={
         "version": "tdsisver",  # Tipo (versión)
@@ -92,25 +182,16 @@ if "tdia_sis" in dataframes:
     df_tdia_sis["tdsisver"] = df_tdia_sis["tdsisver"].str.upper()
 
     # Reordenar columnas según el orden de la tabla en la imagen
-    df_tdia_sis = df_tdia_sis[
-        ["tdsisano", "tdsismes", "tdsisdia", "tdsisver", 
+    return df_tdia_sis[
+        ["tdsisano", "tdsismes", "tdsisdia", "tdsisver",
          "tdsiscod", "tdsisdes", "tdsisval", "tdsisfecha"]
     ]
 
-    # Actualizar el DataFrame modificado en el diccionario
-    dataframes["tdia_sis"] = df_tdia_sis
-    
-    try:
-        # Cargar el DataFrame a la tabla tmng.tdia_sis
-        df_tdia_sis.to_sql("tdia_sis", engine, schema="tmng", if_exists="replace", index=False)
-        print("Datos cargados exitosamente en tmng.tdia_sis")
-    except Exception as e:
-        print(f"Error al cargar los datos en tmng.tdia_sis: {e}")
-        
-# Transformar el DataFrame para `totaldia` si existe
-if "totaldia" in dataframes:
-    df_totaldia = dataframes["totaldia"]
-    
+
+def transformar_totaldia(df_totaldia):
+    """
+    Transforma el DataFrame `totaldia` a la estructura de la tabla `tmng.totaldia`.
+    """
     # Renombrar columnas según la tabla en la imagen
     df_totaldia = df_totaldia.rename(columns={
         df_totaldia.columns[0]: "codigo",        # Código
@@ -125,20 +206,432 @@ if "totaldia" in dataframes:
     df_totaldia["updated_at"] = pd.Timestamp.now()
 
     # Reordenar columnas según el orden de la tabla en la imagen
-    df_totaldia = df_totaldia[
-        ["codigo", "descripcion", "planta", "valor", 
+    return df_totaldia[
+        ["codigo", "descripcion", "planta", "valor",
          "fechaoperacion", "version", "updated_at"]
     ]
 
-    # Cargar el DataFrame a la tabla tmng.totaldia
+
+def horas_a_filas(df, columnas_id):
+    """
+    Convierte las 24 columnas `HORA xx` en una fila por hora (formato largo).
+
+    La conversión es vectorizada: los identificadores se repiten 24 veces con
+    `np.repeat` y la matriz de horas se aplana en orden de fila. Los valores
+    se conservan como vienen del esquema (decimal.Decimal), sin pasar por float.
+
+    :param df: DataFrame en formato ancho con las columnas de `HORAS`.
+    :param columnas_id: Columnas que identifican cada fila del archivo.
+    :return: DataFrame con las columnas de `columnas_id`, `hora` y `valor`.
+    """
+    valores = df[HORAS].to_numpy().reshape(-1)
+    largo = pd.DataFrame({columna: np.repeat(df[columna].to_numpy(), len(HORAS)) for columna in columnas_id})
+    largo["hora"] = np.tile(np.arange(1, len(HORAS) + 1, dtype=np.int16), len(df))
+    largo["valor"] = valores
+    return largo
+
+
+def convertir_fechas(serie):
+    """
+    Convierte la columna FECHA de XM, que mezcla `2024-10-01` y `01-OCT-24`.
+    """
+    fechas = pd.to_datetime(serie, format="%Y-%m-%d", errors="coerce")
+    pendientes = fechas.isna()
+    if pendientes.any():
+        texto = serie[pendientes].str.upper().replace(MESES_ES, regex=True)
+        fechas[pendientes] = pd.to_datetime(texto, format="%d-%b-%y")
+    return fechas
+
+
+def transformar_preofe(df_preofe):
+    """
+    Transforma `preofe` a la tabla larga `tmng.preofe_horaria`.
+    """
+    df_preofe = df_preofe.rename(columns={
+        "SUBMERCADO": "submercado",
+        "CONFIGURACION": "configuracion",
+        "CONCEPTO": "concepto",
+    })
+    df_preofe["fecha"] = convertir_fechas(df_preofe["FECHA"].astype(str))
+    df_preofe["configuracion"] = df_preofe["configuracion"].astype(str)
+    return horas_a_filas(df_preofe, ["submercado", "fecha", "configuracion", "concepto", "version"])[
+        ["submercado", "fecha", "hora", "configuracion", "concepto", "valor", "version"]
+    ]
+
+
+def transformar_oefagnh(df_oefagnh):
+    """
+    Transforma `oefagnh` a la tabla larga `tmng.oefagnh_horaria`.
+    """
+    df_oefagnh = df_oefagnh.rename(columns={
+        "CONCEPTO": "concepto",
+        "DESCRIPCION": "descripcion",
+        "fechaoperacion": "fecha",
+    })
+    return horas_a_filas(df_oefagnh, ["concepto", "descripcion", "fecha", "version"])[
+        ["concepto", "fecha", "hora", "descripcion", "valor", "version"]
+    ]
+
+
+# Tablas destino en tmng: tipo -> (tabla, transformación, claves de reemplazo, índices)
+TABLAS_DESTINO = {
+    "tdia_sis": ("tdia_sis", transformar_tdia_sis, ["tdsisfecha", "tdsisver"], []),
+    "totaldia": ("totaldia", transformar_totaldia, ["fechaoperacion", "version"], []),
+    "preofe": ("preofe_horaria", transformar_preofe, ["fecha", "version"],
+               [["fecha", "hora"], ["submercado", "fecha"]]),
+    "oefagnh": ("oefagnh_horaria", transformar_oefagnh, ["fecha", "version"],
+                [["fecha", "hora"], ["concepto", "fecha"]]),
+}
+
+# Tipos cuya tabla está particionada por día (por la primera clave, la fecha);
+# se cargan intercambiando particiones en lugar de borrar e insertar filas
+TIPOS_PARTICIONADOS = ("tdia_sis", "totaldia")
+
+
+def reemplazar_en_destino(bloques, engine, file_type):
+    """
+    Reemplaza en la tabla destino del tipo las fechas y versiones presentes en los bloques.
+
+    :param bloques: Iterable de DataFrames ya transformados.
+    :param engine: Motor de SQLAlchemy.
+    :param file_type: Tipo de archivo con entrada en `TABLAS_DESTINO`.
+    """
+    tabla, _, claves, indices = TABLAS_DESTINO[file_type]
+    if file_type in TIPOS_PARTICIONADOS:
+        reemplazar_particiones(bloques, engine, tabla, "tmng", claves[0], claves[1])
+    else:
+        reemplazar_filas_por_bloques(bloques, engine, tabla, "tmng", claves)
+    for columnas in indices:
+        asegurar_indice(engine, tabla, "tmng", columnas)
+
+
+def cargar(engine, dataframes):
+    """
+    Transforma y carga en `tmng` los tipos de archivo que tienen tabla destino.
+
+    Solo se reemplazan en el destino las filas de las fechas (y versiones)
+    presentes en los DataFrames; el resto de la tabla se conserva. Las tablas
+    de `TIPOS_PARTICIONADOS` se actualizan intercambiando particiones diarias.
+
+    :param engine: Motor de SQLAlchemy.
+    :param dataframes: Diccionario {tipo: DataFrame}.
+    :return: Diccionario {tipo: excepción} de los tipos cuya carga falló.
+    """
+    fallidos = {}
+    for file_type, (tabla, transformar, _, _) in TABLAS_DESTINO.items():
+        if file_type not in dataframes:
+            print(f"El DataFrame {file_type} no está disponible para la carga.")
+            continue
+        try:
+            with etapa(PIPELINE, "transformacion", tipo=file_type) as registro:
+                transformado = transformar(dataframes[file_type])
+                registro.update(filas=len(transformado), bytes=bytes_dataframe(transformado))
+            with etapa(PIPELINE, "carga", tipo=file_type) as registro:
+                reemplazar_en_destino([transformado], engine, file_type)
+                registro.update(filas=len(transformado), bytes=bytes_dataframe(transformado))
+            print(f"Datos cargados exitosamente en tmng.{tabla}")
+        except Exception as e:
+            print(f"Error al cargar los datos en tmng.{tabla}: {e}")
+            fallidos[file_type] = e
+    return fallidos
+
+
+def procesar_por_bloques(engine, file_path, chunksize=CHUNKSIZE_TXF, parquet=True):
+    """
+    Lee, transforma y carga un archivo grande por bloques con memoria acotada.
+
+    Cada bloque se etiqueta, se guarda en el almacén Parquet (si se pide) y,
+    si el tipo tiene tabla destino, se transforma (incluida la conversión a
+    formato largo) y se envía por COPY antes de leer el siguiente. Todos los
+    bloques de la base van en una sola transacción.
+
+    :param engine: Motor de SQLAlchemy, o None para escribir solo en Parquet.
+    :param file_path: Ruta del archivo.
+    :param chunksize: Filas del archivo por bloque.
+    :param parquet: Si es True, guarda cada bloque en el almacén Parquet.
+    :return: Número de filas leídas del archivo.
+    """
+    file_type = tipo_archivo(os.path.basename(file_path))
+    destino = TABLAS_DESTINO.get(file_type) if engine is not None else None
+    leidas = 0
+
+    def bloques_transformados():
+        nonlocal leidas
+        for numero, bloque in enumerate(leer_por_bloques(file_path, chunksize), start=1):
+            leidas += len(bloque)
+            if parquet:
+                escribir_parquet(bloque, file_type, parte=numero)
+            print(f"{os.path.basename(file_path)}: bloque {numero}, {leidas} filas leídas")
+            if destino is not None:
+                yield destino[1](bloque)
+
+    if destino is None:
+        for _ in bloques_transformados():
+            pass
+        return leidas
+
+    reemplazar_en_destino(bloques_transformados(), engine, file_type)
+    print(f"Datos cargados exitosamente en tmng.{destino[0]}")
+    return leidas
+
+
+def procesar_rutas(engine, directorio, rutas, workers=WORKERS, parquet=True, chunksize=CHUNKSIZE_TXF,
+                   txf_por_bloques=False, executor=None):
+    """
+    Lee, guarda en Parquet y carga en `tmng` un lote de archivos.
+
+    :param engine: Motor de SQLAlchemy.
+    :param directorio: Directorio de los archivos.
+    :param rutas: Rutas de los archivos del lote.
+    :param workers: Procesos para leer los archivos.
+    :param parquet: Si es True, guarda los archivos leídos en el almacén Parquet.
+    :param chunksize: Filas por bloque al procesar archivos .txf grandes.
+    :param txf_por_bloques: Si es True, procesa todos los .txf por bloques.
+    :param executor: Pool de procesos reutilizable para la lectura.
+    :return: Tupla (rutas procesadas sin error, diccionario {tipo: DataFrame} leído,
+        diccionario {ruta: excepción} de las rutas con error).
+    """
+    # Los .txf grandes se procesan por bloques, uno a la vez, con memoria acotada
+    grandes = [
+        ruta for ruta in rutas
+        if ruta.endswith(".txf") and (txf_por_bloques or os.path.getsize(ruta) >= TXF_BYTES_BLOQUES)
+    ]
+    procesados = []
+    errores = {}
+    for ruta in grandes:
+        try:
+            # Lectura, transformación y carga van intercaladas por bloque: se miden como una sola etapa
+            with etapa(PIPELINE, "por_bloques", archivo=os.path.basename(ruta)) as registro:
+                registro["filas"] = procesar_por_bloques(engine, ruta, chunksize=chunksize, parquet=parquet)
+                registro["bytes"] = os.path.getsize(ruta)
+            procesados.append(ruta)
+        except Exception as e:
+            print(f"Error al procesar por bloques el archivo {ruta}: {e}")
+            errores[ruta] = e
+
+    # Clasificar el resto de archivos por tipo
+    file_types = clasificar_archivos([os.path.basename(ruta) for ruta in rutas if ruta not in grandes])
+
+    # Leer cada tipo de archivo en un DataFrame
+    with etapa(PIPELINE, "extraccion", archivos=sum(len(files) for files in file_types.values())) as registro:
+        dataframes, errores_lectura = leer_archivos(directorio, file_types, workers=workers, executor=executor)
+        registro["filas"] = sum(len(df) for df in dataframes.values())
+        registro["bytes"] = sum(os.path.getsize(os.path.join(directorio, file))
+                                for files in file_types.values() for file in files)
+
+    # Guardar una copia columnar de los archivos leídos para consultas locales
+    if parquet:
+        with etapa(PIPELINE, "parquet") as registro:
+            for file_type, df in dataframes.items():
+                escribir_parquet(df, file_type)
+            registro["filas"] = sum(len(df) for df in dataframes.values())
+        print(f"Archivos guardados en el almacén Parquet {DIRECTORIO_PARQUET}")
+
+    fallidos = cargar(engine, dataframes)
+
+    # Archivos leídos y cargados sin error; los demás quedan con el error de su lectura o de la carga de su tipo
+    errores.update(errores_lectura)
+    for file_type, files in file_types.items():
+        for file in files:
+            ruta = os.path.join(directorio, file)
+            if ruta in errores:
+                continue
+            if file_type in fallidos:
+                errores[ruta] = fallidos[file_type]
+            else:
+                procesados.append(ruta)
+    return procesados, dataframes, errores
+
+
+def _firmas(directorio):
+    """
+    Tamaño y mtime de los archivos de XM del directorio.
+
+    Un archivo borrado o movido entre el listado y el stat simplemente no aparece.
+    """
+    firmas = {}
+    with os.scandir(directorio) as entradas:
+        for entrada in entradas:
+            if not entrada.name.endswith(EXTENSIONES):
+                continue
+            try:
+                if not entrada.is_file():
+                    continue
+                stat = entrada.stat()
+            except FileNotFoundError:
+                continue
+            firmas[entrada.path] = (stat.st_size, stat.st_mtime_ns)
+    return firmas
+
+
+def _error_permanente(error):
+    """
+    Indica si un error de un archivo no se arregla reintentando (nombre o contenido inválidos).
+
+    Los errores de lectura y conversión (ValueError, que incluye los de pandas,
+    pyarrow y codificación, y los de decimal) dependen del archivo; el resto,
+    como una base caída o un archivo que desapareció, se consideran pasajeros.
+    """
+    return isinstance(error, (ValueError, DecimalException))
+
+
+def _describir(ruta):
+    """
+    Tipo y fecha de operación de un archivo, o None si el nombre no se puede interpretar.
+    """
+    file = os.path.basename(ruta)
     try:
-        df_totaldia.to_sql("totaldia", engine, schema="tmng", if_exists="replace", index=False)
-        print("Datos cargados exitosamente en tmng.totaldia")
-    except Exception as e:
-        print(f"Error al cargar los datos en tmng.totaldia: {e}")
-else:
-    print("El DataFrame totaldia no está disponible para la carga.")
+        return tipo_archivo(file), extract_date_from_filename(file).date()
+    except ValueError:
+        return None
+
+
+def vigilar(engine, directorio, intervalo=INTERVALO_VIGILANCIA, espera=ESPERA_LOTE, workers=WORKERS,
+            parquet=True, chunksize=CHUNKSIZE_TXF, txf_por_bloques=False):
+    """
+    Vigila el directorio y carga cada archivo nuevo o modificado poco después de llegar.
+
+    El directorio se sondea cada `intervalo` segundos. Los archivos que llegan
+    seguidos se agrupan en un lote: el lote se procesa cuando el directorio
+    lleva `espera` segundos sin cambios, lo que además asegura que los archivos
+    terminaron de copiarse. El motor, el pool de procesos de lectura y el
+    manifiesto se conservan entre lotes. Un archivo con nombre o contenido
+    inválido no se reintenta hasta que cambie; uno que falla por un error
+    pasajero se reintenta tras `REINTENTO_INICIAL` segundos, duplicando la
+    espera en cada intento hasta `REINTENTO_MAXIMO`.
+
+    :param engine: Motor de SQLAlchemy.
+    :param directorio: Directorio a vigilar.
+    :param intervalo: Segundos entre sondeos.
+    :param espera: Segundos sin cambios en el directorio antes de procesar el lote.
+    :param workers: Procesos para leer los archivos.
+    :param parquet: Si es True, guarda los archivos leídos en el almacén Parquet.
+    :param chunksize: Filas por bloque al procesar archivos .txf grandes.
+    :param txf_por_bloques: Si es True, procesa todos los .txf por bloques.
+    """
+    manifiesto = Manifiesto(MANIFIESTO)
+    # Archivos omitidos hasta que cambien: {ruta: firma}
+    fallidos = {}
+    # Archivos por reintentar: {ruta: (firma, intentos, instante del próximo intento)}
+    reintentos = {}
+    anteriores = None
+    ultimo_cambio = time.monotonic()
+    print(f"Vigilando {directorio} cada {intervalo} s (lotes tras {espera} s sin cambios). Ctrl+C para terminar.")
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while True:
+            firmas = _firmas(directorio)
+            if firmas != anteriores:
+                anteriores = firmas
+                ultimo_cambio = time.monotonic()
+            elif time.monotonic() - ultimo_cambio >= espera:
+                ahora = time.monotonic()
+                # Un archivo que cambió o desapareció sale de los omitidos y de los reintentos
+                fallidos = {ruta: firma for ruta, firma in fallidos.items() if firmas.get(ruta) == firma}
+                reintentos = {ruta: reintento for ruta, reintento in reintentos.items()
+                              if firmas.get(ruta) == reintento[0]}
+                candidatas = [ruta for ruta in firmas
+                              if ruta not in fallidos and (ruta not in reintentos or reintentos[ruta][2] <= ahora)]
+                lote = []
+                for ruta in manifiesto.cambios(candidatas):
+                    descripcion = _describir(ruta)
+                    if descripcion is None:
+                        print(f"Archivo con nombre no reconocido, se omite: {ruta}")
+                        fallidos[ruta] = firmas[ruta]
+                        continue
+                    print(f"Archivo nuevo: {os.path.basename(ruta)} (tipo {descripcion[0]}, fecha {descripcion[1]})")
+                    lote.append(ruta)
+                if lote:
+                    inicio = time.perf_counter()
+                    procesados, _, errores = procesar_rutas(engine, directorio, lote, workers=workers,
+                                                            parquet=parquet, chunksize=chunksize,
+                                                            txf_por_bloques=txf_por_bloques, executor=executor)
+                    manifiesto.registrar(procesados)
+                    for ruta in procesados:
+                        reintentos.pop(ruta, None)
+                    for ruta in set(lote) - set(procesados):
+                        error = errores.get(ruta)
+                        if error is not None and _error_permanente(error):
+                            print(f"Se omite {os.path.basename(ruta)} hasta que cambie: {error}")
+                            fallidos[ruta] = firmas[ruta]
+                            reintentos.pop(ruta, None)
+                            continue
+                        intentos = reintentos[ruta][1] + 1 if ruta in reintentos else 1
+                        demora = min(REINTENTO_MAXIMO, REINTENTO_INICIAL * 2 ** (intentos - 1))
+                        reintentos[ruta] = (firmas[ruta], intentos, time.monotonic() + demora)
+                        print(f"Se reintentará {os.path.basename(ruta)} en {demora:.0f} s (intento {intentos})")
+                    print(f"Lote de {len(lote)} archivos procesado en {time.perf_counter() - inicio:.2f} s "
+                          f"({len(lote) - len(procesados)} con error)")
+            time.sleep(intervalo)
+    except KeyboardInterrupt:
+        print("Vigilancia detenida.")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def main(argv=None):
+    """
+    Carga los archivos de XM nuevos o modificados, o los vigila con --vigilar.
+
+    :param argv: Argumentos de línea de comandos (por defecto los de sys.argv).
+    :return: Código de salida (0 si todo terminó sin errores).
+    """
+    parser = argparse.ArgumentParser(description="Carga los archivos de XM de Termonorte en el esquema tmng.")
+    parser.add_argument("--directorio", default=data_dir, help="Directorio de los archivos.")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Procesos para leer los archivos.")
+    parser.add_argument("--sin-parquet", action="store_true",
+                        help="No guarda los archivos leídos en el almacén Parquet local.")
+    parser.add_argument("--completo", action="store_true",
+                        help="Procesa todos los archivos aunque no hayan cambiado desde la última carga.")
+    parser.add_argument("--txf-por-bloques", action="store_true",
+                        help="Procesa todos los .txf por bloques, sin importar su tamaño.")
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE_TXF,
+                        help="Filas por bloque al procesar archivos .txf grandes.")
+    parser.add_argument("--vigilar", action="store_true",
+                        help="Queda en ejecución cargando los archivos a medida que llegan al directorio.")
+    parser.add_argument("--intervalo", type=float, default=INTERVALO_VIGILANCIA,
+                        help="Segundos entre revisiones del directorio en modo vigilancia.")
+    parser.add_argument("--espera", type=float, default=ESPERA_LOTE,
+                        help="Segundos sin archivos nuevos antes de procesar un lote en modo vigilancia.")
+    args = parser.parse_args(argv)
+
+    parquet = not args.sin_parquet and parquet_disponible()
+    if not args.sin_parquet and not parquet:
+        print("pyarrow no está instalado: no se guardará el almacén Parquet.")
+    engine = obtener_engine("pg")
+
+    if args.vigilar:
+        vigilar(engine, args.directorio, intervalo=args.intervalo, espera=args.espera, workers=args.workers,
+                parquet=parquet, chunksize=args.chunksize, txf_por_bloques=args.txf_por_bloques)
+        return 0
+
+    # Listar todos los archivos del directorio y quedarse con los nuevos o modificados
+    manifiesto = Manifiesto(MANIFIESTO)
+    rutas = [os.path.join(args.directorio, file) for file in os.listdir(args.directorio) if file.endswith(EXTENSIONES)]
+    if not args.completo:
+        rutas = manifiesto.cambios(rutas)
+    print(f"{len(rutas)} archivos nuevos o modificados por procesar.")
+
+    procesados, dataframes, errores = procesar_rutas(engine, args.directorio, rutas, workers=args.workers,
+                                                     parquet=parquet, chunksize=args.chunksize,
+                                                     txf_por_bloques=args.txf_por_bloques)
+
+    # Registrar en el manifiesto los archivos leídos y cargados sin error
+    manifiesto.registrar(procesados)
+
+    # Mostrar información de los DataFrames creados
+    for file_type, df in dataframes.items():
+        depurar(f"\nDataFrame para tipo {file_type}:", df)
+    if errores:
+        # Quedan fuera del manifiesto, así la próxima ejecución los vuelve a intentar
+        print(f"{len(errores)} archivos con error:")
+        for ruta, error in sorted(errores.items()):
+            print(f"  {os.path.basename(ruta)}: {error}")
+        return 1
+    return 0
+
 
-# Mostrar información de los DataFrames creados
-for file_type, df in dataframes.items():
-    print(f"\nDataFrame para tipo {file_type}:\n", df.head())
+if __name__ == "__main__":
+    exit(main())
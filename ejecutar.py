@@ -0,0 +1,138 @@
+import argparse
+import importlib
+import sys
+import time
+
+from conexiones import cerrar_engines
+from instrumentacion import nombrar_proceso
+
+# Ejecuta varios trabajos en un solo proceso, compartiendo los motores de
+# conexión de `conexiones` (un pool por base). Cada trabajo recibe sus propios
+# argumentos, separados de los del siguiente por '+':
+#
+#   python ejecutar.py prime --modo streaming + optimum + termonorte --sin-parquet
+#
+# Los módulos de los trabajos (y con ellos pandas) se importan solo cuando
+# el trabajo se ejecuta.
+
+# Nombre corto del trabajo y módulo que lo implementa con una función main(argv)
+TRABAJOS = {
+    "prime": "cgm_prime_readmass",
+    "optimum": "cgm_optimum_readmass",
+    "backfill": "cgm_backfill",
+    "termonorte": "datos_termonorte",
+    "vep": "volumen_entregado_productor",
+    "whatsapp": "graficas_whatsapp",
+    "clonar": "clonar_tablas",
+    "benchmark": "benchmark",
+}
+
+# Separador entre los argumentos de un trabajo y el siguiente
+SEPARADOR = "+"
+
+
+def separar_trabajos(argv):
+    """
+    Divide la línea de comandos en trabajos con sus argumentos.
+
+    :param argv: Lista de argumentos, p. ej. ['prime', '--modo', 'en_bd', '+', 'optimum'].
+    :return: Lista de tuplas (trabajo, argumentos).
+    """
+    trabajos = []
+    actual = []
+    for argumento in list(argv) + [SEPARADOR]:
+        if argumento != SEPARADOR:
+            actual.append(argumento)
+            continue
+        if actual:
+            nombre = actual[0]
+            if nombre not in TRABAJOS and nombre not in TRABAJOS.values():
+                raise ValueError(f"Trabajo desconocido: {nombre}. Disponibles: {', '.join(TRABAJOS)}.")
+            trabajos.append((nombre, actual[1:]))
+        actual = []
+    return trabajos
+
+
+def ejecutar_trabajo(nombre, argumentos):
+    """
+    Importa el módulo de un trabajo y ejecuta su función main.
+
+    Los errores del trabajo (incluidos los de importación y los de argparse)
+    se convierten en un código de salida para que no detengan el proceso.
+
+    :param nombre: Nombre corto del trabajo o nombre de su módulo.
+    :param argumentos: Argumentos del trabajo.
+    :return: Código de salida del trabajo.
+    """
+    try:
+        modulo = importlib.import_module(TRABAJOS.get(nombre, nombre))
+        codigo = modulo.main(argumentos)
+    except SystemExit as e:
+        codigo = e.code if isinstance(e.code, int) else 1
+    except Exception as e:
+        print(f"Error en el trabajo {nombre}: {e}")
+        codigo = 1
+    return codigo or 0
+
+
+def ejecutar_trabajos(trabajos, continuar=False):
+    """
+    Ejecuta los trabajos en orden dentro del mismo proceso.
+
+    :param trabajos: Lista de tuplas (trabajo, argumentos) de `separar_trabajos`.
+    :param continuar: Si es True, sigue con los trabajos siguientes cuando uno falla.
+    :return: Diccionario {índice: (trabajo, código de salida, segundos)} de los trabajos ejecutados.
+    """
+    resultados = {}
+    try:
+        for indice, (nombre, argumentos) in enumerate(trabajos):
+            print(f"== {nombre} {' '.join(argumentos)}".rstrip())
+            inicio = time.perf_counter()
+            codigo = ejecutar_trabajo(nombre, argumentos)
+            segundos = round(time.perf_counter() - inicio, 2)
+            resultados[indice] = (nombre, codigo, segundos)
+            print(f"== {nombre}: código {codigo} en {segundos} s")
+            if codigo and not continuar:
+                break
+    finally:
+        cerrar_engines()
+    return resultados
+
+
+def main(argv=None):
+    """
+    Ejecuta los trabajos indicados en la línea de comandos.
+
+    :param argv: Argumentos de línea de comandos (por defecto los de sys.argv).
+    :return: Código de salida (0 si todos los trabajos terminaron sin errores).
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(
+        description="Ejecuta varios trabajos en un solo proceso con conexiones compartidas.",
+        usage=f"%(prog)s [--continuar] TRABAJO [ARGS ...] [{SEPARADOR} TRABAJO [ARGS ...] ...]",
+        epilog=f"Trabajos: {', '.join(f'{nombre} ({modulo})' for nombre, modulo in TRABAJOS.items())}.",
+    )
+    parser.add_argument("--continuar", action="store_true",
+                        help="Sigue con los trabajos siguientes aunque uno termine con error.")
+    # Las opciones del ejecutor van antes del primer trabajo; el resto son argumentos de los trabajos
+    inicio = next((i for i, argumento in enumerate(argv) if not argumento.startswith("-")), len(argv))
+    args = parser.parse_args(argv[:inicio])
+    try:
+        trabajos = separar_trabajos(argv[inicio:])
+    except ValueError as e:
+        parser.error(str(e))
+    if not trabajos:
+        parser.error("Indique al menos un trabajo.")
+
+    # Un archivo de métricas por combinación de trabajos, para no pisar el de otra ejecución simultánea
+    nombrar_proceso("ejecutar_" + "_".join(nombre for nombre, _ in trabajos))
+    resultados = ejecutar_trabajos(trabajos, continuar=args.continuar)
+    fallidos = [nombre for nombre, codigo, _ in resultados.values() if codigo]
+    if fallidos or len(resultados) < len(trabajos):
+        print(f"Trabajos con error: {fallidos}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
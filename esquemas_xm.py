@@ -0,0 +1,163 @@
+import importlib.util
+import os
+from decimal import Decimal
+
+import pandas as pd
+
+# Registro de esquemas de los archivos de XM: para cada prefijo de archivo se
+# declaran sus columnas, el tipo de cada una y el separador decimal. Leer con
+# tipos explícitos evita que pandas infiera tipos distintos según el archivo
+# (p. ej. una columna HORA toda en cero como int64 en un día y float64 en otro),
+# así el resultado es el mismo sin importar qué archivos haya en el lote.
+# Los valores numéricos traen hasta 40 dígitos (p. ej. CSCIF de totaldia), más
+# de los que conserva un float64, por eso se leen como texto y se convierten a
+# decimal.Decimal; en PostgreSQL se guardan como numeric.
+
+# Columnas horarias de los archivos de XM (HORA 01 ... HORA 24)
+HORAS = [f"HORA {hora:02d}" for hora in range(1, 25)]
+
+TEXTO = "str"
+DECIMAL = "decimal"
+
+ESQUEMAS = {
+    "tdia_sis": {
+        "columnas": {"CODIGO": TEXTO, "DESCRIPCION": TEXTO, "VALOR": DECIMAL},
+        "decimal": ".",
+    },
+    "totaldia": {
+        "columnas": {"CODIGO": TEXTO, "DESCRIPCION": TEXTO, "PLANTA": TEXTO, "VALOR": DECIMAL},
+        "decimal": ".",
+    },
+    "oefagnd": {
+        "columnas": {"CONCEPTO": TEXTO, "DESCRIPCION": TEXTO, "VALOR": DECIMAL},
+        "decimal": ".",
+    },
+    "oefagnh": {
+        "columnas": {"CONCEPTO": TEXTO, "DESCRIPCION": TEXTO, **{hora: DECIMAL for hora in HORAS}},
+        "decimal": ".",
+    },
+    "COMB": {
+        "columnas": {"PLANTA": TEXTO, "CONCEPTO": TEXTO, "DESCRIPCION": TEXTO, "VALOR": DECIMAL},
+        "decimal": ".",
+    },
+    "preofe": {
+        "columnas": {
+            "SUBMERCADO": TEXTO, "FECHA": TEXTO, "CONFIGURACION": TEXTO, "CONCEPTO": TEXTO,
+            **{hora: DECIMAL for hora in HORAS},
+        },
+        "decimal": ".",
+    },
+}
+
+# Motor de lectura: pyarrow si está instalado, si no el motor C de pandas
+MOTOR_CSV = os.getenv('XM_MOTOR_CSV') or ('pyarrow' if importlib.util.find_spec('pyarrow') else 'c')
+
+
+def tipo_archivo(file_name):
+    """
+    Obtiene el tipo de un archivo de XM a partir de su nombre (prefijo sin dígitos).
+
+    :param file_name: Nombre del archivo, p. ej. `oefagnh1114.tx2`.
+    :return: Tipo del archivo, p. ej. `oefagnh`.
+    """
+    name_part = ''.join([c for c in file_name if not c.isdigit()])  # Extraer prefijo antes de los números
+    return name_part.split('.')[0]
+
+
+def opciones_lectura(tipo):
+    """
+    Construye los argumentos de `pd.read_csv` (motor C) para un tipo de archivo.
+
+    :param tipo: Tipo de archivo (prefijo).
+    :return: Diccionario de argumentos para `pd.read_csv`.
+    """
+    opciones = {"sep": ";", "header": 0, "encoding": "latin-1"}
+    esquema = ESQUEMAS.get(tipo)
+    if esquema is None:
+        # Tipo sin esquema declarado: se deja que pandas infiera los tipos
+        return opciones
+    opciones.update({
+        "usecols": list(esquema["columnas"]),
+        # Las columnas decimales se leen como texto y se convierten en `_tipar`
+        "dtype": {columna: TEXTO for columna in esquema["columnas"]},
+        "engine": "c",
+    })
+    return opciones
+
+
+def _leer_pyarrow(ruta, esquema):
+    """
+    Lee un archivo con pyarrow.csv y todas las columnas del esquema como texto.
+
+    No se usa `pd.read_csv(engine='pyarrow')` porque infiere float64 antes de
+    aplicar `dtype` y los decimales largos ya llegan redondeados.
+    """
+    from pyarrow import csv, string
+
+    columnas = list(esquema["columnas"])
+    tabla = csv.read_csv(
+        ruta,
+        read_options=csv.ReadOptions(encoding="latin-1"),
+        parse_options=csv.ParseOptions(delimiter=";"),
+        convert_options=csv.ConvertOptions(include_columns=columnas,
+                                           column_types={columna: string() for columna in columnas}),
+    )
+    return tabla.to_pandas()
+
+
+def a_decimal(serie, separador="."):
+    """
+    Convierte una columna de texto a decimal.Decimal sin pasar por float.
+
+    :param serie: Serie de texto (los vacíos llegan como NaN).
+    :param separador: Separador decimal del archivo.
+    :return: Serie de objetos Decimal, con None en los vacíos.
+    """
+    valores = serie.to_numpy()
+    if separador != ".":
+        valores = [valor.replace(separador, ".") if isinstance(valor, str) else valor for valor in valores]
+    return pd.Series(
+        [Decimal(valor) if isinstance(valor, str) and valor.strip() else None for valor in valores],
+        index=serie.index, dtype=object,
+    )
+
+
+def _tipar(df, tipo):
+    """
+    Deja las columnas en el orden declarado en el esquema del tipo y convierte las decimales.
+    """
+    esquema = ESQUEMAS.get(tipo)
+    if esquema is None:
+        return df
+    decimales = {
+        columna: a_decimal(df[columna], esquema["decimal"])
+        for columna, tipo_columna in esquema["columnas"].items() if tipo_columna == DECIMAL
+    }
+    return df.assign(**decimales)[list(esquema["columnas"])]
+
+
+def _bloques(lector, tipo):
+    with lector:
+        for bloque in lector:
+            yield _tipar(bloque, tipo)
+
+
+def leer_csv(ruta, tipo=None, **extra):
+    """
+    Lee un archivo de XM con el esquema de su tipo.
+
+    Con `chunksize` devuelve un generador de bloques; en ese caso se usa el
+    motor C, porque pyarrow no lee por bloques.
+
+    :param ruta: Ruta del archivo.
+    :param tipo: Tipo de archivo; por defecto se deduce del nombre.
+    :param extra: Argumentos adicionales para `pd.read_csv`.
+    :return: DataFrame (o generador de DataFrames) con las columnas en el orden del esquema.
+    """
+    tipo = tipo or tipo_archivo(os.path.basename(ruta))
+    if MOTOR_CSV == "pyarrow" and tipo in ESQUEMAS and not extra:
+        return _tipar(_leer_pyarrow(ruta, ESQUEMAS[tipo]), tipo)
+    lector = pd.read_csv(ruta, **{**opciones_lectura(tipo), **extra})
+    if extra.get("chunksize") is not None:
+        return _bloques(lector, tipo)
+    return _tipar(lector, tipo)
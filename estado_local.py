@@ -0,0 +1,50 @@
+import json
+import os
+
+# Directorio donde se guardan los archivos de estado entre ejecuciones
+DIRECTORIO_ESTADO = os.getenv('ESTADO_DIR', '.estado')
+
+
+def ruta_estado(nombre):
+    """
+    Devuelve la ruta del archivo de estado asociado a un nombre.
+
+    :param nombre: Nombre del estado (string).
+    :return: Ruta del archivo JSON.
+    """
+    return os.path.join(DIRECTORIO_ESTADO, f"{nombre}.json")
+
+
+def leer_estado(nombre, por_defecto=None):
+    """
+    Lee un estado persistido en disco.
+
+    :param nombre: Nombre del estado (string).
+    :param por_defecto: Valor a devolver si el estado no existe.
+    :return: Contenido del estado.
+    """
+    ruta = ruta_estado(nombre)
+    if not os.path.isfile(ruta):
+        return por_defecto
+    with open(ruta, encoding="utf-8") as archivo:
+        return json.load(archivo)
+
+
+def guardar_estado(nombre, datos, modo=0o666):
+    """
+    Guarda un estado en disco de forma atómica (archivo temporal + rename).
+
+    :param nombre: Nombre del estado (string).
+    :param datos: Contenido serializable a JSON.
+    :param modo: Permisos del archivo (se les aplica el umask); p. ej. 0o600
+        para secretos, que así no son legibles por otros ni en el temporal.
+    """
+    ruta = ruta_estado(nombre)
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    temporal = f"{ruta}.tmp"
+    if os.path.lexists(temporal):
+        os.remove(temporal)  # Temporal de una ejecución interrumpida, quizá con otros permisos
+    descriptor = os.open(temporal, os.O_WRONLY | os.O_CREAT | os.O_EXCL, modo)
+    with open(descriptor, "w", encoding="utf-8") as archivo:
+        json.dump(datos, archivo, ensure_ascii=False, indent=2, default=str)
+    os.replace(temporal, ruta)
@@ -1,51 +1,100 @@
+import argparse
+import base64
+import json
 import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import text
 import requests
-
-# Cargar las variables de entorno desde el archivo .env
-load_dotenv()
-
-# Recuperar las credenciales de la base de datos desde el archivo .env
-PGPASSWORD = os.getenv('ETRM_PGPASSWORD')
-PG_HOST = os.getenv('ETRM_PG_HOST')
-PG_PORT = os.getenv('ETRM_PG_PORT')
-PG_USER = os.getenv('ETRM_PG_USER')
-PG_DB = os.getenv('ETRM_PG_DB')
-
-# Crear la cadena de conexión a PostgreSQL usando SQLAlchemy
-DATABASE_URL = f"postgresql://{PG_USER}:{PGPASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DB}"
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from conexiones import obtener_engine
+from estado_local import leer_estado, guardar_estado
+from instrumentacion import etapa
 
 # Credenciales del servicio para obtener el token
 SERVICE_USER = os.getenv('WHATSAPP_SERVICE_USER')
 SERVICE_PASSWORD = os.getenv('WHATSAPP_SERVICE_PASSWORD')
 
-# Crea el motor de SQLAlchemy
-engine = create_engine(DATABASE_URL)
+# URL base del servicio de reportes (configurable para pruebas contra un servidor local)
+BASE_URL = os.getenv('WHATSAPP_BASE_URL', 'https://reportes.enersinc.com').rstrip('/')
+
+# Envíos simultáneos, intentos por cliente, espera base entre intentos y timeout (segundos)
+CONCURRENCIA = int(os.getenv('WHATSAPP_CONCURRENCIA', '8'))
+REINTENTOS = int(os.getenv('WHATSAPP_REINTENTOS', '3'))
+ESPERA_REINTENTO = float(os.getenv('WHATSAPP_ESPERA_REINTENTO', '1'))
+TIMEOUT = float(os.getenv('WHATSAPP_TIMEOUT', '30'))
+
+# Códigos HTTP que se consideran fallas transitorias y se reintentan
+CODIGOS_REINTENTABLES = {429, 500, 502, 503, 504}
 
-# Crea una sesión
-Session = sessionmaker(bind=engine)
-session = Session()
+# Códigos que se reintentan en solicitudes no idempotentes (el envío por
+# WhatsApp): solo los que indican que el servicio rechazó la solicitud sin
+# procesarla. Un 5xx o un timeout de lectura pueden llegar después de enviado
+# el mensaje, y reintentarlos lo duplicaría.
+CODIGOS_REINTENTABLES_ENVIO = {429, 503}
 
+# Nombre del pipeline en las métricas de instrumentacion
+PIPELINE = 'whatsapp'
+
+# Estado local: token vigente y reportes generados/enviados por (concepto, fecha)
+ESTADO_TOKEN = 'whatsapp_token'
+ESTADO_ENVIOS = 'whatsapp_envios'
+
+# Vigencia supuesta del token cuando el servicio no la informa, y margen para renovarlo antes (segundos)
+TOKEN_TTL = int(os.getenv('WHATSAPP_TOKEN_TTL', '3600'))
+MARGEN_TOKEN = 60
+
+
+def _expiracion_token(token, json_response):
+    """
+    Calcula el instante (epoch) en que expira un token.
 
-def obtener_token():
+    Se usa `expires_in` de la respuesta si viene; si no, el claim `exp` del
+    token cuando es un JWT; si no, `TOKEN_TTL` segundos desde ahora.
+    """
+    if json_response.get("expires_in"):
+        return time.time() + float(json_response["expires_in"])
+    try:
+        carga = token.split(".")[1]
+        exp = json.loads(base64.urlsafe_b64decode(carga + "=" * (-len(carga) % 4))).get("exp")
+        if exp:
+            return float(exp)
+    except (IndexError, ValueError):
+        pass
+    return time.time() + TOKEN_TTL
+
+
+def obtener_token(forzar=False):
     """
     Obtiene un token desde el endpoint de autenticación.
 
+    El token se guarda en el estado local y se reutiliza mientras no esté
+    por expirar, así las ejecuciones seguidas no vuelven a autenticarse.
+
+    :param forzar: Si es True, ignora el token guardado y pide uno nuevo.
     :return: Token de autenticación si es exitoso, None si hay un error.
     """
-    url = "https://reportes.enersinc.com/signin"
+    if not forzar:
+        guardado = leer_estado(ESTADO_TOKEN)
+        if guardado and guardado.get("expira", 0) - MARGEN_TOKEN > time.time():
+            return guardado["token"]
+
+    url = f"{BASE_URL}/signin"
     body_request = {
         "email": SERVICE_USER,
         "password": SERVICE_PASSWORD
     }
     try:
-        response = requests.post(url, json=body_request, verify=False)
+        response = requests.post(url, json=body_request, verify=False, timeout=TIMEOUT)
         response.raise_for_status()  # Lanza una excepción si ocurre un error
         json_response = response.json()
         token = json_response.get("token")  # Asume que el token está en la clave 'token'
         if token:
+            guardar_estado(ESTADO_TOKEN, {"token": token, "expira": _expiracion_token(token, json_response)},
+                           modo=0o600)
             return token
         else:
             print("No se encontró un token en la respuesta del endpoint.")
@@ -53,16 +102,48 @@ def obtener_token():
     except requests.exceptions.RequestException as e:
         print(f"Error al obtener el token: {e}")
         return None
-    
 
-def obtener_clientes_por_concepto(concepto):
+
+class Autenticacion:
+    """
+    Token compartido entre hilos que se renueva una sola vez cuando el servicio responde 401.
+    """
+
+    def __init__(self, token):
+        self.token = token
+        self._lock = threading.Lock()
+
+    def headers(self):
+        return {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json"
+        }
+
+    def renovar(self, usado):
+        """
+        Pide un token nuevo si `usado` sigue siendo el vigente (otro hilo pudo renovarlo ya).
+
+        :return: True si hay un token distinto de `usado` para reintentar.
+        """
+        with self._lock:
+            if self.token == usado:
+                nuevo = obtener_token(forzar=True)
+                if not nuevo:
+                    return False
+                self.token = nuevo
+            return True
+
+
+def obtener_clientes_por_concepto(concepto, engine=None):
     """
     Obtiene la lista de clientes de la tabla `app.maestra_whatsapp` 
     que cumplen con el filtro de concepto y activo.
 
     :param concepto: El valor del concepto a buscar (string).
+    :param engine: Motor de SQLAlchemy; por defecto el compartido de la base ETRM.
     :return: Lista de clientes que cumplen con el filtro.
     """
+    engine = engine or obtener_engine("etrm")
     try:
         query = text("""
             SELECT cliente 
@@ -71,7 +152,8 @@ def obtener_clientes_por_concepto(concepto):
             AND activo ILIKE '%true%'
         """)
         # Ejecuta la consulta con el parámetro
-        resultados = session.execute(query, {"concepto": concepto}).fetchall()
+        with engine.connect() as connection:
+            resultados = connection.execute(query, {"concepto": concepto}).fetchall()
         
         # Extrae los clientes de los resultados
         clientes = [row[0] for row in resultados]
@@ -79,66 +161,241 @@ def obtener_clientes_por_concepto(concepto):
     except Exception as e:
         print(f"Error al ejecutar la consulta: {e}")
         return []
-    finally:
-        session.close()
 
 
-def ejecutar_endpoints(concepto, fecha, token, clientes):
+def crear_sesion_http(concurrencia=CONCURRENCIA):
+    """
+    Crea una sesión HTTP con conexiones keep-alive para compartir entre hilos.
+
+    :param concurrencia: Número máximo de conexiones simultáneas al servicio.
+    :return: `requests.Session` configurada.
+    """
+    sesion = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=concurrencia)
+    sesion.mount("https://", adaptador)
+    sesion.mount("http://", adaptador)
+    return sesion
+
+
+def _sin_conexion(error):
+    """
+    Indica si un error ocurrió al abrir la conexión, antes de enviar la solicitud.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    razon = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.exceptions.ConnectionError) and isinstance(razon, NewConnectionError)
+
+
+def solicitar(sesion, url, autenticacion, reintentos=REINTENTOS, espera=ESPERA_REINTENTO, timeout=TIMEOUT,
+              idempotente=True):
+    """
+    Hace un GET reintentando las fallas transitorias con espera exponencial.
+
+    Se reintentan los errores de conexión, los timeouts y los códigos de
+    `CODIGOS_REINTENTABLES`; ante un 401 se renueva el token y se reintenta
+    una vez. Cualquier otro error HTTP se devuelve de inmediato. Si la
+    solicitud no es idempotente solo se reintenta cuando es seguro que no se
+    procesó: errores al abrir la conexión y los códigos de
+    `CODIGOS_REINTENTABLES_ENVIO`.
+
+    :param sesion: Sesión HTTP.
+    :param url: URL a consultar.
+    :param autenticacion: `Autenticacion` con el token vigente.
+    :param reintentos: Número máximo de intentos.
+    :param espera: Segundos de espera antes del segundo intento; se duplica en cada intento.
+    :param timeout: Timeout de cada intento en segundos.
+    :param idempotente: Si es False, no se reintenta lo que pudo haberse procesado.
+    :return: Tupla (respuesta o None, intentos realizados, mensaje de error o None).
     """
-    Ejecuta dos endpoints secuencialmente con los parámetros proporcionados.
+    reintentables = CODIGOS_REINTENTABLES if idempotente else CODIGOS_REINTENTABLES_ENVIO
+    error = None
+    renovado = False
+    for intento in range(1, reintentos + 1):
+        try:
+            token = autenticacion.token
+            response = sesion.get(url, headers=autenticacion.headers(), timeout=timeout)
+            if response.status_code == 401 and not renovado and autenticacion.renovar(token):
+                renovado = True
+                response = sesion.get(url, headers=autenticacion.headers(), timeout=timeout)
+            if response.status_code not in reintentables:
+                response.raise_for_status()  # Lanza una excepción si ocurre un error no transitorio
+                return response, intento, None
+            error = f"HTTP {response.status_code}"
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if not idempotente and not _sin_conexion(e):
+                return None, intento, str(e)
+            error = str(e)
+        except requests.exceptions.RequestException as e:
+            return None, intento, str(e)
+        if intento < reintentos:
+            time.sleep(espera * 2 ** (intento - 1))
+    return None, reintentos, error
+
+
+def _enviar_cliente(sesion, concepto, fecha, cliente, autenticacion, reintentos, timeout):
+    """
+    Envía el reporte a un cliente y devuelve el detalle del resultado.
+    """
+    inicio = time.perf_counter()
+    url = f"{BASE_URL}/envio/{concepto}/{cliente}/{fecha}"
+    response, intentos, error = solicitar(sesion, url, autenticacion, reintentos=reintentos, timeout=timeout,
+                                          idempotente=False)
+    if error is not None:
+        print(f"Error al ejecutar el segundo endpoint para cliente '{cliente}': {error}")
+    return {
+        "cliente": cliente,
+        "estado": "enviado" if response is not None else "error",
+        "intentos": intentos,
+        "segundos": round(time.perf_counter() - inicio, 3),
+        "error": error,
+    }
+
+
+def _clave_envio(concepto, fecha):
+    return f"{concepto}|{fecha}"
+
+
+def envios_registrados(concepto, fecha):
+    """
+    Devuelve lo ya hecho para un concepto y fecha según el estado local.
+
+    :return: Diccionario con `reporte` (fecha de generación o None) y `enviados` {cliente: fecha de envío}.
+    """
+    registro = leer_estado(ESTADO_ENVIOS, {}).get(_clave_envio(concepto, fecha), {})
+    return {"reporte": registro.get("reporte"), "enviados": registro.get("enviados", {})}
+
+
+def _registrar_envios(concepto, fecha, reporte=None, enviados=()):
+    """
+    Agrega al estado local el reporte generado y/o los clientes enviados.
+    """
+    registros = leer_estado(ESTADO_ENVIOS, {})
+    registro = registros.setdefault(_clave_envio(concepto, fecha), {"reporte": None, "enviados": {}})
+    ahora = datetime.now().isoformat(timespec="seconds")
+    if reporte:
+        registro["reporte"] = ahora
+    for cliente in enviados:
+        registro["enviados"][cliente] = ahora
+    guardar_estado(ESTADO_ENVIOS, registros)
+
+
+def ejecutar_endpoints(concepto, fecha, token, clientes, concurrencia=CONCURRENCIA, reintentos=REINTENTOS,
+                       timeout=TIMEOUT, forzar=False):
+    """
+    Genera el reporte del concepto y lo envía a los clientes de forma concurrente.
+
+    El primer endpoint genera el reporte; después el envío a cada cliente se
+    reparte en un pool de `concurrencia` hilos que comparten una sesión HTTP
+    con conexiones keep-alive. Cada envío se reintenta solo si el servicio no
+    llegó a procesarlo (ver `solicitar`), para no duplicar mensajes, y el
+    token se renueva si el servicio responde 401.
+
+    Lo hecho se registra en el estado local por (concepto, fecha): al volver a
+    ejecutar no se regenera un reporte ya generado ni se reenvía a los clientes
+    que ya lo recibieron, salvo con `forzar`.
 
     :param concepto: El concepto a utilizar (string).
     :param fecha: La fecha para los endpoints (string en formato YYYY-MM-DD).
-    :param token: El Bearer Token para la autenticación (string).
+    :param token: El Bearer Token (string) o una `Autenticacion` compartida entre
+        llamadas, para que un token renovado se use también en las siguientes.
     :param clientes: Listado de clientes que tienen el concepto en producción
-    :return: Respuestas de los dos endpoints.
+    :param concurrencia: Número máximo de envíos simultáneos.
+    :param reintentos: Intentos por cliente.
+    :param timeout: Timeout de cada solicitud en segundos.
+    :param forzar: Si es True, regenera el reporte y envía a todos los clientes.
+    :return: Resumen con las claves `concepto`, `fecha`, `reporte` (si está generado),
+        `enviados`, `fallidos`, `omitidos` (ya enviados antes), `detalle`
+        (un diccionario por cliente enviado en esta ejecución) y `segundos`.
     """
-    # Headers para incluir el Bearer Token
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
+    autenticacion = token if isinstance(token, Autenticacion) else Autenticacion(token)
+    inicio = time.perf_counter()
+    registro = {"reporte": None, "enviados": {}} if forzar else envios_registrados(concepto, fecha)
+    pendientes = [cliente for cliente in clientes if cliente not in registro["enviados"]]
+    resumen = {"concepto": concepto, "fecha": fecha, "reporte": bool(registro["reporte"]), "enviados": [],
+               "fallidos": [], "omitidos": [c for c in clientes if c in registro["enviados"]],
+               "detalle": [], "segundos": 0.0}
 
-    # URL del primer endpoint
-    url1 = f"https://reportes.enersinc.com/{concepto}/{fecha}/whatsapp"
-    try:
-        # Realizar la solicitud al primer endpoint
-        response1 = requests.get(url1, headers=headers)
-        response1.raise_for_status()  # Lanza una excepción si ocurre un error
-    except requests.exceptions.RequestException as e:
-        print(f"Error al ejecutar el primer endpoint: {e}")
-        return None
+    with crear_sesion_http(concurrencia) as sesion:
+        if not resumen["reporte"] and pendientes:
+            # Generar el reporte (primer endpoint)
+            _, _, error = solicitar(sesion, f"{BASE_URL}/{concepto}/{fecha}/whatsapp", autenticacion,
+                                    reintentos=reintentos, timeout=timeout)
+            if error is not None:
+                print(f"Error al ejecutar el primer endpoint: {error}")
+            else:
+                resumen["reporte"] = True
+                _registrar_envios(concepto, fecha, reporte=True)
+        if resumen["reporte"] and pendientes:
+            # Enviar a cada cliente pendiente (segundo endpoint) en paralelo, conservando el orden de la lista
+            with ThreadPoolExecutor(max_workers=max(1, min(concurrencia, len(pendientes)))) as executor:
+                for detalle in executor.map(
+                    lambda cliente: _enviar_cliente(sesion, concepto, fecha, cliente, autenticacion,
+                                                    reintentos, timeout),
+                    pendientes,
+                ):
+                    resumen["detalle"].append(detalle)
+                    if detalle["estado"] == "enviado":
+                        _registrar_envios(concepto, fecha, enviados=[detalle["cliente"]])
 
-    # URL base del segundo endpoint
-    url2_base = f"https://reportes.enersinc.com/envio/{concepto}"
+    resumen["enviados"] = [d["cliente"] for d in resumen["detalle"] if d["estado"] == "enviado"]
+    resumen["fallidos"] = [d["cliente"] for d in resumen["detalle"] if d["estado"] != "enviado"]
+    resumen["segundos"] = round(time.perf_counter() - inicio, 3)
+    return resumen
 
-    respuestas = []
-    for cliente in clientes:
-        url2 = f"{url2_base}/{cliente}/{fecha}"
-        try:
-            # Realizar la solicitud al segundo endpoint
-            response2 = requests.get(url2, headers=headers)
-            response2.raise_for_status()  # Lanza una excepción si ocurre un error
-            respuestas.append({cliente: 'enviado'})
-        except requests.exceptions.RequestException as e:
-            print(f"Error al ejecutar el segundo endpoint para cliente '{cliente}': {e}")
-            respuestas.append({cliente: None})
 
-    return respuestas
+def main(argv=None):
+    """
+    Genera y envía los reportes de los conceptos indicados.
+
+    :param argv: Argumentos de línea de comandos (por defecto los de sys.argv).
+    :return: Código de salida (0 si todo terminó sin errores).
+    """
+    parser = argparse.ArgumentParser(description="Genera y envía por WhatsApp los reportes de uno o más conceptos.")
+    parser.add_argument("--concepto", action="append", help="Concepto a enviar; se puede repetir (por defecto 5).")
+    parser.add_argument("--fecha", default="2024-11-29", help="Fecha del reporte (YYYY-MM-DD).")
+    parser.add_argument("--cliente", action="append",
+                        help="Cliente al que se envía; se puede repetir (por defecto prueba3).")
+    parser.add_argument("--clientes-bd", action="store_true",
+                        help="Envía a los clientes activos del concepto en app.maestra_whatsapp.")
+    parser.add_argument("--forzar", action="store_true",
+                        help="Regenera el reporte y reenvía aunque ya conste como enviado.")
+    args = parser.parse_args(argv)
 
-if __name__ == "__main__":
-    concepto = "5"  # Reemplaza con el concepto deseado
-    fecha = "2024-11-29"  # Reemplaza con la fecha deseada
     # Obtener el token
     token = obtener_token()
     if not token:
         print("No se pudo obtener el token. Abortando ejecución.")
-        exit(1)
-    
-    # Obtener la lista de clientes
-    clientes = ['prueba3']
-    if not clientes:
-        clientes = obtener_clientes_por_concepto(concepto)
-    print("Clientes encontrados:", clientes)
-    resultados = ejecutar_endpoints(concepto, fecha, token, clientes)
-    print("Resultados finales:", resultados)
+        return 1
+    # Una sola autenticación para todos los conceptos: si se renueva, los siguientes usan el token nuevo
+    autenticacion = Autenticacion(token)
+
+    con_error = False
+    for concepto in args.concepto or ["5"]:
+        # Obtener la lista de clientes
+        with etapa(PIPELINE, "extraccion", concepto=concepto) as registro:
+            clientes = obtener_clientes_por_concepto(concepto) if args.clientes_bd else (args.cliente or ["prueba3"])
+            registro["filas"] = len(clientes)
+        print(f"Clientes encontrados para el concepto {concepto}:", clientes)
+        with etapa(PIPELINE, "envio", concepto=concepto, fecha=args.fecha) as registro:
+            resultados = ejecutar_endpoints(concepto, args.fecha, autenticacion, clientes, forzar=args.forzar)
+            registro["filas"] = len(resultados["enviados"])
+        if len(resultados["omitidos"]) == len(clientes):
+            print(f"Sin clientes pendientes para el concepto {concepto}: "
+                  f"{len(resultados['omitidos'])} ya enviados antes.")
+            continue
+        if not resultados["reporte"]:
+            print(f"No se pudo generar el reporte del concepto {concepto}.")
+            con_error = True
+            continue
+        print(f"Resultados finales del concepto {concepto}: {len(resultados['enviados'])} enviados, "
+              f"{len(resultados['fallidos'])} con error, {len(resultados['omitidos'])} ya enviados antes "
+              f"en {resultados['segundos']} s")
+        if resultados["fallidos"]:
+            print("Clientes con error (se reintentarán en la próxima ejecución):", resultados["fallidos"])
+            con_error = True
+    return 1 if con_error else 0
+
+
+if __name__ == "__main__":
+    exit(main())
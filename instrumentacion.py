@@ -0,0 +1,285 @@
+import json
+import os
+import re
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from estado_local import DIRECTORIO_ESTADO
+
+# Métricas por etapa (extracción, transformación, carga) de los pipelines.
+# Cada etapa medida registra duración, filas, bytes y pico de memoria
+# residente; el registro se agrega como una línea JSON en etapas.jsonl y se
+# actualiza el archivo <pipeline>_<proceso>.prom en formato de texto de
+# Prometheus (para el textfile collector de node_exporter). Los acumulados
+# del archivo son contadores desde el inicio del proceso: un proceso que
+# ejecuta varias veces un pipeline (cgm_backfill, la vigilancia de
+# Termonorte, ejecutar.py) no los reinicia. Medir una etapa cuesta leer
+# /proc/self/status dos veces, así que se deja activo por defecto.
+
+# Directorio de las métricas; METRICAS=0 desactiva el registro
+DIRECTORIO_METRICAS = os.getenv('METRICAS_DIR', os.path.join(DIRECTORIO_ESTADO, 'metricas'))
+METRICAS_ACTIVAS = os.getenv('METRICAS', '1').lower() not in ('0', 'false', 'no')
+
+# Impresión de muestras de los DataFrames para depurar (desactivada por defecto)
+DEPURACION = os.getenv('DEPURACION', '0').lower() in ('1', 'true', 'si', 'sí')
+
+# Prefijo de las métricas de Prometheus
+PREFIJO = "etl_etapa"
+
+# Proceso que publica las métricas: va en el nombre del archivo .prom y como
+# etiqueta, así dos procesos que corren el mismo pipeline (p. ej. cgm_backfill
+# y cgm_prime_readmass) no se pisan el archivo ni duplican series. Por
+# defecto es el nombre del script.
+PROCESO = re.sub(r"[^A-Za-z0-9_.-]", "_",
+                 os.getenv('METRICAS_PROCESO') or os.path.splitext(os.path.basename(sys.argv[0]))[0] or "python")
+
+MB = 1024 * 1024
+
+# Totales del proceso por (pipeline, etapa), publicados en el archivo .prom
+_totales = {}
+_lock = threading.Lock()
+
+# Mediciones en curso: el pico de memoria solo se reinicia si no hay otra
+_activas = 0
+_lock_activas = threading.Lock()
+
+
+def nombrar_proceso(nombre):
+    """
+    Cambia el nombre del proceso en las métricas, salvo que venga en METRICAS_PROCESO.
+
+    Debe llamarse antes de registrar la primera etapa.
+
+    :param nombre: Nombre del proceso (se reemplazan los caracteres no válidos en un nombre de archivo).
+    """
+    global PROCESO
+    if not os.getenv('METRICAS_PROCESO'):
+        PROCESO = re.sub(r"[^A-Za-z0-9_.-]", "_", nombre)
+
+
+def reiniciar_pico_rss():
+    """
+    Reinicia el pico de memoria residente del proceso (Linux); en otros sistemas no hace nada.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as archivo:
+            archivo.write("5")
+    except OSError:
+        pass
+
+
+def memoria_rss():
+    """
+    Memoria residente actual y pico desde el último `reiniciar_pico_rss`, en MB.
+
+    :return: Tupla (rss, pico). Sin /proc el pico es el máximo de todo el proceso.
+    """
+    try:
+        with open("/proc/self/status") as archivo:
+            campos = dict(linea.split(":", 1) for linea in archivo if ":" in linea)
+        return int(campos["VmRSS"].split()[0]) / 1024, int(campos["VmHWM"].split()[0]) / 1024
+    except (OSError, KeyError):
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return pico, pico
+
+
+def bytes_dataframe(df, profundo=False):
+    """
+    Memoria ocupada por un DataFrame.
+
+    :param df: DataFrame.
+    :param profundo: Si es True incluye el contenido de las columnas de texto,
+        lo que obliga a recorrerlas; por defecto solo cuenta los arreglos.
+    :return: Bytes.
+    """
+    return int(df.memory_usage(index=False, deep=profundo).sum())
+
+
+def depurar(titulo, df=None):
+    """
+    Imprime un título y las primeras filas de un DataFrame solo si DEPURACION está activa.
+    """
+    if not DEPURACION:
+        return
+    print(titulo)
+    if df is not None:
+        print(df.head())
+
+
+@contextmanager
+def medir(**etiquetas):
+    """
+    Mide la duración y el pico de memoria residente del bloque.
+
+    El bloque puede completar `filas` y `bytes` en el diccionario que recibe;
+    al salir se agregan `segundos`, `filas_por_s`, `mb_por_s`, `pico_rss_mb`
+    e `incremento_rss_mb`. El pico es del proceso: si hay otra medición en
+    curso (anidada o en otro hilo) no se reinicia, y el valor es una cota
+    superior que incluye la memoria de ambas.
+
+    :param etiquetas: Campos que identifican la medición.
+    """
+    global _activas
+    registro = dict(etiquetas, filas=0, bytes=0)
+    with _lock_activas:
+        if _activas == 0:
+            reiniciar_pico_rss()
+        _activas += 1
+    rss_inicio, _ = memoria_rss()
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        segundos = time.perf_counter() - inicio
+        _, pico = memoria_rss()
+        with _lock_activas:
+            _activas -= 1
+        registro.update({
+            "segundos": round(segundos, 4),
+            "filas_por_s": round(registro["filas"] / segundos, 1) if segundos > 0 else None,
+            "mb_por_s": round(registro["bytes"] / MB / segundos, 2) if segundos > 0 else None,
+            "pico_rss_mb": round(pico, 1),
+            "incremento_rss_mb": round(pico - rss_inicio, 1),
+        })
+
+
+@contextmanager
+def etapa(pipeline, nombre, **etiquetas):
+    """
+    Mide una etapa de un pipeline y registra el resultado (también si falla).
+
+    Uso:
+        with etapa("prime_readmass", "extraccion", fecha=fecha) as registro:
+            df = ...
+            registro.update(filas=len(df), bytes=bytes_dataframe(df))
+
+    :param pipeline: Nombre del pipeline.
+    :param nombre: Etapa ('extraccion', 'transformacion', 'carga', ...).
+    :param etiquetas: Datos adicionales del registro JSON (tabla, archivo, fecha...).
+    """
+    if not METRICAS_ACTIVAS:
+        yield {"filas": 0, "bytes": 0}
+        return
+    try:
+        with medir(pipeline=pipeline, etapa=nombre, error=None, **etiquetas) as registro:
+            try:
+                yield registro
+            except BaseException as e:
+                registro["error"] = repr(e)
+                raise
+    finally:
+        registrar(registro)
+
+
+def medir_bloques(bloques, pipeline, nombre, **etiquetas):
+    """
+    Recorre un iterable de DataFrames midiendo como etapa la obtención de cada bloque.
+
+    Sirve para la extracción por bloques, donde leer el siguiente bloque
+    ocurre dentro del `for` del que consume.
+
+    :param bloques: Iterable de DataFrames.
+    :param pipeline: Nombre del pipeline.
+    :param nombre: Etapa, normalmente 'extraccion'.
+    :param etiquetas: Datos adicionales del registro JSON.
+    :return: Generador con los mismos bloques.
+    """
+    iterador = iter(bloques)
+    numero = 0
+    while True:
+        numero += 1
+        with etapa(pipeline, nombre, bloque=numero, **etiquetas) as registro:
+            try:
+                df = next(iterador)
+            except StopIteration:
+                registro["vacio"] = True
+                break
+            registro.update(filas=len(df), bytes=bytes_dataframe(df))
+        yield df
+
+
+def _serializable(valor):
+    if isinstance(valor, (str, int, float, bool)) or valor is None:
+        return valor
+    if isinstance(valor, (list, tuple)):
+        return [_serializable(elemento) for elemento in valor]
+    if hasattr(valor, "isoformat"):
+        return valor.isoformat()
+    return str(valor)
+
+
+def registrar(registro):
+    """
+    Agrega un registro a etapas.jsonl y actualiza el archivo .prom de su pipeline.
+
+    :param registro: Diccionario de `medir` con `pipeline` y `etapa`.
+    """
+    if registro.get("vacio"):
+        return
+    linea = {"ts": datetime.now().isoformat(timespec="milliseconds"), "pid": os.getpid(), "proceso": PROCESO}
+    linea.update({clave: _serializable(valor) for clave, valor in registro.items()})
+    clave = (registro["pipeline"], registro["etapa"])
+    with _lock:
+        os.makedirs(DIRECTORIO_METRICAS, exist_ok=True)
+        with open(os.path.join(DIRECTORIO_METRICAS, "etapas.jsonl"), "a", encoding="utf-8") as archivo:
+            archivo.write(json.dumps(linea, ensure_ascii=False) + "\n")
+
+        total = _totales.setdefault(clave, {"ejecuciones": 0, "errores": 0, "segundos": 0.0, "filas": 0,
+                                            "bytes": 0, "pico_rss_mb": 0.0})
+        total["ejecuciones"] += 1
+        total["errores"] += registro["error"] is not None
+        total["segundos"] += registro["segundos"]
+        total["filas"] += registro["filas"] or 0
+        total["bytes"] += registro["bytes"] or 0
+        total["pico_rss_mb"] = max(total["pico_rss_mb"], registro["pico_rss_mb"])
+        total["ultima"] = time.time()
+        escribir_prometheus(registro["pipeline"])
+
+
+# Métricas publicadas: (nombre, tipo, ayuda, función que obtiene el valor de los totales)
+METRICAS_PROMETHEUS = [
+    ("segundos_total", "counter", "Segundos de la etapa acumulados desde el inicio del proceso.",
+     lambda total: round(total["segundos"], 4)),
+    ("filas_total", "counter", "Filas procesadas por la etapa desde el inicio del proceso.",
+     lambda total: total["filas"]),
+    ("bytes_total", "counter", "Bytes procesados por la etapa desde el inicio del proceso.",
+     lambda total: total["bytes"]),
+    ("ejecuciones_total", "counter",
+     "Veces que se ejecutó la etapa desde el inicio del proceso (bloques o fragmentos incluidos).",
+     lambda total: total["ejecuciones"]),
+    ("errores_total", "counter", "Ejecuciones de la etapa que terminaron con error desde el inicio del proceso.",
+     lambda total: total["errores"]),
+    ("pico_rss_bytes", "gauge", "Mayor pico de memoria residente del proceso durante la etapa desde su inicio.",
+     lambda total: int(total["pico_rss_mb"] * MB)),
+    ("ultima_ejecucion_timestamp_seconds", "gauge", "Instante en que terminó la última ejecución de la etapa.",
+     lambda total: round(total["ultima"], 3)),
+]
+
+
+def escribir_prometheus(pipeline):
+    """
+    Reescribe `<pipeline>_<proceso>.prom` con los totales por etapa del proceso actual.
+
+    Se escribe en un temporal y se renombra, para que el collector nunca lea
+    un archivo a medias. Debe llamarse con `_lock` tomado.
+
+    :param pipeline: Nombre del pipeline.
+    """
+    etapas = {nombre: total for (origen, nombre), total in _totales.items() if origen == pipeline}
+    lineas = []
+    for metrica, tipo, ayuda, valor in METRICAS_PROMETHEUS:
+        nombre = f"{PREFIJO}_{metrica}"
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        for etapa_pipeline, total in etapas.items():
+            lineas.append(f'{nombre}{{pipeline="{pipeline}",proceso="{PROCESO}",etapa="{etapa_pipeline}"}} '
+                          f'{valor(total)}')
+    ruta = os.path.join(DIRECTORIO_METRICAS, f"{pipeline}_{PROCESO}.prom")
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        archivo.write("\n".join(lineas) + "\n")
+    os.replace(temporal, ruta)
@@ -0,0 +1,84 @@
+import hashlib
+import os
+
+from estado_local import leer_estado, guardar_estado
+
+# Tamaño de lectura al calcular el hash de un archivo
+BLOQUE_HASH = 1 << 20
+
+
+def hash_archivo(ruta):
+    """
+    Calcula el hash sha256 del contenido de un archivo.
+
+    :param ruta: Ruta del archivo.
+    :return: Hash en hexadecimal.
+    """
+    sha = hashlib.sha256()
+    with open(ruta, "rb") as archivo:
+        for bloque in iter(lambda: archivo.read(BLOQUE_HASH), b""):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+class Manifiesto:
+    """
+    Registro persistente de los archivos ya procesados (ruta, tamaño, mtime y hash).
+
+    Un archivo se considera sin cambios si coinciden tamaño y mtime; si no
+    coinciden se compara el hash, de modo que copiar o tocar un archivo sin
+    cambiar su contenido no obliga a procesarlo de nuevo.
+    """
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.entradas = leer_estado(nombre, {})
+        self._pendientes = {}
+
+    @staticmethod
+    def _clave(ruta):
+        return os.path.normpath(ruta)
+
+    def cambios(self, rutas):
+        """
+        Filtra las rutas nuevas o modificadas desde el último registro.
+
+        Las rutas que ya no existen (borradas o movidas después de listarlas) se omiten.
+
+        :param rutas: Rutas de archivo a revisar.
+        :return: Lista de rutas que hay que procesar.
+        """
+        cambiadas = []
+        for ruta in rutas:
+            clave = self._clave(ruta)
+            try:
+                stat = os.stat(ruta)
+                entrada = {"tamano": stat.st_size, "mtime": stat.st_mtime_ns}
+                anterior = self.entradas.get(clave)
+                if anterior and anterior["tamano"] == entrada["tamano"] and anterior["mtime"] == entrada["mtime"]:
+                    continue
+                entrada["hash"] = hash_archivo(ruta)
+            except FileNotFoundError:
+                continue
+            if anterior and anterior.get("hash") == entrada["hash"]:
+                # Mismo contenido con otro mtime: solo se actualiza la firma
+                self.entradas[clave] = entrada
+                continue
+            self._pendientes[clave] = entrada
+            cambiadas.append(ruta)
+        return cambiadas
+
+    def registrar(self, rutas):
+        """
+        Marca como procesadas las rutas indicadas y guarda el manifiesto.
+
+        :param rutas: Rutas devueltas por `cambios` que se procesaron con éxito.
+        """
+        for ruta in rutas:
+            clave = self._clave(ruta)
+            entrada = self._pendientes.pop(clave, None)
+            if entrada is None:
+                stat = os.stat(ruta)
+                entrada = {"tamano": stat.st_size, "mtime": stat.st_mtime_ns, "hash": hash_archivo(ruta)}
+            self.entradas[clave] = entrada
+        guardar_estado(self.nombre, self.entradas)
@@ -0,0 +1,58 @@
+from sqlalchemy import text
+
+# Selección de los medidores configurados en cgm_test.rfc_config.
+# Las consultas de extracción filtran con una subconsulta sobre rfc_config
+# que se resuelve en el servidor (semi-join), en lugar de traer la lista de
+# medidores a Python y devolverla como arreglo en `= ANY(:noins)`; así el
+# plan y el volumen enviado no crecen con el número de medidores.
+
+# Tabla de configuración de medidores
+RFC_CONFIG = "cgm_test.rfc_config"
+
+# Consulta SQL para contar los medidores configurados
+conteo_query = text(f"""
+    SELECT count(*)
+    FROM {RFC_CONFIG}
+""")
+
+
+def contar_medidores(engine):
+    """
+    Cuenta los medidores configurados en `cgm_test.rfc_config` sin traerlos.
+
+    :param engine: Motor de SQLAlchemy.
+    :return: Número de medidores.
+    """
+    with engine.connect() as connection:
+        return connection.execute(conteo_query).scalar_one()
+
+
+def fragmentos(partes):
+    """
+    Divide los medidores configurados en `partes` fragmentos de tamaño similar.
+
+    :param partes: Número de fragmentos.
+    :return: Lista de fragmentos (parte, partes) para `filtro_medidores`.
+    """
+    return [(parte, partes) for parte in range(partes)]
+
+
+def filtro_medidores(columna, fragmento=None):
+    """
+    Construye la condición que limita `columna` a los medidores configurados.
+
+    Los fragmentos se calculan en el servidor con un hash del medidor, de modo
+    que repartir el trabajo en paralelo tampoco requiere la lista en Python.
+
+    :param columna: Columna del medidor en la tabla consultada (p. ej. 'noins').
+    :param fragmento: Tupla (parte, partes) de `fragmentos`, o None para todos los medidores.
+    :return: Tupla (condición SQL, parámetros).
+    """
+    if fragmento is None or fragmento[1] <= 1:
+        return f"{columna} IN (SELECT medidor FROM {RFC_CONFIG})", {}
+    parte, partes = fragmento
+    condicion = (
+        f"{columna} IN (SELECT medidor FROM {RFC_CONFIG} "
+        f"WHERE (hashtext(medidor::text) & 2147483647) % :partes = :parte)"
+    )
+    return condicion, {"parte": parte, "partes": partes}
@@ -0,0 +1,239 @@
+import time
+from datetime import timedelta
+
+import pandas as pd
+from sqlalchemy import inspect
+
+from carga_postgres import copiar_dataframe, identificador, nombre_tabla, tipos_sql
+
+# Tablas particionadas por rango de fecha, con una partición por día:
+#   tmng.tdia_sis  ->  tmng.tdia_sis_p20241001, tmng.tdia_sis_p20241002, ...
+# Cada día se carga con COPY en una tabla nueva fuera de la tabla padre y
+# después se intercambia con la partición anterior (DETACH + ATTACH) en una
+# transacción corta, así los lectores nunca ven un día a medio cargar.
+
+
+def nombre_particion(tabla, dia):
+    """
+    Nombre de la partición de un día, p. ej. `tdia_sis_p20241001`.
+    """
+    return f"{tabla}_p{dia:%Y%m%d}"
+
+
+def _limites(dia):
+    return f"FOR VALUES FROM ('{dia.isoformat()}') TO ('{(dia + timedelta(days=1)).isoformat()}')"
+
+
+def _restriccion_rango(particion):
+    """
+    Nombre del CHECK temporal que acota una tabla nueva al rango de su día.
+    """
+    return f"{particion}_rango"
+
+
+def _check_rango(columna_fecha, dia):
+    """
+    Condición equivalente a la restricción de partición de un día.
+
+    Incluye `IS NOT NULL` porque la restricción de partición lo exige y un
+    CHECK acepta nulos; sin eso PostgreSQL no la da por implicada.
+    """
+    fecha = identificador(columna_fecha)
+    return (f"{fecha} IS NOT NULL AND {fecha} >= '{dia.isoformat()}' "
+            f"AND {fecha} < '{(dia + timedelta(days=1)).isoformat()}'")
+
+
+def _existe(cursor, tabla, schema):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (nombre_tabla(tabla, schema),))
+    return cursor.fetchone()[0]
+
+
+def _es_particionada(cursor, tabla, schema):
+    cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (nombre_tabla(tabla, schema),))
+    fila = cursor.fetchone()
+    return bool(fila and fila[0])
+
+
+def _migrar_a_particionada(cursor, tabla, schema, columna_fecha):
+    """
+    Convierte una tabla normal existente en particionada por día, conservando sus filas.
+
+    La tabla se renombra a `{tabla}_legado`, se crea la tabla padre con las
+    mismas columnas y cada día se mueve a su partición; las filas sin fecha
+    quedan en la partición por defecto. No hace commit.
+    """
+    legado = f"{tabla}_legado"
+    fecha = identificador(columna_fecha)
+    cursor.execute(f"ALTER TABLE {nombre_tabla(tabla, schema)} RENAME TO {identificador(legado)}")
+    cursor.execute(
+        f"CREATE TABLE {nombre_tabla(tabla, schema)} (LIKE {nombre_tabla(legado, schema)} INCLUDING DEFAULTS) "
+        f"PARTITION BY RANGE ({fecha})"
+    )
+    cursor.execute(f"SELECT DISTINCT {fecha}::date FROM {nombre_tabla(legado, schema)} WHERE {fecha} IS NOT NULL")
+    for (dia,) in cursor.fetchall():
+        particion = nombre_tabla(nombre_particion(tabla, dia), schema)
+        cursor.execute(f"CREATE TABLE {particion} PARTITION OF {nombre_tabla(tabla, schema)} {_limites(dia)}")
+        cursor.execute(
+            f"INSERT INTO {particion} SELECT * FROM {nombre_tabla(legado, schema)} "
+            f"WHERE {fecha} >= %s AND {fecha} < %s",
+            (dia, dia + timedelta(days=1)),
+        )
+    cursor.execute(f"SELECT count(*) FROM {nombre_tabla(legado, schema)} WHERE {fecha} IS NULL")
+    if cursor.fetchone()[0]:
+        defecto = nombre_tabla(f"{tabla}_pdefault", schema)
+        cursor.execute(f"CREATE TABLE {defecto} PARTITION OF {nombre_tabla(tabla, schema)} DEFAULT")
+        cursor.execute(f"INSERT INTO {defecto} SELECT * FROM {nombre_tabla(legado, schema)} WHERE {fecha} IS NULL")
+    cursor.execute(f"DROP TABLE {nombre_tabla(legado, schema)}")
+
+
+def asegurar_particionada(engine, df, tabla, schema, columna_fecha):
+    """
+    Deja lista la tabla padre particionada por rango de `columna_fecha`.
+
+    Si no existe se crea con las columnas del DataFrame; si existe como tabla
+    normal (creada por versiones anteriores de la carga) se migra conservando
+    sus datos.
+
+    :param engine: Motor de SQLAlchemy.
+    :param df: DataFrame de ejemplo con las columnas y tipos de la tabla.
+    :param tabla: Nombre de la tabla (string).
+    :param schema: Esquema de la tabla (string o None).
+    :param columna_fecha: Columna de fecha por la que se particiona.
+    """
+    plantilla = f"_plantilla_{tabla}"
+    if not inspect(engine).has_table(tabla, schema=schema):
+        # La definición de columnas se toma de pandas a través de una tabla plantilla vacía
+        df.head(0).to_sql(plantilla, engine, schema=schema, index=False, if_exists="replace",
+                         dtype=tipos_sql(df))
+
+    conexion = engine.raw_connection()
+    try:
+        with conexion.cursor() as cursor:
+            if not _existe(cursor, tabla, schema):
+                cursor.execute(
+                    f"CREATE TABLE {nombre_tabla(tabla, schema)} (LIKE {nombre_tabla(plantilla, schema)}) "
+                    f"PARTITION BY RANGE ({identificador(columna_fecha)})"
+                )
+                cursor.execute(f"DROP TABLE {nombre_tabla(plantilla, schema)}")
+            elif not _es_particionada(cursor, tabla, schema):
+                print(f"Migrando {schema}.{tabla} a tabla particionada por {columna_fecha}...")
+                _migrar_a_particionada(cursor, tabla, schema, columna_fecha)
+        conexion.commit()
+    except Exception:
+        conexion.rollback()
+        raise
+    finally:
+        conexion.close()
+
+
+def _intercambiar(cursor, tabla, schema, columna_version, dia, versiones):
+    """
+    Sustituye la partición de un día por la tabla recién cargada. No hace commit.
+
+    Las filas de versiones que no venían en la carga se pasan de la partición
+    anterior a la nueva antes del intercambio, para no perderlas. La tabla
+    nueva ya trae el CHECK del rango del día, así el ATTACH no recorre la
+    tabla con la tabla padre bloqueada; después del ATTACH el CHECK sobra y se
+    borra.
+    """
+    particion = nombre_particion(tabla, dia)
+    nueva = f"{particion}_nueva"
+    if _existe(cursor, particion, schema):
+        cursor.execute(
+            f"INSERT INTO {nombre_tabla(nueva, schema)} SELECT * FROM {nombre_tabla(particion, schema)} "
+            f"WHERE {identificador(columna_version)} IS NULL OR NOT ({identificador(columna_version)} = ANY(%s))",
+            (sorted(versiones),),
+        )
+        cursor.execute(f"ALTER TABLE {nombre_tabla(tabla, schema)} DETACH PARTITION {nombre_tabla(particion, schema)}")
+        cursor.execute(f"DROP TABLE {nombre_tabla(particion, schema)}")
+    cursor.execute(f"ALTER TABLE {nombre_tabla(nueva, schema)} RENAME TO {identificador(particion)}")
+    cursor.execute(
+        f"ALTER TABLE {nombre_tabla(tabla, schema)} ATTACH PARTITION {nombre_tabla(particion, schema)} {_limites(dia)}"
+    )
+    cursor.execute(
+        f"ALTER TABLE {nombre_tabla(particion, schema)} DROP CONSTRAINT {identificador(_restriccion_rango(particion))}"
+    )
+
+
+def reemplazar_particiones(bloques, engine, tabla, schema, columna_fecha, columna_version, columnas=None):
+    """
+    Reemplaza los días (y versiones) presentes en los bloques intercambiando particiones.
+
+    1. Cada día recibido se copia con COPY a una tabla nueva `{particion}_nueva`
+       con la estructura de la tabla padre y se le agrega un CHECK con el rango
+       del día; esta carga y la validación del CHECK no bloquean a los lectores.
+    2. En una sola transacción, cada tabla nueva sustituye a la partición
+       del día (DETACH de la anterior y ATTACH de la nueva).
+
+    Los días que no vienen en los bloques no se tocan, así el costo de la carga
+    depende de los días nuevos y no del tamaño de la tabla.
+
+    :param bloques: Iterable de DataFrames con las mismas columnas.
+    :param engine: Motor de SQLAlchemy de la base destino.
+    :param tabla: Nombre de la tabla padre (string).
+    :param schema: Esquema de la tabla (string o None).
+    :param columna_fecha: Columna de fecha por la que se particiona.
+    :param columna_version: Columna de versión; se reemplazan solo las versiones cargadas.
+    :param columnas: Orden de columnas a cargar; por defecto el de cada bloque.
+    :return: Tupla (particiones reemplazadas, filas cargadas).
+    """
+    inicio = time.perf_counter()
+    versiones = {}
+    filas = 0
+    conexion = None
+    try:
+        # 1. Carga de cada día en su tabla nueva
+        for df in bloques:
+            if df.empty:
+                continue
+            if conexion is None:
+                asegurar_particionada(engine, df, tabla, schema, columna_fecha)
+                conexion = engine.raw_connection()
+            dias = pd.to_datetime(df[columna_fecha]).dt.date
+            with conexion.cursor() as cursor:
+                for dia, grupo in df.groupby(dias, sort=True):
+                    nueva = f"{nombre_particion(tabla, dia)}_nueva"
+                    if dia not in versiones:
+                        versiones[dia] = set()
+                        cursor.execute(f"DROP TABLE IF EXISTS {nombre_tabla(nueva, schema)}")
+                        cursor.execute(
+                            f"CREATE TABLE {nombre_tabla(nueva, schema)} "
+                            f"(LIKE {nombre_tabla(tabla, schema)} INCLUDING DEFAULTS)"
+                        )
+                    versiones[dia].update(grupo[columna_version].dropna().unique())
+                    filas += copiar_dataframe(cursor, grupo, nueva, schema, columnas)
+        if conexion is None:
+            return 0, 0
+        # El CHECK se valida aquí, fuera de la transacción que bloquea la tabla padre
+        with conexion.cursor() as cursor:
+            for dia in sorted(versiones):
+                particion = nombre_particion(tabla, dia)
+                cursor.execute(
+                    f"ALTER TABLE {nombre_tabla(particion + '_nueva', schema)} "
+                    f"ADD CONSTRAINT {identificador(_restriccion_rango(particion))} "
+                    f"CHECK ({_check_rango(columna_fecha, dia)})"
+                )
+        conexion.commit()
+
+        # 2. Intercambio de todas las particiones en una transacción
+        with conexion.cursor() as cursor:
+            for dia in sorted(versiones):
+                _intercambiar(cursor, tabla, schema, columna_version, dia, versiones[dia])
+        conexion.commit()
+    except Exception:
+        if conexion is not None:
+            conexion.rollback()
+            # Las tablas nuevas ya confirmadas no deben quedar huérfanas
+            with conexion.cursor() as cursor:
+                for dia in versiones:
+                    cursor.execute(f"DROP TABLE IF EXISTS {nombre_tabla(nombre_particion(tabla, dia) + '_nueva', schema)}")
+            conexion.commit()
+        raise
+    finally:
+        if conexion is not None:
+            conexion.close()
+
+    duracion = time.perf_counter() - inicio
+    destino = f"{schema}.{tabla}" if schema else tabla
+    print(f"{filas} filas cargadas en {destino} intercambiando {len(versiones)} particiones diarias en {duracion:.2f} s")
+    return len(versiones), filas
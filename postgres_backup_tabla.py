@@ -1,9 +1,52 @@
+import argparse
 import os
+import re
 import subprocess
+import time
 from dotenv import load_dotenv
 
+# Imagen de Docker con los clientes de PostgreSQL
+IMAGEN_POSTGRES = "postgres:15.8"
+
+# Cada cuántos bytes del dump se informa el avance del clon en streaming
+BYTES_AVANCE = 64 * 1024 * 1024
+
+
+class FiltroEsquema:
+    """
+    Reescribe al vuelo las líneas de un dump en formato plano para cambiar el esquema de la tabla.
+
+    Solo se reemplaza `origen.tabla` en las sentencias SQL; las filas de los
+    bloques `COPY ... FROM stdin` pasan sin cambios (y se cuentan), así un
+    valor que contenga el nombre de la tabla no se altera.
+    """
+
+    def __init__(self, table_name, source_schema, target_schema):
+        self._patron = re.compile(rb"\b" + re.escape(f"{source_schema}.{table_name}".encode()))
+        self._reemplazo = f"{target_schema}.{table_name}".encode()
+        self._en_datos = False
+        self.bytes = 0
+        self.filas = 0
+
+    def filtrar(self, linea):
+        """
+        Procesa una línea del dump (bytes) y devuelve la línea a enviar a psql.
+        """
+        self.bytes += len(linea)
+        if self._en_datos:
+            if linea.rstrip(b"\r\n") == b"\\.":
+                self._en_datos = False
+            else:
+                self.filas += 1
+            return linea
+        if linea.startswith(b"COPY ") and linea.rstrip().endswith(b"FROM stdin;"):
+            self._en_datos = True
+        return self._patron.sub(self._reemplazo, linea)
+
+
 class PostgresBackupRestore:
-    def __init__(self, env_path=".env", table_name=None, source_schema="public", target_schema="public_test"):
+    def __init__(self, env_path=".env", table_name=None, source_schema="public", target_schema="public_test",
+                 use_docker=True):
         # Cargar las variables de entorno desde el archivo .env
         load_dotenv(env_path)
         
@@ -17,6 +60,85 @@ class PostgresBackupRestore:
         self.target_schema = target_schema
         
         self.table_name=table_name 
+        self.use_docker = use_docker
+
+    def _cliente(self, programa, *args, stdin=False):
+        """
+        Arma el comando de un cliente de PostgreSQL (pg_dump o psql), en Docker o local.
+
+        La contraseña viaja por la variable de entorno PGPASSWORD y no en el comando.
+        """
+        conexion = ["-h", self.pg_host, "-p", str(self.pg_port), "-U", self.pg_user, "-d", self.pg_db]
+        if not self.use_docker:
+            return [programa, *conexion, *args]
+        docker = ["docker", "run", "--rm", "-e", "PGPASSWORD"]
+        if stdin:
+            docker.append("-i")
+        return [*docker, IMAGEN_POSTGRES, programa, *conexion, *args]
+
+    def clone_streaming(self):
+        """
+        Clona la tabla al esquema de destino sin archivos intermedios.
+
+        La salida de pg_dump se lee línea a línea, se le cambia el esquema con
+        `FiltroEsquema` y se escribe directamente en la entrada de psql, que la
+        restaura en una sola transacción. Se informa el avance en bytes y filas.
+
+        :return: Diccionario con `bytes`, `filas` y `segundos`, o None si hubo un error.
+        """
+        print("Iniciando el clon en streaming de la tabla...")
+        entorno = {**os.environ, "PGPASSWORD": self.pg_password or ""}
+        dump_command = self._cliente("pg_dump", "-t", f"{self.source_schema}.{self.table_name}")
+        restore_command = self._cliente("psql", "-q", "-v", "ON_ERROR_STOP=1", "--single-transaction",
+                                        stdin=True)
+        filtro = FiltroEsquema(self.table_name, self.source_schema, self.target_schema)
+        inicio = time.perf_counter()
+        siguiente_aviso = BYTES_AVANCE
+
+        dump = subprocess.Popen(dump_command, stdout=subprocess.PIPE, env=entorno)
+        restore = subprocess.Popen(restore_command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, env=entorno)
+        completo = False
+        try:
+            for linea in dump.stdout:
+                restore.stdin.write(filtro.filtrar(linea))
+                if filtro.bytes >= siguiente_aviso:
+                    siguiente_aviso += BYTES_AVANCE
+                    print(f"{filtro.bytes / 1024 ** 2:,.0f} MB, {filtro.filas:,} filas en "
+                          f"{time.perf_counter() - inicio:.1f} s")
+            completo = True
+        except BrokenPipeError:
+            # psql terminó antes de tiempo; su código de salida indica el error
+            pass
+        finally:
+            if not completo:
+                dump.kill()
+            dump.stdout.close()
+            codigo_dump = dump.wait()
+            if not completo or codigo_dump != 0:
+                # psql confirma la transacción al llegar al fin de su entrada: si el dump
+                # no terminó bien se termina sin cerrarla y --single-transaction la revierte.
+                # SIGTERM y no SIGKILL, porque `docker run` reenvía SIGTERM al psql del
+                # contenedor; matar solo el cliente de Docker le cerraría la entrada.
+                restore.terminate()
+                try:
+                    restore.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    restore.kill()
+                    restore.wait()
+            try:
+                restore.stdin.close()
+            except BrokenPipeError:
+                pass
+            codigo_restore = restore.wait()
+
+        if codigo_dump != 0 or codigo_restore != 0:
+            print(f"Error en el clon en streaming (pg_dump: {codigo_dump}, psql: {codigo_restore}); "
+                  f"la restauración se revirtió.")
+            return None
+        duracion = time.perf_counter() - inicio
+        print(f"Clon completado: {self.source_schema}.{self.table_name} -> {self.target_schema}.{self.table_name}, "
+              f"{filtro.bytes / 1024 ** 2:,.1f} MB, {filtro.filas:,} filas en {duracion:.1f} s")
+        return {"bytes": filtro.bytes, "filas": filtro.filas, "segundos": round(duracion, 3)}
     
     def backup_table(self):
         """
@@ -101,13 +223,28 @@ class PostgresBackupRestore:
                 print(f"Error al eliminar el archivo {file_path}: {e}")
 
 if __name__ == "__main__":
-    table_name = input("Ingrese la tabla de origen: ")
-    source_schema = input("Ingrese el esquema de origen: ")
-    target_schema = input("Ingrese el esquema de destino: ")
+    parser = argparse.ArgumentParser(description="Clona una tabla de PostgreSQL a otro esquema.")
+    parser.add_argument("--tabla", help="Tabla de origen.")
+    parser.add_argument("--origen", help="Esquema de origen.")
+    parser.add_argument("--destino", help="Esquema de destino.")
+    parser.add_argument("--modo", choices=["streaming", "archivo"], default="streaming",
+                        help="'streaming' envía pg_dump directo a psql; 'archivo' usa los archivos de backup y restore.")
+    parser.add_argument("--sin-docker", action="store_true", help="Usa pg_dump y psql instalados localmente.")
+    args = parser.parse_args()
+
+    table_name = args.tabla or input("Ingrese la tabla de origen: ")
+    source_schema = args.origen or input("Ingrese el esquema de origen: ")
+    target_schema = args.destino or input("Ingrese el esquema de destino: ")
     
     backup_restore = PostgresBackupRestore(table_name=table_name, 
                                            source_schema=source_schema,
-                                           target_schema=target_schema)
+                                           target_schema=target_schema,
+                                           use_docker=not args.sin_docker)
+    if args.modo == "streaming":
+        resultado = backup_restore.clone_streaming()
+        print('Finalizado')
+        exit(0 if resultado else 1)
+
     try:
         backup_restore.backup_table()
         backup_restore.replace_schema()
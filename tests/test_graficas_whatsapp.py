@@ -0,0 +1,172 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Sin espera entre reintentos: se lee al importar el módulo
+os.environ["WHATSAPP_ESPERA_REINTENTO"] = "0"
+
+import estado_local
+import graficas_whatsapp
+import instrumentacion
+
+
+class ServicioStub(BaseHTTPRequestHandler):
+    """
+    Servicio de reportes falso: cada ruta responde con la secuencia de códigos
+    de `respuestas` (el último se repite); el código 'lento' duerme más que el
+    timeout del cliente antes de responder 200. /signin entrega 'inicial' la
+    primera vez y 'renovado' las siguientes; `cabeceras` guarda la última
+    cabecera Authorization recibida por ruta.
+    """
+
+    respuestas = {}
+    llamadas = {}
+    cabeceras = {}
+    lock = threading.Lock()
+
+    def _responder(self):
+        with self.lock:
+            numero = self.llamadas.get(self.path, 0)
+            self.llamadas[self.path] = numero + 1
+            secuencia = self.respuestas.get(self.path, [200])
+            codigo = secuencia[min(numero, len(secuencia) - 1)]
+            self.cabeceras[self.path] = self.headers.get("Authorization")
+        if codigo == "lento":
+            time.sleep(0.5)
+            codigo = 200
+        if self.path == "/signin":
+            cuerpo = b'{"token": "inicial"}' if numero == 0 else b'{"token": "renovado"}'
+        else:
+            cuerpo = b"{}"
+        try:
+            self.send_response(codigo)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+        except ConnectionError:
+            pass  # El cliente ya cerró por timeout
+
+    do_GET = _responder
+    do_POST = _responder
+
+    def log_message(self, *args):
+        pass
+
+
+class EnvioWhatsappTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.servidor = ThreadingHTTPServer(("127.0.0.1", 0), ServicioStub)
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.servidor.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+
+    def setUp(self):
+        ServicioStub.respuestas = {}
+        ServicioStub.llamadas = {}
+        ServicioStub.cabeceras = {}
+        self.estado = tempfile.mkdtemp()
+        self._originales = (estado_local.DIRECTORIO_ESTADO, graficas_whatsapp.BASE_URL,
+                            instrumentacion.METRICAS_ACTIVAS)
+        estado_local.DIRECTORIO_ESTADO = self.estado
+        graficas_whatsapp.BASE_URL = self.base_url
+        instrumentacion.METRICAS_ACTIVAS = False
+
+    def tearDown(self):
+        (estado_local.DIRECTORIO_ESTADO, graficas_whatsapp.BASE_URL,
+         instrumentacion.METRICAS_ACTIVAS) = self._originales
+        shutil.rmtree(self.estado)
+
+    def enviar(self, clientes, **extra):
+        return graficas_whatsapp.ejecutar_endpoints("5", "2024-11-29", "token", clientes,
+                                                    concurrencia=2, reintentos=3, timeout=0.2, **extra)
+
+    def test_reintentos_y_resumen(self):
+        ServicioStub.respuestas = {
+            "/5/2024-11-29/whatsapp": [500, 200],       # generación: idempotente, se reintenta
+            "/envio/5/a/2024-11-29": [503, 200],        # rechazado sin procesar: se reintenta
+            "/envio/5/b/2024-11-29": [500, 200],        # pudo haberse enviado: no se reintenta
+            "/envio/5/c/2024-11-29": ["lento", 200],    # timeout de lectura: no se reintenta
+            "/envio/5/d/2024-11-29": [404],             # error definitivo
+        }
+        resumen = self.enviar(["a", "b", "c", "d"])
+
+        self.assertTrue(resumen["reporte"])
+        self.assertEqual(resumen["enviados"], ["a"])
+        self.assertEqual(resumen["fallidos"], ["b", "c", "d"])
+        self.assertEqual(resumen["omitidos"], [])
+        intentos = {detalle["cliente"]: detalle["intentos"] for detalle in resumen["detalle"]}
+        self.assertEqual(intentos, {"a": 2, "b": 1, "c": 1, "d": 1})
+        self.assertEqual(ServicioStub.llamadas["/5/2024-11-29/whatsapp"], 2)
+        self.assertEqual(ServicioStub.llamadas["/envio/5/b/2024-11-29"], 1)
+        self.assertEqual(ServicioStub.llamadas["/envio/5/c/2024-11-29"], 1)
+
+        # La siguiente ejecución no regenera el reporte ni reenvía a 'a'
+        time.sleep(0.5)
+        ServicioStub.respuestas.update({"/envio/5/b/2024-11-29": [200], "/envio/5/c/2024-11-29": [200]})
+        ServicioStub.llamadas = {}
+        resumen = self.enviar(["a", "b", "c", "d"])
+        self.assertEqual(resumen["omitidos"], ["a"])
+        self.assertEqual(resumen["enviados"], ["b", "c"])
+        self.assertEqual(resumen["fallidos"], ["d"])
+        self.assertNotIn("/5/2024-11-29/whatsapp", ServicioStub.llamadas)
+        self.assertNotIn("/envio/5/a/2024-11-29", ServicioStub.llamadas)
+
+    def test_token_renovado_ante_401(self):
+        ServicioStub.respuestas = {"/envio/5/a/2024-11-29": [401, 200]}
+        resumen = self.enviar(["a"])
+        self.assertEqual(resumen["enviados"], ["a"])
+        self.assertEqual(ServicioStub.llamadas["/signin"], 1)
+
+    def test_envio_reintenta_si_no_hubo_conexion(self):
+        with socket.socket() as libre:
+            libre.bind(("127.0.0.1", 0))
+            puerto = libre.getsockname()[1]
+        url = f"http://127.0.0.1:{puerto}/envio/5/a/2024-11-29"
+        autenticacion = graficas_whatsapp.Autenticacion("token")
+        with graficas_whatsapp.crear_sesion_http(1) as sesion:
+            respuesta, intentos, error = graficas_whatsapp.solicitar(sesion, url, autenticacion, reintentos=3,
+                                                                     espera=0, timeout=1, idempotente=False)
+        self.assertIsNone(respuesta)
+        self.assertEqual(intentos, 3)
+        self.assertIsNotNone(error)
+
+    def test_token_renovado_se_usa_en_los_siguientes_conceptos(self):
+        ServicioStub.respuestas = {"/envio/5/a/2024-11-29": [401, 200]}
+        self.assertEqual(graficas_whatsapp.main(["--concepto", "5", "--concepto", "6", "--cliente", "a"]), 0)
+        self.assertEqual(ServicioStub.llamadas["/signin"], 2)  # token inicial y una sola renovación
+        self.assertEqual(ServicioStub.cabeceras["/6/2024-11-29/whatsapp"], "Bearer renovado")
+
+    def test_token_guardado_solo_para_el_usuario(self):
+        anterior = os.umask(0o022)
+        try:
+            self.assertEqual(graficas_whatsapp.obtener_token(forzar=True), "inicial")
+        finally:
+            os.umask(anterior)
+        ruta = estado_local.ruta_estado(graficas_whatsapp.ESTADO_TOKEN)
+        self.assertEqual(os.stat(ruta).st_mode & 0o777, 0o600)
+        self.assertFalse(os.path.exists(f"{ruta}.tmp"))
+
+    def test_sin_clientes_pendientes_no_es_error(self):
+        self.assertEqual(self.enviar([])["enviados"], [])
+        self.assertEqual(graficas_whatsapp.main(["--cliente", "a"]), 0)
+        ServicioStub.llamadas = {}
+        # Ya enviado: no se regenera el reporte y termina sin error
+        self.assertEqual(graficas_whatsapp.main(["--cliente", "a"]), 0)
+        self.assertNotIn("/5/2024-11-29/whatsapp", ServicioStub.llamadas)
+        self.assertNotIn("/envio/5/a/2024-11-29", ServicioStub.llamadas)
+
+
+if __name__ == "__main__":
+    unittest.main()
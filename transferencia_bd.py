@@ -0,0 +1,67 @@
+import time
+
+from sqlalchemy import text
+
+from carga_postgres import identificador
+
+
+def _tabla(nombre):
+    """
+    Cita un nombre de tabla en formato `esquema.tabla`.
+    """
+    return ".".join(identificador(parte) for parte in nombre.split("."))
+
+
+def construir_insert_select(origen, destino, columns_mapping, constantes=None, condicion=None):
+    """
+    Genera un `INSERT INTO destino (...) SELECT ... FROM origen WHERE ...`.
+
+    Las columnas salen de `columns_mapping` (origen -> destino) y las columnas
+    constantes se agregan al SELECT como parámetros fijos.
+
+    :param origen: Tabla origen en formato `esquema.tabla` (string).
+    :param destino: Tabla destino en formato `esquema.tabla` (string).
+    :param columns_mapping: Diccionario {columna_origen: columna_destino}.
+    :param constantes: Diccionario {columna_destino: valor} con valores fijos.
+    :param condicion: Condición WHERE opcional (string SQL con parámetros `:nombre`).
+    :return: Tupla (consulta SQLAlchemy, parámetros de las constantes).
+    """
+    columnas_destino = [identificador(c) for c in columns_mapping.values()]
+    columnas_origen = [identificador(c) for c in columns_mapping.keys()]
+    params = {}
+    for indice, (columna, valor) in enumerate((constantes or {}).items()):
+        columnas_destino.append(identificador(columna))
+        columnas_origen.append(f":constante_{indice}")
+        params[f"constante_{indice}"] = valor
+
+    sql = (
+        f"INSERT INTO {_tabla(destino)} ({', '.join(columnas_destino)})\n"
+        f"SELECT {', '.join(columnas_origen)}\n"
+        f"FROM {_tabla(origen)}"
+    )
+    if condicion:
+        sql += f"\nWHERE {condicion}"
+    return text(sql), params
+
+
+def transferir_en_bd(engine, origen, destino, columns_mapping, constantes=None, condicion=None, params=None):
+    """
+    Copia filas entre dos tablas de la misma base sin pasar por Python.
+
+    :param engine: Motor de SQLAlchemy de la base que contiene ambas tablas.
+    :param origen: Tabla origen en formato `esquema.tabla` (string).
+    :param destino: Tabla destino en formato `esquema.tabla` (string).
+    :param columns_mapping: Diccionario {columna_origen: columna_destino}.
+    :param constantes: Diccionario {columna_destino: valor} con valores fijos.
+    :param condicion: Condición WHERE opcional (string SQL con parámetros `:nombre`).
+    :param params: Parámetros de la condición.
+    :return: Número de filas insertadas.
+    """
+    query, params_constantes = construir_insert_select(origen, destino, columns_mapping, constantes, condicion)
+    inicio = time.perf_counter()
+    with engine.begin() as connection:
+        filas = connection.execute(query, {**(params or {}), **params_constantes}).rowcount
+    duracion = time.perf_counter() - inicio
+    velocidad = filas / duracion if duracion > 0 else float("inf")
+    print(f"{filas} filas transferidas de {origen} a {destino} en la base en {duracion:.2f} s ({velocidad:,.0f} filas/s)")
+    return filas
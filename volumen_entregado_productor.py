@@ -1,85 +1,143 @@
-from sqlalchemy import create_engine
+import argparse
+import glob
 import os
-from dotenv import load_dotenv
 import pandas as pd
-from datetime import datetime
+from carga_postgres import reemplazar_filas
+from conexiones import credenciales, obtener_engine
+from instrumentacion import bytes_dataframe, depurar, etapa
 
-# Cargar variables de entorno desde el archivo .env
-load_dotenv()
+# Ruta al archivo CSV por defecto
+csv_file_path = 'vep.csv'
 
-# Configuración de credenciales de la base de datos
-PGPASSWORD = os.getenv('PGPASSWORD')
-PG_HOST = os.getenv('PG_HOST')
-PG_PORT = os.getenv('PG_PORT')
-PG_USER = os.getenv('PG_USER')
-PG_DB = os.getenv('PG_DB')
+# Tabla destino y columnas que identifican un registro
+TABLA = 'volumen_entregado_productor'
+CLAVES = ['fechaoperacion', 'fuente']
 
-# Verificar que todas las variables de entorno estén cargadas
-if not all([PGPASSWORD, PG_HOST, PG_PORT, PG_USER, PG_DB]):
-    raise ValueError("Faltan variables de entorno necesarias para la conexión a la base de datos.")
+# Columnas del archivo y su nombre en la tabla de la base de datos
+COLUMNAS = {
+    'FECHA': 'fechaoperacion',
+    'FUENTE': 'fuente',
+    'VALOR (KPCD)': 'valor_kpc',
+}
 
-# Crear la cadena de conexión
-DATABASE_URL = f"postgresql://{PG_USER}:{PGPASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DB}"
+# Nombre del pipeline en las métricas de instrumentacion
+PIPELINE = 'vep'
 
-# Crear el motor de conexión
-engine = create_engine(DATABASE_URL)
 
-# Ruta al archivo CSV
-csv_file_path = 'vep.csv'
+def listar_archivos(entradas):
+    """
+    Expande las entradas (archivos, directorios o patrones glob) a la lista de archivos VEP.
 
-# Leer el archivo CSV con pandas
-try:
-    df = pd.read_csv(
-        csv_file_path,
-        sep=';',                # Separador de campos
-        encoding='latin-1',      # Codificación del archivo
-        dtype={'FECHA': str, 'FUENTE': str, 'VALOR (KPCD)': str}  # Definir tipos de datos iniciales
-    )
-    df.columns = ['FECHA', 'FUENTE', 'VALOR (KPCD)']
-    print("Archivo CSV cargado exitosamente.")
-except FileNotFoundError:
-    raise FileNotFoundError(f"No se encontró el archivo {csv_file_path}.")
-except Exception as e:
-    raise Exception(f"Error al leer el archivo CSV: {e}")
-
-# Mostrar las primeras filas para verificar la carga
-print("Primeras filas del DataFrame cargado:")
-print(df.head())
-
-# Limpiar y transformar los datos
-
-# Convertir la columna 'FECHA' a formato datetime
-try:
-    df['FECHA'] = pd.to_datetime(df['FECHA'], format='%d/%m/%Y')
-except Exception as e:
-    raise ValueError(f"Error al convertir la columna 'FECHA' a datetime: {e}")
-
-# Reemplazar comas en 'VALOR (KPCD)' y convertir a float
-try:
-    df['VALOR (KPCD)'] = df['VALOR (KPCD)'].str.replace(',', '').astype(float)
-except Exception as e:
-    raise ValueError(f"Error al convertir la columna 'VALOR (KPCD)' a float: {e}")
-
-# Renombrar columnas para que coincidan con la tabla de la base de datos
-df.rename(columns={
-    'FECHA': 'fechaoperacion',
-    'FUENTE': 'fuente',
-    'VALOR (KPCD)': 'valor_kpc'
-}, inplace=True)
-
-# Verificar la estructura del DataFrame después de las transformaciones
-print("Estructura del DataFrame después de la limpieza:")
-print(df.info())
-
-# Insertar los datos en la tabla de PostgreSQL
-try:
-    df.to_sql(
-        'volumen_entregado_productor',  # Nombre de la tabla
-        schema='public',                 # Esquema de la tabla
-        con=engine,                      # Motor de conexión
-        if_exists='append',              # Acción si la tabla ya existe
-        index=False                      # No insertar el índice del DataFrame
+    :param entradas: Rutas de archivo, directorios (se toman sus .csv) o patrones como 'vep/*.csv'.
+    :return: Lista ordenada de rutas sin repetidos.
+    """
+    rutas = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            rutas += glob.glob(os.path.join(entrada, '*.csv'))
+        elif glob.has_magic(entrada):
+            rutas += glob.glob(entrada)
+        else:
+            rutas.append(entrada)
+    return sorted(set(rutas))
+
+
+def leer_vep(ruta):
+    """
+    Lee un archivo VEP con los tipos ya convertidos por el parser de pandas.
+
+    Los separadores de miles de los valores se interpretan al leer. Las fechas
+    se convierten con el formato estricto `dd/mm/aaaa`: una fila con otro
+    formato es un error que nombra el archivo, no una columna de texto que
+    PostgreSQL podría leer como mes/día. Los archivos llegan en UTF-8 con BOM;
+    si no lo son se leen como latin-1.
+
+    :param ruta: Ruta del archivo CSV.
+    :return: DataFrame con las columnas `fechaoperacion`, `fuente` y `valor_kpc`.
+    """
+    opciones = dict(
+        sep=';',                                # Separador de campos
+        header=0,
+        names=list(COLUMNAS),                   # Ignora el nombre del encabezado (puede traer BOM)
+        dtype={'FECHA': str, 'FUENTE': str, 'VALOR (KPCD)': 'float64'},
+        thousands=',',                          # 26,531.06 -> 26531.06
     )
-    print("Datos insertados exitosamente en la tabla 'volumen_entregado_productor'.")
-except Exception as e:
-    raise Exception(f"Error al insertar los datos en la base de datos: {e}")
+    try:
+        df = pd.read_csv(ruta, encoding='utf-8-sig', **opciones)
+    except UnicodeDecodeError:
+        df = pd.read_csv(ruta, encoding='latin-1', **opciones)
+    # parse_dates deja la columna como texto si una fila no cumple el formato; aquí falla
+    try:
+        df['FECHA'] = pd.to_datetime(df['FECHA'], format='%d/%m/%Y', errors='raise')
+    except ValueError as e:
+        raise ValueError(f"Fecha con formato distinto de dd/mm/aaaa en {ruta}: {e}") from e
+    # Renombrar columnas para que coincidan con la tabla de la base de datos
+    return df.rename(columns=COLUMNAS)
+
+
+def leer_archivos(rutas):
+    """
+    Lee varios archivos VEP y deja un solo registro por (fechaoperacion, fuente).
+
+    Si un día y una fuente aparecen en varios archivos, se conserva el valor
+    del último archivo en orden de nombre (el reporte más reciente).
+
+    :param rutas: Rutas de los archivos.
+    :return: DataFrame combinado y sin duplicados.
+    """
+    df = pd.concat([leer_vep(ruta) for ruta in rutas], ignore_index=True)
+    combinado = df.drop_duplicates(subset=CLAVES, keep='last')
+    if len(combinado) < len(df):
+        print(f"{len(df) - len(combinado)} registros repetidos de (fechaoperacion, fuente) descartados.")
+    return combinado.sort_values(CLAVES, ignore_index=True)
+
+
+def main(argv=None):
+    """
+    Carga los archivos VEP indicados.
+
+    :param argv: Argumentos de línea de comandos (por defecto los de sys.argv).
+    :return: Código de salida (0 si todo terminó sin errores).
+    """
+    parser = argparse.ArgumentParser(description="Carga los reportes de volumen entregado por productor (VEP).")
+    parser.add_argument("entradas", nargs="*", default=[csv_file_path],
+                        help="Archivos, directorios o patrones glob de archivos VEP (por defecto vep.csv).")
+    args = parser.parse_args(argv)
+
+    # Verificar que todas las variables de entorno estén cargadas
+    if not all(credenciales("pg").values()):
+        raise ValueError("Faltan variables de entorno necesarias para la conexión a la base de datos.")
+
+    rutas = listar_archivos(args.entradas)
+    if not rutas:
+        raise FileNotFoundError(f"No se encontraron archivos VEP en {args.entradas}.")
+    print(f"{len(rutas)} archivos VEP por cargar.")
+
+    try:
+        with etapa(PIPELINE, "extraccion", archivos=len(rutas)) as registro:
+            df = leer_archivos(rutas)
+            registro.update(filas=len(df), bytes=sum(os.path.getsize(ruta) for ruta in rutas))
+    except FileNotFoundError as e:
+        raise FileNotFoundError(f"No se encontró el archivo {e.filename}.")
+    except Exception as e:
+        raise Exception(f"Error al leer los archivos CSV: {e}")
+
+    # Mostrar las primeras filas para verificar la carga
+    depurar("Primeras filas del DataFrame cargado:", df)
+
+    # Motor de conexión compartido
+    engine = obtener_engine("pg")
+
+    # Reemplazar en una sola transacción (COPY) los días y fuentes leídos; repetir la carga no duplica datos
+    try:
+        with etapa(PIPELINE, "carga") as registro:
+            _, registro["filas"] = reemplazar_filas(df, engine, TABLA, 'public', CLAVES)
+            registro["bytes"] = bytes_dataframe(df)
+        print(f"Datos insertados exitosamente en la tabla '{TABLA}'.")
+    except Exception as e:
+        raise Exception(f"Error al insertar los datos en la base de datos: {e}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())